@@ -0,0 +1,120 @@
+"""Cold-start cost of the API: `import main` and time to the first responses.
+
+Every round runs in a fresh interpreter against a temporary SQLite database
+prepared once with migrate.py:
+
+- import_main: wall time of `import main` (also reports whether ReportLab or
+  python-telegram-bot got imported, which should only happen on first use).
+- first_health: from spawning uvicorn to the first 200 from /health.
+- first_machines: the /machines request right after that, served from the
+  catalog snapshot written by migrate.py.
+
+    python benchmarks/bench_cold_start.py [--rounds 5]
+        [--output results.json] [--baseline previous.json] [--threshold 0.2]
+"""
+import os
+import sys
+import time
+import socket
+import tempfile
+import subprocess
+import urllib.request
+
+from harness import BACKEND_DIR, argument_parser, finish, summarize
+
+HEAVY_MODULES = ("reportlab", "telegram")
+IMPORT_PROBE = (
+    "import sys, time\n"
+    "start = time.perf_counter()\n"
+    "import main\n"
+    "elapsed = time.perf_counter() - start\n"
+    f"print(elapsed, ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+)
+
+
+def environment(tmp):
+    env = dict(os.environ)
+    env.pop("BOT_TOKEN", None)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'cold.db')}",
+        "PDF_STORE_DIR": os.path.join(tmp, "storage"),
+        "CATALOG_SNAPSHOT_PATH": os.path.join(tmp, "catalog_snapshot.json"),
+        "QUOTE_JOB_WORKERS": "0",
+    })
+    return env
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except OSError:
+        return None
+
+
+def time_import(env):
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout.split()
+    return float(output[0]) * 1000, output[1].split(",") if len(output) > 1 else []
+
+
+def time_first_requests(env):
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    try:
+        while get(f"http://127.0.0.1:{port}/health") != 200:
+            if server.poll() is not None:
+                raise RuntimeError("uvicorn terminó antes de responder /health")
+            time.sleep(0.01)
+        health = (time.perf_counter() - start) * 1000
+        machines_start = time.perf_counter()
+        if get(f"http://127.0.0.1:{port}/machines") != 200:
+            raise RuntimeError("/machines no respondió 200")
+        return health, (time.perf_counter() - machines_start) * 1000
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argument_parser("Costo de arranque en frío de la API")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="agromaq-cold-")
+    env = environment(tmp)
+    subprocess.run([sys.executable, "migrate.py"], cwd=BACKEND_DIR, env=env, check=True, capture_output=True)
+
+    imports, heavy, health, machines = [], set(), [], []
+    for _ in range(args.rounds):
+        elapsed, loaded = time_import(env)
+        imports.append(elapsed)
+        heavy.update(loaded)
+        first_health, first_machines = time_first_requests(env)
+        health.append(first_health)
+        machines.append(first_machines)
+
+    results = {
+        "import_main": summarize(imports, heavy_modules=sorted(heavy)),
+        "first_health": summarize(health),
+        "first_machines": summarize(machines),
+    }
+    if heavy:
+        print(f"Módulos pesados importados al arrancar: {', '.join(sorted(heavy))}")
+    raise SystemExit(finish(args, "cold_start", results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Quote throughput under mixed read/write load, default vs tuned engine.
+
+Each run uses a fresh SQLite file. Writer threads insert a Quotation and
+commit, the way /generate-quote and /cotizar do; reader threads run the
+catalog query. "default" is a bare create_engine(url); "configurado" is
+db.create_configured_engine(url) with WAL, synchronous=NORMAL and
+busy_timeout.
+
+    python benchmarks/bench_db_concurrency.py [seconds] [writers] [readers]
+
+Set DATABASE_URL to a PostgreSQL URL to benchmark that instead (the
+tables are created but never dropped).
+"""
+import os
+import sys
+import time
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from db import Base, Machine, Quotation, create_configured_engine
+
+
+def seed(engine):
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        if db.query(Machine).count() == 0:
+            db.add_all([
+                Machine(code=f"BEN{i:03d}", name=f"Máquina {i}", price=10000.0 + i,
+                        category=f"Categoría {i % 5}", description="", active=True)
+                for i in range(50)
+            ])
+            db.commit()
+
+
+def run(engine, seconds, writers, readers):
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+    counts = {"writes": 0, "reads": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def writer():
+        while time.perf_counter() < deadline:
+            db = Session()
+            try:
+                db.add(Quotation(machine_code="BEN001", client_cuit="20-1", client_name="Bench",
+                                 client_phone="1", discount_applied=False, final_price=10001.0))
+                db.commit()
+                key = "writes"
+            except OperationalError:
+                db.rollback()
+                key = "errors"
+            finally:
+                db.close()
+            with lock:
+                counts[key] += 1
+
+    def reader():
+        while time.perf_counter() < deadline:
+            db = Session()
+            try:
+                db.query(Machine).filter(Machine.active == True).all()
+                key = "reads"
+            except OperationalError:
+                key = "errors"
+            finally:
+                db.close()
+            with lock:
+                counts[key] += 1
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    writers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    readers = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    url = os.getenv("DATABASE_URL")
+    for label, factory in (("default", create_engine), ("configurado", create_configured_engine)):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            engine_url = url or f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+            engine = factory(engine_url)
+            seed(engine)
+            counts = run(engine, seconds, writers, readers)
+            engine.dispose()
+        print(f"{label:>11}: {counts['writes'] / seconds:8.1f} cotizaciones/s  "
+              f"{counts['reads'] / seconds:8.1f} lecturas/s  errores {counts['errors']}  "
+              f"({writers} escritores, {readers} lectores, {seconds:g}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Micro-benchmarks for the quoting hot paths, pytest-benchmark style.
+
+Each case runs a few warm-up calls and then `rounds` timed calls:
+
+- pdf_render: PDFGenerator.build_quotation_pdf, i.e. what a pool worker does
+  on a cache miss.
+- pdf_generate_miss / pdf_generate_hit: generate_quotation_pdf end to end with
+  an in-thread render pool, with a disabled and a warm PDFCache.
+- catalog_snapshot: CatalogSnapshot for a synthetic catalog plus its /machines
+  JSON body (what a cache refresh costs).
+- catalog_gzip: gzip variant of that body.
+- search_cold / search_warm: SearchIndex build + query, and a cached query.
+
+    python benchmarks/bench_hot_paths.py [--rounds 50] [--machines 2000]
+        [--output results.json] [--baseline previous.json] [--threshold 0.2]
+
+Exits with 1 when --baseline is given and some p50 got worse than --threshold.
+"""
+import asyncio
+from types import SimpleNamespace
+
+from harness import argument_parser, bench, finish
+
+from catalog_cache import CatalogSnapshot
+from http_cache import PreparedBody
+from machine_search import SearchIndex
+from pdf_cache import PDFCache
+from pdf_generator import PDFGenerator, quotation_fields
+from render_pool import RenderPool
+
+QUOTE = SimpleNamespace(
+    machineCode="AV4000", clientName="Juan Pérez", clientCuit="20-12345678-9",
+    clientAddress="Ruta 178 km 3", clientPhone="+541112345678", discountPercent=0.0,
+)
+
+
+def synthetic_catalog(size):
+    return [
+        SimpleNamespace(
+            id=i, code=f"BEN{i:05d}", name=f"Acoplado volcador modelo {i}", price=10000.0 + i,
+            category=f"Categoría {i % 12}", description="Uso rural, doble eje, cubiertas nuevas", active=True,
+        )
+        for i in range(size)
+    ]
+
+
+def pdf_cases(rounds):
+    generator = PDFGenerator(pool=RenderPool(max_workers=0), cache=PDFCache(max_bytes=0))
+    fields = quotation_fields(QUOTE)
+    generator.template  # el template compartido no entra en la medición
+    results = {"pdf_render": bench(lambda: generator.build_quotation_pdf(fields, 123456.0), rounds)}
+
+    loop = asyncio.new_event_loop()
+    try:
+        results["pdf_generate_miss"] = bench(
+            lambda: loop.run_until_complete(generator.generate_quotation_pdf(None, QUOTE, 123456.0)), rounds
+        )
+        cached = PDFGenerator(pool=generator.pool, cache=PDFCache(max_bytes=16 * 1024 * 1024))
+        results["pdf_generate_hit"] = bench(
+            lambda: loop.run_until_complete(cached.generate_quotation_pdf(None, QUOTE, 123456.0)), rounds * 20
+        )
+    finally:
+        loop.close()
+    return results
+
+
+def catalog_cases(rounds, size):
+    machines = synthetic_catalog(size)
+    snapshot = CatalogSnapshot(machines)
+    return {
+        "catalog_snapshot": bench(lambda: CatalogSnapshot(machines).body.identity, rounds),
+        # PreparedBody nuevo en cada vuelta: si no, la variante gzip queda cacheada
+        "catalog_gzip": bench(lambda: PreparedBody(snapshot.machines).encoded("gzip"), max(rounds // 5, 3)),
+    }
+
+
+def search_cases(rounds, size):
+    machines = [vars(m) for m in synthetic_catalog(size)]
+    warm = SearchIndex(machines)
+    warm.search("volcador 1234")
+    return {
+        "search_cold": bench(lambda: SearchIndex(machines).search("volcador 1234"), max(rounds // 5, 3)),
+        "search_warm": bench(lambda: warm.search("volcador 1234"), rounds * 20),
+    }
+
+
+def main():
+    parser = argument_parser("Micro-benchmarks del camino de cotización")
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--machines", type=int, default=2000, help="tamaño del catálogo sintético")
+    args = parser.parse_args()
+
+    results = {}
+    results.update(pdf_cases(args.rounds))
+    results.update(catalog_cases(args.rounds, args.machines))
+    results.update(search_cases(args.rounds, args.machines))
+    raise SystemExit(finish(args, "hot_paths", results))
+
+
+if __name__ == "__main__":
+    main()
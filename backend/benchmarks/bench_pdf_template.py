@@ -0,0 +1,52 @@
+"""Per-PDF latency with and without the precompiled quotation template.
+
+"antes" rebuilds styles, logo and static paragraphs on every render and
+ASCII85-encodes the image stream, which is what generate_quotation_pdf did
+before QuotationTemplate existed; "después" is the current path.
+
+    python benchmarks/bench_pdf_template.py [iterations]
+"""
+import os
+import sys
+import time
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab import rl_config
+from pdf_generator import PDFGenerator
+from pdf_template import QuotationTemplate
+
+FIELDS = {
+    'clientName': 'Juan Pérez',
+    'clientCuit': '20-12345678-9',
+    'clientAddress': 'Ruta 178 km 3',
+    'clientPhone': '+541112345678',
+}
+
+
+def measure(generator, iterations, fresh_template):
+    timings = []
+    use_a85 = rl_config.useA85
+    rl_config.useA85 = 1 if fresh_template else use_a85
+    for _ in range(iterations):
+        start = time.perf_counter()
+        template = QuotationTemplate() if fresh_template else None
+        generator.build_quotation_pdf(FIELDS, 123456.0, template=template)
+        timings.append((time.perf_counter() - start) * 1000)
+    rl_config.useA85 = use_a85
+    return timings
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    generator = PDFGenerator()
+    generator.template  # warm-up: construye el template compartido
+    for label, fresh in (("antes", True), ("después", False)):
+        timings = measure(generator, iterations, fresh)
+        print(f"{label:>8}: media {statistics.mean(timings):7.2f} ms  "
+              f"p50 {statistics.median(timings):7.2f} ms  min {min(timings):7.2f} ms  (n={iterations})")
+
+
+if __name__ == "__main__":
+    main()
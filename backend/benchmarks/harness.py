@@ -0,0 +1,150 @@
+"""Shared helpers for the benchmark suite: timing, summaries, JSON results
+and comparison against a saved baseline.
+
+Results files look like
+
+    {"suite": "hot_paths", "created_at": "...", "environment": {...},
+     "results": {"pdf_render": {"unit": "ms", "mean": 13.9, "p50": ..., ...}}}
+
+`compare` flags a benchmark as a regression when its primary metric gets worse
+than the baseline by more than the threshold (latency metrics up, throughput
+metrics down).
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+import subprocess
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Métricas donde más alto es mejor; el resto (latencias) es al revés
+HIGHER_IS_BETTER = {"ops_per_second", "requests_per_second", "updates_per_second"}
+# Diferencias de latencia menores a esto son ruido del reloj, no regresiones
+NOISE_FLOOR_MS = 0.1
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(timings_ms, **extra):
+    return {
+        "unit": "ms",
+        "n": len(timings_ms),
+        "mean": statistics.fmean(timings_ms),
+        "p50": percentile(timings_ms, 0.50),
+        "p95": percentile(timings_ms, 0.95),
+        "p99": percentile(timings_ms, 0.99),
+        "min": min(timings_ms),
+        "max": max(timings_ms),
+        "stdev": statistics.stdev(timings_ms) if len(timings_ms) > 1 else 0.0,
+        "primary": "p50",
+        **extra,
+    }
+
+
+def bench(fn, rounds=50, warmup=3):
+    """Llama fn() `warmup` veces sin medir y después `rounds` veces, estilo pytest-benchmark."""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    result = summarize(timings)
+    result["ops_per_second"] = 1000 / result["mean"] if result["mean"] else 0.0
+    return result
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "commit": commit,
+    }
+
+
+def write_results(path, suite, results):
+    document = {
+        "suite": suite,
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "environment": environment(),
+        "results": results,
+    }
+    if path == "-":
+        json.dump(document, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+    return document
+
+
+def compare(current, baseline, threshold=0.2):
+    """Lista de (benchmark, métrica, base, actual, cambio) que empeoraron más que threshold."""
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        metric = result.get("primary", "p50")
+        before, after = base.get(metric), result.get(metric)
+        if not before or after is None:
+            continue
+        if metric not in HIGHER_IS_BETTER and abs(after - before) < NOISE_FLOOR_MS:
+            continue
+        change = (after - before) / before
+        worse = -change if metric in HIGHER_IS_BETTER else change
+        if worse > threshold:
+            regressions.append((name, metric, before, after, change))
+    return regressions
+
+
+def print_table(results):
+    for name, result in results.items():
+        metric = result.get("primary", "p50")
+        unit = "" if metric in HIGHER_IS_BETTER else f" {result.get('unit', 'ms')}"
+        details = "  ".join(
+            f"{key} {result[key]:.2f}" for key in ("mean", "p50", "p95") if key in result and key != metric
+        )
+        print(f"{name:>28}: {metric} {result[metric]:10.2f}{unit}  {details}")
+
+
+def argument_parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--output", help="guardar resultados en JSON (\"-\" = stdout)")
+    parser.add_argument("--baseline", help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--threshold", type=float, default=0.2, help="empeoramiento tolerado (0.2 = 20%%)")
+    return parser
+
+
+def finish(args, suite, results):
+    """Imprime, guarda y compara; devuelve el exit code (1 si hubo regresiones)."""
+    print_table(results)
+    document = write_results(args.output, suite, results) if args.output else {"results": results}
+    if not args.baseline:
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(document, baseline, args.threshold)
+    for name, metric, before, after, change in regressions:
+        print(f"REGRESIÓN {name}: {metric} {before:.2f} -> {after:.2f} ({change:+.0%})", file=sys.stderr)
+    return 1 if regressions else 0
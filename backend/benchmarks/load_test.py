@@ -0,0 +1,243 @@
+"""HTTP load test for the API and the Telegram bot, driven by httpx.
+
+Without --url it starts the whole stack locally: the API under uvicorn on a
+temporary SQLite database and PDF store, and the bot in webhook mode against
+fake_telegram_api, so nothing leaves the machine. Scenarios:
+
+- machines: GET /machines (catalog snapshot + conditional JSON).
+- generate_quote: POST /generate-quote with a distinct client per request, so
+  every request misses the PDF cache and goes through the render pool.
+- bot_quotes: /cotizar updates posted to the webhook; latency is measured from
+  the POST to the moment the fake Telegram API receives the sendDocument.
+
+Each scenario reports requests per second and p50/p95/p99 latency in ms.
+
+    python benchmarks/load_test.py [--requests 200] [--concurrency 16]
+        [--scenarios machines,generate_quote,bot_quotes] [--url http://host:8000]
+        [--output results.json] [--baseline previous.json] [--threshold 0.2]
+
+With --url only the HTTP scenarios run (the bot needs the fake Telegram API).
+Exits with 1 when --baseline is given and some scenario regressed.
+"""
+import os
+import time
+import socket
+import asyncio
+import logging
+import tempfile
+import threading
+from collections import Counter
+
+import httpx
+
+from harness import argument_parser, finish, summarize
+from fake_telegram_api import FakeTelegramServer, command_update
+
+BOT_TOKEN = "123456:LOADTEST"
+WEBHOOK_SECRET = "loadtest"
+SCENARIOS = ("machines", "generate_quote", "bot_quotes")
+
+
+def throughput_result(latencies_ms, elapsed, errors, statuses=None):
+    result = summarize(latencies_ms or [0.0], errors=errors, seconds=elapsed, statuses=statuses or {})
+    result["requests_per_second"] = len(latencies_ms) / elapsed if elapsed else 0.0
+    result["primary"] = "requests_per_second"
+    return result
+
+
+async def run_requests(client, total, concurrency, make_request):
+    """Lanza `total` requests con a lo sumo `concurrency` en vuelo; make_request(i) -> response.
+
+    Solo las respuestas exitosas cuentan para la latencia; los 503 del control de
+    admisión quedan en `statuses` para distinguir rechazo de falla."""
+    latencies, statuses = [], Counter()
+    counter = iter(range(total))
+
+    async def user():
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                status_code = (await make_request(client, i)).status_code
+            except httpx.HTTPError as e:
+                status_code = type(e).__name__
+            statuses[str(status_code)] += 1
+            if isinstance(status_code, int) and status_code < 400:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return throughput_result(latencies, time.perf_counter() - start, total - len(latencies), dict(statuses))
+
+
+def quote_payload(machine_code, i):
+    return {
+        "machineCode": machine_code,
+        "clientCuit": "20-12345678-9",
+        "clientName": f"Cliente Carga {i}",
+        "clientPhone": "+541112345678",
+    }
+
+
+async def http_scenarios(base_url, scenarios, total, concurrency):
+    results = {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        machine_code = (await client.get("/machines")).json()[0]["code"]
+        # Calentamiento fuera de la medición: arranca el pool de render y los caches
+        await client.post("/generate-quote", json=quote_payload(machine_code, "calentamiento"))
+        if "machines" in scenarios:
+            results["machines"] = await run_requests(
+                client, total, concurrency, lambda c, i: c.get("/machines")
+            )
+        if "generate_quote" in scenarios:
+            results["generate_quote"] = await run_requests(
+                client, total, concurrency,
+                lambda c, i: c.post("/generate-quote", json=quote_payload(machine_code, i)),
+            )
+    return results, machine_code
+
+
+async def bot_scenario(base_url, telegram, machine_code, total, concurrency):
+    # Cada update usa un chat distinto: el sendDocument se asocia por chat_id
+    first_chat = 10_000 + len(telegram.calls)
+    sent_at = {}
+    done = asyncio.Event()
+    delivered, rejected = {}, set()
+    loop = asyncio.get_running_loop()
+
+    def on_reply(method, chat_id):
+        # Un sendMessage a estos chats es el aviso de pool saturado (o un error)
+        if method == "sendDocument":
+            delivered[chat_id] = time.perf_counter()
+        else:
+            rejected.add(chat_id)
+        if len(delivered) + len(rejected) >= total:
+            done.set()
+
+    telegram.on_reply = lambda method, chat_id: loop.call_soon_threadsafe(on_reply, method, chat_id)
+
+    async def post_update(client, i):
+        chat_id = first_chat + i
+        text = f'/cotizar {machine_code} 20-12345678-9 "Cliente Bot {i}" +541112345678'
+        sent_at[chat_id] = time.perf_counter()
+        return await client.post(
+            "/telegram/webhook", json=command_update(chat_id, text, user_id=chat_id),
+            headers={"X-Telegram-Bot-Api-Secret-Token": WEBHOOK_SECRET},
+        )
+
+    start = time.perf_counter()
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        accepted = await run_requests(client, total, concurrency, post_update)
+    try:
+        await asyncio.wait_for(done.wait(), timeout=max(60, total))
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - start
+    latencies = [(delivered[chat] - sent_at[chat]) * 1000 for chat in delivered if chat in sent_at]
+    result = throughput_result(latencies, elapsed, total - len(latencies), accepted["statuses"])
+    result["rejected"] = len(rejected - set(delivered))
+    result["updates_per_second"] = result.pop("requests_per_second")
+    result["primary"] = "updates_per_second"
+    return result
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class LocalStack:
+    """API + bot en webhook + Telegram falso, sobre una base y un store temporales."""
+
+    def __init__(self):
+        self.tmp = tempfile.mkdtemp(prefix="agromaq-load-")
+        self.telegram = FakeTelegramServer(on_call=self._on_call)
+        self.telegram.on_reply = None
+        self.port = free_port()
+        self.server = None
+        self.thread = None
+
+    def _on_call(self, method, payload):
+        if method in ("sendDocument", "sendMessage") and self.telegram.on_reply:
+            self.telegram.on_reply(method, int(payload["chat_id"]))
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        self.telegram.start()
+        # Todo esto se lee al importar main, por eso va antes del import
+        os.environ.update({
+            "DATABASE_URL": f"sqlite:///{os.path.join(self.tmp, 'load.db')}",
+            "PDF_STORE_DIR": os.path.join(self.tmp, "storage"),
+            "CATALOG_SNAPSHOT_PATH": os.path.join(self.tmp, "catalog_snapshot.json"),
+            "BOT_TOKEN": BOT_TOKEN,
+            "TELEGRAM_WEBHOOK_URL": "https://agromaq.loadtest",
+            "TELEGRAM_WEBHOOK_SECRET": WEBHOOK_SECRET,
+            "TELEGRAM_API_BASE_URL": self.telegram.base_url,
+            "TELEGRAM_BOT_IN_API": "true",
+            "LEADER_LOCK_DIR": self.tmp,
+            # Todo el tráfico sale de una sola IP: se mide el pipeline, no el límite por cliente
+            "RATE_LIMIT_BACKEND": "off",
+        })
+        import uvicorn
+        from migrate import migrate
+        import main
+
+        # La API ya no crea tablas ni carga el catálogo: igual que en un despliegue
+        migrate()
+
+        self.server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        # El bot arranca en una tarea aparte del startup: esperar a que acepte webhooks
+        deadline = time.monotonic() + 30
+        while not main.telegram_bot.accepts_webhooks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join()
+        self.telegram.stop()
+
+
+async def run(args, stack):
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    base_url = args.url or stack.base_url
+    results, machine_code = await http_scenarios(base_url, scenarios, args.requests, args.concurrency)
+    if "bot_quotes" in scenarios:
+        if stack is None:
+            print("bot_quotes se omite con --url: necesita el Telegram falso local")
+        else:
+            results["bot_quotes"] = await bot_scenario(
+                base_url, stack.telegram, machine_code, args.requests, args.concurrency
+            )
+    return results
+
+
+def main():
+    parser = argument_parser("Prueba de carga de la API y el bot")
+    parser.add_argument("--url", help="API ya levantada; si falta se levanta una local")
+    parser.add_argument("--requests", type=int, default=200, help="requests por escenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    args = parser.parse_args()
+    # El log por request de httpx ensucia la salida y suma costo a la medición
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    stack = None if args.url else LocalStack().start()
+    try:
+        results = asyncio.run(run(args, stack))
+    finally:
+        if stack:
+            stack.stop()
+    raise SystemExit(finish(args, "load", results))
+
+
+if __name__ == "__main__":
+    main()
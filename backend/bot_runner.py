@@ -0,0 +1,88 @@
+"""Proceso independiente del bot de Telegram (modo polling).
+
+    python bot_runner.py
+
+Con TELEGRAM_BOT_IN_API=false la API no arranca el bot y se puede escalar a
+varios workers; este proceso (uno o varios, por redundancia) toma el leader
+lock "telegram-bot" y solo el que lo obtiene hace polling. El líder verifica el
+lock cada LEADER_LOCK_CHECK_INTERVAL segundos y, si lo perdió, detiene el bot y
+vuelve a esperar. En modo webhook no hace falta: los updates llegan a
+/telegram/webhook en cualquier worker.
+"""
+import os
+import sys
+import signal
+import asyncio
+import logging
+from dotenv import load_dotenv
+from telegram_bot import TelegramBot
+from leader_lock import leader_lock, wait_for_lock
+
+BOT_LOCK_NAME = "telegram-bot"
+
+
+async def hold_lock(lock, stopper, check_interval):
+    """Espera a `stopper` verificando el lock cada `check_interval` segundos.
+    Devuelve False si el lock se perdió antes (p. ej. se cayó la conexión a la base)."""
+    while True:
+        done, _ = await asyncio.wait({stopper}, timeout=check_interval)
+        if done:
+            return True
+        if not await asyncio.to_thread(lock.check):
+            return False
+
+
+async def run_bot(bot=None, lock=None, stop_event=None, check_interval=None):
+    bot = bot or TelegramBot()
+    if not bot.token:
+        logging.error("BOT_TOKEN not set")
+        return 1
+    if bot.mode != "polling":
+        logging.error("bot_runner only supports polling; webhooks are served by the API")
+        return 1
+    lock = lock or leader_lock(BOT_LOCK_NAME)
+    stop_event = stop_event or asyncio.Event()
+    if check_interval is None:
+        check_interval = float(os.getenv("LEADER_LOCK_CHECK_INTERVAL", "10"))
+
+    stopper = asyncio.create_task(stop_event.wait())
+    waiter = None
+    try:
+        while True:
+            waiter = asyncio.create_task(wait_for_lock(lock))
+            await asyncio.wait({waiter, stopper}, return_when=asyncio.FIRST_COMPLETED)
+            if not waiter.done():
+                waiter.cancel()
+                return 0
+            try:
+                logging.info("Leader lock acquired, starting Telegram bot")
+                await bot.start()
+                held = await hold_lock(lock, stopper, check_interval)
+            finally:
+                await bot.stop()
+                lock.release()
+            if held:
+                return 0
+            # Otro proceso pudo haber tomado el lock: se deja de hacer polling y se vuelve a esperar
+            logging.error("Leader lock lost, Telegram bot stopped; waiting to reacquire")
+    finally:
+        # Si cancelan la tarea mientras espera, que no siga intentando tomar el lock
+        if waiter is not None:
+            waiter.cancel()
+        stopper.cancel()
+
+
+async def main():
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:  # Windows
+            pass
+    return await run_bot(stop_event=stop_event)
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from db import Machine, SQLALCHEMY_DATABASE_URL
+from http_cache import PreparedBody
+from machine_search import SearchIndex
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MACHINE_FIELDS = ("id", "code", "name", "price", "category", "description", "active")
+
+
+def machine_to_dict(machine):
+    if isinstance(machine, dict):
+        # Filas leídas del snapshot en disco
+        return {field: machine.get(field) for field in MACHINE_FIELDS}
+    return {field: getattr(machine, field) for field in MACHINE_FIELDS}
+
+
+class CatalogSnapshot:
+    """Foto inmutable del catálogo activo, indexada por código y por categoría."""
+
+    def __init__(self, machines):
+        self.machines = [machine_to_dict(m) for m in machines]
+        self.by_code = {m["code"]: m for m in self.machines}
+        self.by_category = {}
+        for machine in self.machines:
+            self.by_category.setdefault(machine["category"], []).append(machine)
+        # La versión depende solo del contenido: es la misma en todos los workers
+        payload = json.dumps(self.machines, sort_keys=True, ensure_ascii=False, default=str)
+        self.version = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+        self.loaded_at = time.monotonic()
+        self._body = None
+        self._category_tree = None
+        self._category_body = None
+        self._search_index = None
+
+    @property
+    def body(self):
+        # JSON de /machines serializado (y comprimido) una vez por versión
+        if self._body is None:
+            self._body = PreparedBody(self.machines, tag=self.version)
+        return self._body
+
+    @property
+    def category_tree(self):
+        # [{"categoria", "productos": [{code, name, price}]}], categorías y productos
+        # por nombre; lo comparten /machines/catalog y /listar_maquinas
+        if self._category_tree is None:
+            self._category_tree = [
+                {
+                    "categoria": category,
+                    "productos": [
+                        {"code": m["code"], "name": m["name"], "price": m["price"]}
+                        for m in sorted(machines, key=lambda m: (m["name"] or "").lower())
+                    ],
+                }
+                for category, machines in sorted(self.by_category.items(), key=lambda item: (item[0] or "").lower())
+            ]
+        return self._category_tree
+
+    @property
+    def category_body(self):
+        if self._category_body is None:
+            self._category_body = PreparedBody(self.category_tree, tag=f"{self.version}-categorias")
+        return self._category_body
+
+    @property
+    def search_index(self):
+        # Se arma en la primera búsqueda y se descarta junto con la foto
+        if self._search_index is None:
+            self._search_index = SearchIndex(self.machines)
+        return self._search_index
+
+    async def search_index_async(self):
+        # Armar el índice lleva casi un segundo con 20k máquinas: fuera del event
+        # loop. Dos primeras búsquedas simultáneas solo lo arman dos veces
+        if self._search_index is None:
+            self._search_index = await asyncio.to_thread(SearchIndex, self.machines)
+        return self._search_index
+
+
+class CatalogCache:
+    """Cache read-through del catálogo de máquinas.
+
+    Las lecturas se sirven desde la última foto sin ir a la base. Los cambios de
+    precio llaman a `refresh`, que arma una foto nueva y la reemplaza de una vez,
+    así los lectores ven la anterior o la nueva, nunca una mezcla. CATALOG_CACHE_TTL
+    (segundos, 0 = sin vencimiento) acota cuánto puede atrasarse un worker cuando
+    el cambio se hizo en otro proceso; si al recargar la versión no cambió, se
+    sigue usando la misma foto.
+
+    `save` deja la foto en CATALOG_SNAPSHOT_PATH (lo hace migrate.py al
+    desplegar) junto con la base de la que salió y cuándo; `preload` la lee al
+    arrancar, así el primer /machines no espera a la base. Una foto de otra base
+    se descarta, y el TTL cuenta desde que se guardó, no desde el arranque.
+    """
+
+    def __init__(self, ttl=None, snapshot_path=None, database_url=None):
+        self.ttl = float(os.getenv("CATALOG_CACHE_TTL", "60")) if ttl is None else ttl
+        self.snapshot_path = snapshot_path or os.getenv(
+            "CATALOG_SNAPSHOT_PATH", os.path.join(BASE_DIR, "storage", "catalog_snapshot.json")
+        )
+        # Identifica la base sin guardar la contraseña en el archivo
+        self.database = make_url(database_url or SQLALCHEMY_DATABASE_URL).render_as_string(hide_password=True)
+        self._snapshot = None
+        self._lock = threading.Lock()
+        # Contadores aproximados (sin lock), solo para métricas
+        self.hits = 0
+        self.misses = 0
+
+    def _expired(self, snapshot):
+        return snapshot is None or (self.ttl > 0 and time.monotonic() - snapshot.loaded_at > self.ttl)
+
+    def _load(self, db):
+        machines = db.query(Machine).filter(Machine.active == True).order_by(Machine.id).all()
+        return CatalogSnapshot(machines)
+
+    def _install(self, snapshot):
+        # Si el contenido no cambió se conserva la foto actual (cuerpos ya
+        # serializados, índice de búsqueda) y solo se renueva su vencimiento
+        current = self._snapshot
+        if current is not None and current.version == snapshot.version:
+            current.loaded_at = snapshot.loaded_at
+            return current
+        self._snapshot = snapshot
+        return snapshot
+
+    def snapshot(self, db):
+        snapshot = self._snapshot
+        if not self._expired(snapshot):
+            self.hits += 1
+            return snapshot
+        self.misses += 1
+        with self._lock:
+            # Otro thread pudo haberla recargado mientras esperábamos el lock
+            if self._expired(self._snapshot):
+                self._install(self._load(db))
+            return self._snapshot
+
+    def refresh(self, db):
+        with self._lock:
+            return self._install(self._load(db))
+
+    # Variantes para AsyncSession. No toman el lock: un threading.Lock retenido
+    # mientras se espera la base bloquearía al resto del event loop. Dos cargas
+    # simultáneas solo duplican trabajo; el reemplazo de la foto sigue siendo atómico.
+    async def _load_async(self, db):
+        result = await db.execute(select(Machine).where(Machine.active == True).order_by(Machine.id))
+        machines = [machine_to_dict(m) for m in result.scalars().all()]
+        # Serializar y hashear el catálogo entero también va fuera del event loop
+        return await asyncio.to_thread(CatalogSnapshot, machines)
+
+    async def snapshot_async(self, db):
+        snapshot = self._snapshot
+        if not self._expired(snapshot):
+            self.hits += 1
+            return snapshot
+        self.misses += 1
+        return self._install(await self._load_async(db))
+
+    async def refresh_async(self, db):
+        return self._install(await self._load_async(db))
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def save(self, snapshot=None):
+        snapshot = snapshot or self._snapshot
+        directory = os.path.dirname(self.snapshot_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"database": self.database, "saved_at": time.time(), "machines": snapshot.machines},
+                    f, ensure_ascii=False, default=str,
+                )
+            os.replace(tmp_path, self.snapshot_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def preload(self):
+        # Sin archivo (o ilegible) no pasa nada: la primera lectura va a la base
+        if self._snapshot is not None:
+            return self._snapshot
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("database") != self.database:
+                # P. ej. la foto de la base SQLite del build en un contenedor que usa PostgreSQL
+                raise ValueError(f"taken from {data.get('database')}, not {self.database}")
+            machines, saved_at = data["machines"], float(data["saved_at"])
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            logging.warning(f"Ignoring catalog snapshot {self.snapshot_path}: {e}")
+            return None
+        snapshot = CatalogSnapshot(machines)
+        # La antigüedad es la del archivo: una foto guardada hace más de un TTL ya
+        # está vencida y la primera lectura va a la base
+        snapshot.loaded_at -= max(0.0, time.time() - saved_at)
+        self._snapshot = snapshot
+        return snapshot
+
+    @property
+    def version(self):
+        snapshot = self._snapshot
+        return snapshot.version if snapshot else None
+
+
+catalog_cache = CatalogCache()
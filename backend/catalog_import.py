@@ -0,0 +1,246 @@
+"""Importación masiva del catálogo de máquinas.
+
+Acepta el backup original (lista de categorías con productos), JSON/JSON Lines
+con una máquina por elemento y CSV con columnas code,name,price,category,
+description,active. Las filas se procesan por bloques a medida que se leen y se
+hace upsert por `Machine.code` en una sola transacción; el resultado es un
+reporte con lo creado, lo modificado y lo desactivado.
+
+    python catalog_import.py precios.csv [--dry-run] [--deactivate-missing]
+"""
+import os
+import io
+import csv
+import sys
+import json
+import argparse
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from db import SessionLocal, Machine
+
+BACKUP_PATH = os.path.join(os.path.dirname(__file__), "data_machinery_backup.json")
+IMPORT_FIELDS = ("name", "price", "category", "description", "active")
+CHUNK_SIZE = 500
+TRUE_VALUES = ("1", "true", "si", "sí", "yes", "y")
+
+
+class CatalogImportError(Exception):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(errors[:5]) + (" ..." if len(errors) > 5 else ""))
+
+
+def backup_records(catalog):
+    # Mismos códigos y precios de ejemplo que generaba el seed original
+    id_counter = 1
+    for category in catalog:
+        for producto in category["productos"]:
+            yield {
+                "code": f"{category['categoria'][:3].upper()}{str(id_counter).zfill(3)}",
+                "name": producto,
+                "price": float(10000 + (id_counter * 1000)),  # Sample pricing
+                "category": category["categoria"],
+                "description": f"Descripción de {producto}",
+                "active": True,
+            }
+            id_counter += 1
+
+
+def load_backup(path=BACKUP_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return list(backup_records(json.load(f)))
+
+
+def iter_json_records(stream):
+    data = json.load(stream)
+    if data and isinstance(data, list) and "productos" in data[0]:
+        yield from backup_records(data)
+    else:
+        yield from data
+
+
+def iter_jsonl_records(stream):
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_csv_records(stream):
+    for row in csv.DictReader(stream):
+        yield {key.strip(): value for key, value in row.items() if key}
+
+
+def iter_records(stream, fmt):
+    readers = {"json": iter_json_records, "jsonl": iter_jsonl_records, "csv": iter_csv_records}
+    if fmt not in readers:
+        raise CatalogImportError([f"Formato no soportado: {fmt}"])
+    return readers[fmt](stream)
+
+
+def detect_format(filename):
+    extension = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    return {"ndjson": "jsonl"}.get(extension, extension or "json")
+
+
+def normalize_record(record, line):
+    code = str(record.get("code") or "").strip()
+    if not code:
+        raise ValueError(f"fila {line}: falta el código")
+    try:
+        price = float(str(record.get("price")).replace(",", "."))
+    except (TypeError, ValueError):
+        raise ValueError(f"fila {line} ({code}): precio inválido {record.get('price')!r}")
+    if price < 0:
+        raise ValueError(f"fila {line} ({code}): precio negativo")
+    active = record.get("active", True)
+    if isinstance(active, str):
+        active = active.strip().lower() in TRUE_VALUES if active.strip() else True
+    name = str(record.get("name") or "").strip()
+    return {
+        "code": code,
+        "name": name or code,
+        "price": price,
+        "category": str(record.get("category") or "").strip(),
+        "description": str(record.get("description") or f"Descripción de {name or code}"),
+        "active": bool(active),
+    }
+
+
+def _upsert(db, rows):
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite_insert if dialect == "sqlite" else postgresql_insert
+        statement = insert(Machine).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[Machine.code],
+            set_={field: statement.excluded[field] for field in IMPORT_FIELDS},
+        )
+        db.execute(statement)
+        return
+    # Otros motores: sin upsert nativo, se actualiza o agrega fila por fila
+    existing = {m.code: m for m in db.scalars(select(Machine).where(Machine.code.in_([r["code"] for r in rows])))}
+    for row in rows:
+        machine = existing.get(row["code"])
+        if machine is None:
+            db.add(Machine(**row))
+        else:
+            for field in IMPORT_FIELDS:
+                setattr(machine, field, row[field])
+
+
+def import_catalog(db, records, dry_run=False, deactivate_missing=False, chunk_size=CHUNK_SIZE):
+    report = {"created": [], "updated": [], "unchanged": 0, "deactivated": [], "dry_run": dry_run}
+    errors = []
+    seen = set()
+
+    def flush(chunk):
+        codes = [row["code"] for row in chunk]
+        # Se leen columnas y no entidades: el upsert es Core y no actualizaría
+        # objetos que quedaran cargados en la sesión
+        columns = [getattr(Machine, field) for field in IMPORT_FIELDS]
+        current = {
+            code: dict(zip(IMPORT_FIELDS, values))
+            for code, *values in db.execute(select(Machine.code, *columns).where(Machine.code.in_(codes)))
+        }
+        changed = []
+        for row in chunk:
+            machine = current.get(row["code"])
+            if machine is None:
+                report["created"].append(row["code"])
+                changed.append(row)
+                continue
+            changes = {
+                field: [machine[field], row[field]]
+                for field in IMPORT_FIELDS if machine[field] != row[field]
+            }
+            if changes:
+                report["updated"].append({"code": row["code"], "changes": changes})
+                changed.append(row)
+            else:
+                report["unchanged"] += 1
+        if changed and not dry_run:
+            _upsert(db, changed)
+
+    try:
+        chunk = []
+        for line, record in enumerate(records, 1):
+            try:
+                row = normalize_record(record, line)
+            except ValueError as e:
+                errors.append(str(e))
+                continue
+            if row["code"] in seen:
+                errors.append(f"fila {line}: código duplicado {row['code']}")
+                continue
+            seen.add(row["code"])
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+                chunk = []
+        if chunk:
+            flush(chunk)
+        if errors:
+            raise CatalogImportError(errors)
+
+        if deactivate_missing:
+            active_codes = db.scalars(select(Machine.code).where(Machine.active == True)).all()
+            missing = sorted(set(active_codes) - seen)
+            report["deactivated"] = missing
+            if not dry_run:
+                for start in range(0, len(missing), chunk_size):
+                    db.execute(
+                        update(Machine)
+                        .where(Machine.code.in_(missing[start:start + chunk_size]))
+                        .values(active=False)
+                    )
+
+        if dry_run:
+            db.rollback()
+        else:
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return report
+
+
+def summarize(report):
+    return {
+        "created": len(report["created"]),
+        "updated": len(report["updated"]),
+        "unchanged": report["unchanged"],
+        "deactivated": len(report["deactivated"]),
+        "dry_run": report["dry_run"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa el catálogo de máquinas (JSON, JSON Lines o CSV)")
+    parser.add_argument("path", nargs="?", default=BACKUP_PATH, help="archivo a importar (por defecto el backup)")
+    parser.add_argument("--format", choices=("json", "jsonl", "csv"), help="formato si no se deduce de la extensión")
+    parser.add_argument("--dry-run", action="store_true", help="solo reportar diferencias, sin guardar")
+    parser.add_argument("--deactivate-missing", action="store_true", help="desactivar máquinas ausentes del archivo")
+    parser.add_argument("--verbose", action="store_true", help="imprimir el reporte completo")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        with io.open(args.path, "r", encoding="utf-8-sig", newline="") as stream:
+            report = import_catalog(
+                db,
+                iter_records(stream, args.format or detect_format(args.path)),
+                dry_run=args.dry_run,
+                deactivate_missing=args.deactivate_missing,
+            )
+    except CatalogImportError as e:
+        print("\n".join(e.errors), file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+    print(json.dumps(report if args.verbose else summarize(report), ensure_ascii=False, indent=2, default=str))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""Actualización masiva de precios del catálogo.
+
+Combina precios explícitos por código con reglas porcentuales por categoría
+(una regla sin categoría aplica a todo el catálogo; la de la categoría tiene
+prioridad y el precio explícito gana sobre ambas). Los precios nuevos se
+calculan en memoria sobre filas leídas con SELECT ... FOR UPDATE y se escriben
+con un UPDATE ... CASE por bloque, todo en una sola transacción.
+"""
+from sqlalchemy import select, update, case
+from db import Machine
+
+CHUNK_SIZE = 500
+
+
+class RepricingError(Exception):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(errors[:5]) + (" ..." if len(errors) > 5 else ""))
+
+
+def round_price(price, round_to=None):
+    if round_to:
+        return round(round(price / round_to) * round_to, 2)
+    return round(price, 2)
+
+
+def plan_repricing(machines, prices=None, rules=None, round_to=None):
+    """Devuelve (resultados por fila, errores) sin tocar la base.
+
+    `machines` son tuplas (code, category, price); `rules` dicts con
+    `category` (o None) y `percent`.
+    """
+    prices = prices or {}
+    errors = []
+    rules_by_category = {}
+    for rule in rules or []:
+        category = rule.get("category") or None
+        if category in rules_by_category:
+            errors.append(f"regla duplicada para {category or 'todo el catálogo'}")
+        rules_by_category[category] = float(rule["percent"])
+
+    results = []
+    found = set()
+    for code, category, price in machines:
+        if code in prices:
+            new_price = round_price(float(prices[code]), round_to)
+        elif category in rules_by_category or None in rules_by_category:
+            percent = rules_by_category.get(category, rules_by_category.get(None))
+            new_price = round_price(price * (1 + percent / 100), round_to)
+        else:
+            continue
+        found.add(code)
+        if new_price < 0:
+            errors.append(f"{code}: el precio resultante es negativo ({new_price})")
+        results.append({
+            "code": code,
+            "old_price": price,
+            "new_price": new_price,
+            "status": "updated" if new_price != price else "unchanged",
+        })
+    for code in prices:
+        if code not in found:
+            results.append({"code": code, "old_price": None, "new_price": None, "status": "not_found"})
+    return results, errors
+
+
+def reprice_catalog(db, prices=None, rules=None, round_to=None, dry_run=False, chunk_size=CHUNK_SIZE):
+    prices = prices or {}
+    query = select(Machine.code, Machine.category, Machine.price)
+    # Sin reglas solo hace falta leer los códigos pedidos
+    if not rules:
+        query = query.where(Machine.code.in_(list(prices)))
+    if not dry_run:
+        # Los precios nuevos salen de los leídos acá: las filas quedan bloqueadas hasta
+        # el commit para que un /set_price o PUT /machines concurrente no se pierda
+        # (PostgreSQL; SQLite ya serializa las escrituras y no conoce FOR UPDATE)
+        query = query.with_for_update()
+    try:
+        results, errors = plan_repricing(db.execute(query.order_by(Machine.id)).all(), prices, rules, round_to)
+        if errors:
+            raise RepricingError(errors)
+
+        changed = [row for row in results if row["status"] == "updated"]
+        if changed and not dry_run:
+            for start in range(0, len(changed), chunk_size):
+                block = changed[start:start + chunk_size]
+                new_prices = {row["code"]: row["new_price"] for row in block}
+                db.execute(
+                    update(Machine)
+                    .where(Machine.code.in_(list(new_prices)))
+                    .values(price=case(new_prices, value=Machine.code))
+                    .execution_options(synchronize_session=False)
+                )
+        if dry_run:
+            db.rollback()
+        else:
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return {
+        "updated": len(changed),
+        "unchanged": sum(1 for row in results if row["status"] == "unchanged"),
+        "not_found": [row["code"] for row in results if row["status"] == "not_found"],
+        "dry_run": dry_run,
+        "results": results,
+    }
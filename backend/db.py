@@ -1,91 +1,163 @@
-import os
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, Boolean
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from datetime import datetime
-
-# Database setup
-SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./agromaq_enhanced.db")
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
-
-# Enhanced Models
-def get_base():
-    return Base
-
-class Machine(Base):
-    __tablename__ = "machines"
-    id = Column(Integer, primary_key=True, index=True)
-    code = Column(String, unique=True, index=True)
-    name = Column(String)
-    price = Column(Float)
-    category = Column(String)
-    description = Column(Text)
-    active = Column(Boolean, default=True)
-
-class Quotation(Base):
-    __tablename__ = "quotations"
-    id = Column(Integer, primary_key=True, index=True)
-    machine_code = Column(String)
-    client_cuit = Column(String)
-    client_name = Column(String)
-    client_phone = Column(String)
-    client_email = Column(String, nullable=True)
-    client_company = Column(String, nullable=True)
-    notes = Column(Text, nullable=True)
-    discount_applied = Column(Boolean, default=False)
-    discount_percent = Column(Float, default=0.0)  # Nuevo campo para porcentaje de descuento
-    final_price = Column(Float)
-    created_at = Column(DateTime, default=datetime.utcnow)
-
-Base.metadata.create_all(bind=engine)
-
-# Machinery catalog
-MACHINERY_CATALOG = [
-    {
-        "categoria": "Acoplados rurales",
-        "productos": [
-            "Acoplado rural playo",
-            "Acoplado rural vaquero desmontable",
-            "Acoplado rural vaquero desmontable 2",
-            "Acoplado rural vaquero fijo",
-            "Acoplado totalmente desmontable",
-            "Acoplado volcador manual o hidráulico",
-            "Acoplado volcador trivuelo de uso rural"
-        ]
-    },
-    {
-        "categoria": "Acoplados tanque",
-        "productos": [
-            "Acoplado tanque 3000 Lts.",
-            "Acoplado tanque de 1500 Lts.",
-            "Acoplado tanque de plástico 12.000 Lts.",
-            "Acoplado tanque de plástico 1500 Lts.",
-            "Acoplado tanque de plástico 3500 Lts.",
-            "Acoplado tanque de plástico 7000 Lts.",
-            "Acoplado tanques rurales"
-        ]
-    },
-    {
-        "categoria": "Tolvas",
-        "productos": [
-            "Acoplado tolva cerealero 4 TT.",
-            "Acoplado tolva cerealero 8 TT.",
-            "Acoplado Tolva para semillas y fertilizantes de uso rural",
-            "Acoplado Tolva Para Semillas Y Fertilizantes De Uso Rural",
-            "Acoplado tolva para semillas y fertilizantes modelo A.T.F. 10",
-            "Acoplado tolva para semillas y fertilizantes modelo A.T.F. 14",
-            "Acoplado tolva para semillas y fertilizantes Modelo A.T.F. 24",
-            "Acoplados tolvas para semillas y fertilizantes Modelo A.T.F. 12"
-        ]
-    },
-    {
-        "categoria": "Cargadores y elevadores",
-        "productos": [
-            "Cargador y transportador de rollos hidráulico T.R.A. 6000",
-            "Elevador de rollos",
-            "Grúa giratoria hidráulica multipropósito de uso rural"
-        ]
-    },
-] 
+import os
+from sqlalchemy import create_engine, event, Column, Integer, String, Float, DateTime, Text, Boolean, Index
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from datetime import datetime
+from metrics import instrument_engine
+
+def _env_bool(name, default):
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+def normalize_database_url(url):
+    # Render/Heroku entregan postgres://, que SQLAlchemy 2 ya no acepta
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+def is_sqlite(url):
+    return url.startswith("sqlite")
+
+def is_sqlite_memory(url):
+    return url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+
+def engine_options(url):
+    # Todo configurable por entorno; los valores por defecto sirven para un solo worker en Render
+    if is_sqlite(url):
+        return {
+            # Web (threadpool) y bot comparten conexiones entre threads
+            "connect_args": {
+                "check_same_thread": False,
+                "timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")) / 1000,
+            },
+        }
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+    }
+
+def configure_sqlite(engine, url):
+    journal_mode = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    synchronous = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    busy_timeout_ms = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    memory = is_sqlite_memory(url)
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # WAL: los lectores no bloquean al escritor (web y bot escriben a la vez)
+        if journal_mode and not memory:
+            cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+        if synchronous:
+            cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.execute(f"PRAGMA busy_timeout={busy_timeout_ms}")
+        cursor.close()
+
+def create_configured_engine(url):
+    url = normalize_database_url(url)
+    engine = create_engine(url, **engine_options(url))
+    if is_sqlite(url):
+        configure_sqlite(engine, url)
+    return engine
+
+def async_database_url(url):
+    # Mismo DATABASE_URL, con el driver asyncio equivalente
+    url = normalize_database_url(url)
+    for prefix, async_prefix in (
+        ("sqlite://", "sqlite+aiosqlite://"),
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+    ):
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
+
+def create_configured_async_engine(url):
+    url = normalize_database_url(url)
+    async_engine = create_async_engine(async_database_url(url), **engine_options(url))
+    if is_sqlite(url):
+        configure_sqlite(async_engine.sync_engine, url)
+    return async_engine
+
+# Database setup
+SQLALCHEMY_DATABASE_URL = normalize_database_url(os.getenv("DATABASE_URL", "sqlite:///./agromaq_enhanced.db"))
+engine = create_configured_engine(SQLALCHEMY_DATABASE_URL)
+# expire_on_commit=False: las filas recién guardadas se siguen leyendo sin otro SELECT
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+# Sesiones asyncio para los handlers async (API y bot): la I/O de la base no bloquea el event loop
+async_engine = create_configured_async_engine(SQLALCHEMY_DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+Base = declarative_base()
+
+# Enhanced Models
+def get_base():
+    return Base
+
+class Machine(Base):
+    __tablename__ = "machines"
+    id = Column(Integer, primary_key=True, index=True)
+    code = Column(String, unique=True, index=True)
+    name = Column(String)
+    price = Column(Float)
+    category = Column(String)
+    description = Column(Text)
+    active = Column(Boolean, default=True)
+
+class Quotation(Base):
+    __tablename__ = "quotations"
+    id = Column(Integer, primary_key=True, index=True)
+    machine_code = Column(String)
+    client_cuit = Column(String)
+    client_name = Column(String)
+    client_phone = Column(String)
+    client_email = Column(String, nullable=True)
+    client_company = Column(String, nullable=True)
+    notes = Column(Text, nullable=True)
+    discount_applied = Column(Boolean, default=False)
+    discount_percent = Column(Float, default=0.0)  # Nuevo campo para porcentaje de descuento
+    final_price = Column(Float)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Índices para la paginación keyset de /quotations (orden created_at desc, id desc)
+    __table_args__ = (
+        Index("ix_quotations_created_at_id", "created_at", "id"),
+        Index("ix_quotations_machine_code_created_at_id", "machine_code", "created_at", "id"),
+        Index("ix_quotations_client_cuit_created_at_id", "client_cuit", "created_at", "id"),
+        Index("ix_quotations_discount_applied_created_at_id", "discount_applied", "created_at", "id"),
+    )
+
+class QuoteJob(Base):
+    # Cola persistente de cotizaciones asíncronas (ver quote_jobs.py)
+    __tablename__ = "quote_jobs"
+    id = Column(String(32), primary_key=True)
+    status = Column(String(16), default="pending", nullable=False)
+    payload = Column(Text, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    error = Column(Text, nullable=True)
+    quotation_id = Column(Integer, nullable=True)
+    filename = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    lease_expires_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_quote_jobs_status_created", "status", "created_at"),
+    )
+
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
+def ensure_indexes(bind=engine):
+    # create_all no agrega índices nuevos a tablas existentes
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+def init_db(bind=engine):
+    # Crea tablas e índices faltantes. Lo corre migrate.py antes de levantar la
+    # API, no cada import: así un arranque en frío no espera DDL contra la base
+    Base.metadata.create_all(bind=bind)
+    ensure_indexes(bind)
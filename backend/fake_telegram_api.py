@@ -0,0 +1,109 @@
+"""Bot API de Telegram mínima para tests y benchmarks.
+
+Responde los métodos que usa el bot (getMe, setWebhook, sendMessage,
+sendDocument...) y registra cada llamada. `FakeTelegramServer` la levanta con
+uvicorn en un puerto local; el bot se apunta con TELEGRAM_API_BASE_URL.
+"""
+import time
+import socket
+import threading
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def _message(payload, **extra):
+    return {
+        "message_id": 1,
+        "date": int(time.time()),
+        "chat": {"id": int(payload.get("chat_id", 0)), "type": "private"},
+        **extra,
+    }
+
+
+def command_update(update_id, text, user_id=42):
+    # Update de Telegram con un comando de texto, como lo manda el webhook
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": int(time.time()), "text": text,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Juan", "username": "juan"},
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}],
+        },
+    }
+
+
+def fake_telegram_api(on_call=None):
+    api = FastAPI()
+    api.state.calls = []
+    api.state.file_ids = set()
+
+    @api.post("/bot{token}/{method}")
+    async def method(token: str, method: str, request: Request):
+        content_type = request.headers.get("content-type", "")
+        if "form" in content_type:
+            form = await request.form()
+            # Los archivos se registran por tamaño, no por contenido
+            payload = {
+                key: (len(await value.read()) if hasattr(value, "read") else value)
+                for key, value in form.multi_items()
+            }
+        else:
+            payload = await request.json() if await request.body() else {}
+        api.state.calls.append((method, payload))
+        if on_call:
+            on_call(method, payload)
+        if method == "getMe":
+            return {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Agromaq", "username": "agromaq_bot"}}
+        if method == "sendMessage":
+            return {"ok": True, "result": _message(payload, text=payload.get("text", ""))}
+        if method == "sendDocument":
+            document = payload.get("document")
+            if isinstance(document, str):
+                # Reenvío por file_id: solo vale uno que haya devuelto esta API
+                if document not in api.state.file_ids:
+                    return JSONResponse(status_code=400, content={
+                        "ok": False, "error_code": 400,
+                        "description": "Bad Request: wrong file identifier/HTTP URL specified",
+                    })
+                file_id = document
+            else:
+                file_id = f"file-{len(api.state.calls)}"
+                api.state.file_ids.add(file_id)
+            return {"ok": True, "result": _message(payload, document={
+                "file_id": file_id,
+                "file_unique_id": f"unique-{file_id}",
+            })}
+        return {"ok": True, "result": True}
+
+    return api
+
+
+class FakeTelegramServer:
+    def __init__(self, on_call=None):
+        self.api = fake_telegram_api(on_call)
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self._server = uvicorn.Server(uvicorn.Config(self.api, host="127.0.0.1", port=self.port, log_level="warning"))
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}/bot"
+
+    @property
+    def calls(self):
+        return self.api.state.calls
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self._server.should_exit = True
+        self._thread.join()
@@ -0,0 +1,149 @@
+import json
+import gzip
+import hashlib
+import threading
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional; sin él solo se ofrece gzip
+    brotli = None
+
+# Por debajo de este tamaño comprimir no compensa
+MIN_COMPRESS_SIZE = 256
+
+
+class PreparedBody:
+    """Respuesta JSON serializada una sola vez, con sus variantes comprimidas.
+
+    Cada codificación tiene su propio ETag fuerte ("<tag>", "<tag>-gzip",
+    "<tag>-br"); todos derivan del mismo tag, así que cualquiera de ellos en
+    If-None-Match alcanza para responder 304.
+    """
+
+    def __init__(self, payload, tag=None):
+        self.identity = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+        self.tag = tag or hashlib.sha256(self.identity).hexdigest()[:16]
+        self._encoded = {"identity": self.identity}
+        self._lock = threading.Lock()
+
+    def etag(self, encoding="identity"):
+        return f'"{self.tag}"' if encoding == "identity" else f'"{self.tag}-{encoding}"'
+
+    def encoded(self, encoding):
+        body = self._encoded.get(encoding)
+        if body is None:
+            with self._lock:
+                body = self._encoded.get(encoding)
+                if body is None:
+                    if encoding == "br":
+                        body = brotli.compress(self.identity, quality=11)
+                    else:
+                        body = gzip.compress(self.identity, compresslevel=9, mtime=0)
+                    self._encoded[encoding] = body
+        return body
+
+    def matches(self, if_none_match):
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return any(self.etag(encoding) in candidates for encoding in ("identity", "gzip", "br"))
+
+
+def negotiate_encoding(accept_encoding):
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return "identity"
+
+
+def conditional_json_response(request: Request, body: PreparedBody, headers=None):
+    encoding = "identity"
+    if len(body.identity) >= MIN_COMPRESS_SIZE:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    response_headers = {
+        "ETag": body.etag(encoding),
+        "Vary": "Accept-Encoding",
+        # El cliente puede guardar la respuesta pero debe revalidarla siempre
+        "Cache-Control": "no-cache",
+    }
+    response_headers.update(headers or {})
+    if body.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=response_headers)
+    if encoding != "identity":
+        response_headers["Content-Encoding"] = encoding
+    return Response(content=body.encoded(encoding), media_type="application/json", headers=response_headers)
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+
+
+def parse_byte_range(range_header, size):
+    """(inicio, fin) inclusive para "bytes=a-b", "bytes=a-" o "bytes=-n".
+
+    Devuelve None si no hay rango o no se entiende (se sirve completo, como
+    permite la RFC 9110, también para pedidos de varios rangos) y False si es
+    insatisfacible.
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    first, _, last = range_header[len("bytes="):].strip().partition("-")
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                return False
+            return max(0, size - suffix), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def ranged_response(request: Request, size, etag, iter_range, media_type, headers=None):
+    """Respuesta para un contenido inmutable con ETag, 304 y Range de un solo tramo.
+
+    `iter_range(start, end)` genera los bytes [start, end]."""
+    response_headers = {"ETag": etag, "Accept-Ranges": "bytes"}
+    response_headers.update(headers or {})
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=response_headers)
+
+    byte_range = parse_byte_range(request.headers.get("range"), size)
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() != etag:
+        # El cliente tiene otra versión: se manda completo
+        byte_range = None
+    if byte_range is False:
+        response_headers["Content-Range"] = f"bytes */{size}"
+        return Response(status_code=416, headers=response_headers)
+    if byte_range is None:
+        response_headers["Content-Length"] = str(size)
+        return StreamingResponse(iter_range(0, size - 1), media_type=media_type, headers=response_headers)
+    start, end = byte_range
+    response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response_headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(iter_range(start, end), status_code=206, media_type=media_type, headers=response_headers)
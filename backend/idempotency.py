@@ -0,0 +1,130 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class IdempotencyConflict(Exception):
+    """La misma Idempotency-Key llegó con otros datos."""
+
+
+class LeaderGone(Exception):
+    # El pedido que estaba generando la cotización se canceló; los que esperaban reintentan
+    pass
+
+
+def _text(value):
+    return " ".join(str(value or "").split()).casefold()
+
+
+def quote_fingerprint(data, scope=""):
+    """Hash de los datos de la cotización normalizados: mayúsculas/espacios del
+    nombre, guiones del CUIT, etc. no cuentan como pedidos distintos."""
+    normalized = {
+        "scope": scope,
+        "machine": str(data.get("machineCode") or "").strip().upper(),
+        "cuit": "".join(ch for ch in str(data.get("clientCuit") or "") if ch.isdigit()),
+        "phone": "".join(ch for ch in str(data.get("clientPhone") or "") if ch.isdigit() or ch == "+"),
+        "discount": round(float(data.get("discountPercent") or 0.0), 4),
+        **{field: _text(data.get(field)) for field in (
+            "clientName", "clientAddress", "clientEmail", "clientCompany", "notes",
+        )},
+    }
+    payload = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class QuoteCoalescer:
+    """Une pedidos de cotización idénticos en una sola ejecución.
+
+    Mientras una cotización con cierta clave está en curso, los pedidos que
+    llegan con la misma clave esperan su resultado en lugar de insertar otra
+    fila y renderizar otro PDF. Terminada, el resultado se sigue devolviendo
+    durante `ttl` segundos: QUOTE_DEDUP_WINDOW para claves derivadas de los
+    datos (doble click, reintentos) e IDEMPOTENCY_KEY_TTL para las que manda el
+    cliente en Idempotency-Key. Vale por proceso; con varios workers cada uno
+    deduplica lo suyo.
+    """
+
+    def __init__(self, dedup_window=None, key_ttl=None, max_entries=256):
+        self.dedup_window = float(os.getenv("QUOTE_DEDUP_WINDOW", "10")) if dedup_window is None else dedup_window
+        self.key_ttl = float(os.getenv("IDEMPOTENCY_KEY_TTL", "3600")) if key_ttl is None else key_ttl
+        self.max_entries = max_entries
+        self._in_flight = {}  # clave -> (loop, future, huella)
+        self._done = OrderedDict()  # clave -> (vence, huella, resultado)
+        self._lock = threading.Lock()
+        self.coalesced = 0
+        self.replayed = 0
+
+    def _cached(self, key, fingerprint):
+        with self._lock:
+            entry = self._done.get(key)
+            if entry is None:
+                return None
+            expires, cached_fingerprint, result = entry
+            if expires < time.monotonic():
+                del self._done[key]
+                return None
+        if cached_fingerprint != fingerprint:
+            raise IdempotencyConflict(key)
+        return result
+
+    def _remember(self, key, fingerprint, result, ttl):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._done.pop(key, None)
+            self._done[key] = (time.monotonic() + ttl, fingerprint, result)
+            while len(self._done) > self.max_entries:
+                self._done.popitem(last=False)
+
+    async def run(self, key, fingerprint, factory, ttl=None):
+        """Devuelve (resultado, compartido). `factory()` corre a lo sumo una vez por
+        clave a la vez; `compartido` indica que el resultado lo generó otro pedido."""
+        ttl = self.dedup_window if ttl is None else ttl
+        loop = asyncio.get_running_loop()
+        while True:
+            cached = self._cached(key, fingerprint)
+            if cached is not None:
+                self.replayed += 1
+                return cached, True
+            entry = self._in_flight.get(key)
+            # Un future de otro event loop no se puede esperar: se corre aparte
+            if entry is None or entry[0] is not loop:
+                break
+            if entry[2] != fingerprint:
+                raise IdempotencyConflict(key)
+            try:
+                result = await asyncio.shield(entry[1])
+            except LeaderGone:
+                continue
+            self.coalesced += 1
+            return result, True
+
+        future = loop.create_future()
+        self._in_flight[key] = (loop, future, fingerprint)
+        try:
+            result = await factory()
+        except BaseException as e:
+            # Los que esperaban reciben el mismo error (404, pool saturado...); si
+            # este pedido se canceló, reintentan ellos mismos
+            future.set_exception(LeaderGone() if isinstance(e, asyncio.CancelledError) else e)
+            future.exception()  # leído: sin "exception was never retrieved" si nadie esperaba
+            raise
+        else:
+            self._remember(key, fingerprint, result, ttl)
+            future.set_result(result)
+            return result, False
+        finally:
+            if self._in_flight.get(key, (None, None))[1] is future:
+                del self._in_flight[key]
+
+    def clear(self):
+        with self._lock:
+            self._done.clear()
+
+
+quote_coalescer = QuoteCoalescer()
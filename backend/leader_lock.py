@@ -0,0 +1,157 @@
+import os
+import asyncio
+import hashlib
+import logging
+import tempfile
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+from db import engine, SQLALCHEMY_DATABASE_URL
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLeaderLock:
+    """Lock exclusivo sobre un archivo local (flock). Sirve cuando todos los
+    procesos corren en el mismo host; el sistema lo libera si el proceso muere."""
+
+    def __init__(self, name, directory=None):
+        directory = directory or os.getenv("LEADER_LOCK_DIR", tempfile.gettempdir())
+        self.path = os.path.join(directory, f"agromaq-{name}.lock")
+        self._file = None
+
+    @property
+    def held(self):
+        return self._file is not None
+
+    def try_acquire(self):
+        if self._file is not None:
+            return True
+        lock_file = open(self.path, "a+")
+        try:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._file = lock_file
+        return True
+
+    def check(self):
+        # flock no se pierde mientras el archivo siga abierto
+        return self.held
+
+    def release(self):
+        if self._file is None:
+            return
+        if fcntl:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
+
+
+class PostgresLeaderLock:
+    """Advisory lock de PostgreSQL, válido entre hosts. Se retiene mientras
+    siga abierta la conexión que lo tomó; si el proceso cae, se libera solo.
+
+    La conexión es propia, fuera del pool de la app: el pool podría reciclarla o
+    descartarla y el lock se iría con ella. Si igual se cae (reinicio de la
+    base, timeout por inactividad) el servidor libera el lock; `check` lo
+    detecta para que el líder deje de actuar como tal.
+    """
+
+    def __init__(self, name, bind=None):
+        self.bind = bind or create_engine(engine.url, poolclass=NullPool)
+        digest = hashlib.sha256(f"agromaq:{name}".encode("utf-8")).digest()
+        self.key = int.from_bytes(digest[:8], "big", signed=True)
+        self._connection = None
+
+    @property
+    def held(self):
+        return self._connection is not None
+
+    def try_acquire(self):
+        if self._connection is not None:
+            return True
+        connection = self.bind.connect()
+        try:
+            acquired = connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key}).scalar()
+            connection.commit()
+        except Exception:
+            connection.close()
+            raise
+        if not acquired:
+            connection.close()
+            return False
+        self._connection = connection
+        return True
+
+    def check(self):
+        """True si la conexión sigue viva y sigue teniendo el lock; si no, lo da por perdido."""
+        if self._connection is None:
+            return False
+        # pg_locks parte la clave bigint en classid (32 bits altos) y objid (32 bajos)
+        unsigned = self.key & 0xFFFFFFFFFFFFFFFF
+        try:
+            held = self._connection.execute(
+                text(
+                    "SELECT EXISTS (SELECT 1 FROM pg_locks WHERE locktype = 'advisory' "
+                    "AND pid = pg_backend_pid() AND granted AND objsubid = 1 "
+                    "AND classid::bigint = :high AND objid::bigint = :low)"
+                ),
+                {"high": unsigned >> 32, "low": unsigned & 0xFFFFFFFF},
+            ).scalar()
+            self._connection.commit()
+        except Exception as e:
+            logging.warning(f"Leader lock connection lost: {e}")
+            held = False
+        if not held:
+            self._discard()
+        return bool(held)
+
+    def _discard(self):
+        try:
+            self._connection.invalidate()
+        finally:
+            self._connection = None
+
+    def release(self):
+        if self._connection is None:
+            return
+        try:
+            self._connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.key})
+            self._connection.commit()
+        finally:
+            self._connection.close()
+            self._connection = None
+
+
+async def wait_for_lock(lock, poll_interval=None):
+    """Espera hasta obtener el lock; los procesos en espera toman el relevo si el líder cae."""
+    poll_interval = float(os.getenv("LEADER_LOCK_POLL_INTERVAL", "5")) if poll_interval is None else poll_interval
+    waiting = False
+    while not await asyncio.to_thread(lock.try_acquire):
+        if not waiting:
+            logging.info("Leader lock held by another process, waiting")
+            waiting = True
+        await asyncio.sleep(poll_interval)
+    return lock
+
+
+def leader_lock(name):
+    # LEADER_LOCK_BACKEND=file|postgres; por defecto advisory lock si la base es PostgreSQL
+    backend = os.getenv("LEADER_LOCK_BACKEND")
+    if backend is None:
+        backend = "postgres" if SQLALCHEMY_DATABASE_URL.startswith("postgresql") else "file"
+    if backend == "postgres":
+        return PostgresLeaderLock(name)
+    return FileLeaderLock(name)
@@ -0,0 +1,125 @@
+"""Búsqueda aproximada de máquinas en memoria.
+
+El índice se arma una vez por versión del catálogo. Los textos se normalizan
+(minúsculas, sin acentos) y se parten en palabras; cada palabra distinta del
+vocabulario se indexa por trigramas, estilo pg_trgm. Una consulta compara sus
+palabras solo contra las del vocabulario que comparten algún trigrama (y no
+contra cada máquina), y después suma los puntajes en las máquinas que las
+contienen.
+"""
+import re
+import heapq
+import unicodedata
+from collections import Counter, OrderedDict
+from itertools import chain
+
+# Peso de cada campo en el puntaje: el código exacto pesa más que una palabra de la descripción
+FIELD_WEIGHTS = {"code": 3.0, "name": 2.0, "category": 1.0, "description": 0.5}
+MIN_SIMILARITY = 0.35
+PREFIX_SIMILARITY = 0.9
+RESULT_CACHE_SIZE = 512
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode("ascii")
+    return _NON_ALNUM.sub(" ", text.lower()).strip()
+
+
+def tokenize(text):
+    return normalize(text).split()
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    def __init__(self, machines):
+        self.machines = list(machines)
+        self._vocabulary = []  # id -> palabra
+        self._token_ids = {}  # palabra -> id
+        self._token_trigrams = []
+        self._postings = []  # id de palabra -> {índice de máquina: peso}
+        self._by_trigram = {}
+        self._results = OrderedDict()
+        for position, machine in enumerate(self.machines):
+            for field, weight in FIELD_WEIGHTS.items():
+                for token in tokenize(machine.get(field)):
+                    token_id = self._token_id(token)
+                    postings = self._postings[token_id]
+                    postings[position] = max(postings.get(position, 0.0), weight)
+
+    def _token_id(self, token):
+        token_id = self._token_ids.get(token)
+        if token_id is None:
+            token_id = len(self._vocabulary)
+            self._token_ids[token] = token_id
+            self._vocabulary.append(token)
+            grams = trigrams(token)
+            self._token_trigrams.append(len(grams))
+            self._postings.append({})
+            for gram in grams:
+                self._by_trigram.setdefault(gram, []).append(token_id)
+        return token_id
+
+    def _similar_tokens(self, token):
+        # Coeficiente de Dice sobre trigramas; las palabras que empiezan con la consulta
+        # puntúan alto aunque sean mucho más largas ("tol" -> "tolva")
+        grams = trigrams(token)
+        size = len(grams)
+        shared = Counter(chain.from_iterable(self._by_trigram.get(gram, ()) for gram in grams))
+        matches = {}
+        for token_id, count in shared.items():
+            # Un prefijo comparte todos los trigramas de la consulta salvo el del final
+            if count < size - 1 and 2 * count < MIN_SIMILARITY * (size + self._token_trigrams[token_id]):
+                continue
+            candidate = self._vocabulary[token_id]
+            if candidate == token:
+                similarity = 1.0
+            elif candidate.startswith(token):
+                similarity = PREFIX_SIMILARITY
+            else:
+                similarity = 2 * count / (size + self._token_trigrams[token_id])
+            if similarity >= MIN_SIMILARITY:
+                matches[token_id] = similarity
+        return matches
+
+    def search(self, query, limit=10, category=None):
+        key = (normalize(query), limit, normalize(category) if category is not None else None)
+        cached = self._results.get(key)
+        if cached is None:
+            cached = self._search(*key)
+            # Las mismas búsquedas se repiten mucho ("acoplado", "tolva"); el índice es
+            # inmutable, así que el resultado vale hasta que cambie la versión del catálogo
+            self._results[key] = cached
+            if len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+        return [dict(machine) for machine in cached]
+
+    def _search(self, query, limit, category):
+        tokens = list(dict.fromkeys(query.split()))
+        if not tokens:
+            return []
+        scores = {}
+        matched = {}
+        for token in tokens:
+            best = {}
+            for token_id, similarity in self._similar_tokens(token).items():
+                for position, weight in self._postings[token_id].items():
+                    value = similarity * weight
+                    if value > best.get(position, 0.0):
+                        best[position] = value
+            for position, value in best.items():
+                scores[position] = scores.get(position, 0.0) + value
+                matched[position] = matched.get(position, 0) + 1
+
+        if category is not None:
+            scores = {p: s for p, s in scores.items() if normalize(self.machines[p]["category"]) == category}
+        # Primero las que contienen todas las palabras buscadas, después por puntaje
+        ranked = heapq.nsmallest(limit, scores, key=lambda p: (-matched[p], -scores[p], p))
+        return [
+            dict(self.machines[p], score=round(scores[p] / len(tokens), 4), matched_terms=matched[p])
+            for p in ranked
+        ]
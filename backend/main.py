@@ -1,21 +1,41 @@
 import sys
 import os
 sys.path.append(os.path.dirname(__file__))
-from fastapi import FastAPI, HTTPException, Depends, status, File, UploadFile
+from fastapi import FastAPI, HTTPException, Depends, status, File, UploadFile, Response, Request, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import StreamingResponse, JSONResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from sqlalchemy.orm import Session
-from pydantic import BaseModel
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, ValidationError
 from datetime import datetime
 import os
+import io
+import csv
+import logging
+import base64
 import secrets
-from typing import List, Optional
+import zipfile
+from urllib.parse import quote
+from typing import Dict, List, Optional
 import asyncio
-from telegram_bot import TelegramBot
+from telegram_bot import TelegramBot, WEBHOOK_PATH
+from bot_runner import BOT_LOCK_NAME, run_bot
+from leader_lock import leader_lock
+from quote_jobs import QuoteJobQueue, JobFailed, JOB_DONE, JOB_FAILED
 from pdf_generator import PDFGenerator
-import json
-from db import engine, SessionLocal, Base, Machine, Quotation, MACHINERY_CATALOG
+from render_pool import render_pool, RenderPoolSaturated
+from pdf_cache import pdf_cache
+from catalog_cache import catalog_cache
+from quotation_stats import quotation_stats
+from catalog_import import import_catalog, iter_records, detect_format, CatalogImportError
+from catalog_pricing import reprice_catalog, RepricingError
+from http_cache import conditional_json_response, ranged_response
+from pdf_store import pdf_store, quotation_key, download_token
+from rate_limit import rate_limiter, batch_rate_limiter, RateLimited, client_ip
+from idempotency import quote_coalescer, IdempotencyConflict, quote_fingerprint
+from metrics import REGISTRY, CONTENT_TYPE, DB_SESSION_SECONDS, RequestMetricsMiddleware
+from db import AsyncSessionLocal, Base, Machine, Quotation, QuoteJob
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -30,6 +50,16 @@ class MachineCreate(BaseModel):
 class MachineUpdate(BaseModel):
     price: float
 
+class PriceRule(BaseModel):
+    category: Optional[str] = None  # None = todo el catálogo
+    percent: float
+
+class BulkPriceUpdate(BaseModel):
+    prices: Dict[str, float] = {}
+    rules: List[PriceRule] = []
+    round_to: Optional[float] = None
+    dry_run: bool = False
+
 class QuotationCreate(BaseModel):
     machineCode: str
     clientCuit: str
@@ -44,6 +74,8 @@ class QuotationCreate(BaseModel):
 # FastAPI app
 app = FastAPI(title="Agromaq Enhanced Quotation System", version="2.0.0")
 
+app.add_middleware(RequestMetricsMiddleware, router=app.router)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -51,17 +83,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Catalog-Version", "Content-Range", "Accept-Ranges", "X-Quotation-Id", "X-Quotation-Pdf-Url", "Idempotent-Replayed"],
 )
 
+@app.exception_handler(RenderPoolSaturated)
+async def render_pool_saturated_handler(request, exc):
+    # Back-pressure: el pool de render está lleno, el cliente debe reintentar
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Quote renderer is busy, retry shortly"},
+        headers={"Retry-After": os.getenv("PDF_RENDER_RETRY_AFTER", "2")},
+    )
+
+@app.exception_handler(RateLimited)
+async def rate_limited_handler(request, exc):
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": "Too many quote requests, retry shortly"},
+        headers={"Retry-After": exc.retry_after_header},
+    )
+
 # Security
 security = HTTPBasic()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Las consultas se esperan en lugar de bloquear el event loop
+async def get_async_db():
+    with DB_SESSION_SECONDS.time("async"):
+        async with AsyncSessionLocal() as db:
+            yield db
 
 def get_current_admin(credentials: HTTPBasicCredentials = Depends(security)):
     admin_user = os.getenv("ADMIN_USER")
@@ -78,132 +127,593 @@ def get_current_admin(credentials: HTTPBasicCredentials = Depends(security)):
         )
     return credentials.username
 
+async def quote_admission(request: Request):
+    # Cotizar no requiere login: límite por IP mientras dura el request (rate_limit.py)
+    async with rate_limiter.admit(f"ip:{client_ip(request)}"):
+        yield
+
+PDF_CHUNK_SIZE = 64 * 1024
+
+def pdf_response(pdf_bytes: bytes, filename: str, headers: Optional[dict] = None):
+    # Sirve el PDF desde memoria, sin archivo temporal
+    def iter_chunks():
+        for start in range(0, len(pdf_bytes), PDF_CHUNK_SIZE):
+            yield pdf_bytes[start:start + PDF_CHUNK_SIZE]
+
+    return StreamingResponse(
+        iter_chunks(),
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": content_disposition(filename),
+            "Content-Length": str(len(pdf_bytes)),
+            **(headers or {}),
+        },
+    )
+
+def content_disposition(filename: str) -> str:
+    quoted_filename = quote(filename)
+    if quoted_filename != filename:
+        return f"attachment; filename*=utf-8''{quoted_filename}"
+    return f'attachment; filename="{filename}"'
+
+def stored_pdf_response(request: Request, quotation_id: int, filename: str):
+    # PDF ya guardado: inmutable, se puede cachear y pedir por tramos
+    obj = pdf_store.head(quotation_key(quotation_id))
+    if obj is None:
+        raise HTTPException(status_code=404, detail="PDF not found")
+    return ranged_response(
+        request,
+        obj.size,
+        obj.etag,
+        lambda start, end: pdf_store.iter_range(obj, start, end),
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": content_disposition(filename),
+            "Cache-Control": "private, max-age=31536000, immutable",
+        },
+    )
+
+def quotation_pdf_headers(quotation_id: int) -> dict:
+    headers = {"X-Quotation-Id": str(quotation_id)}
+    token = download_token(quotation_id)
+    if token:
+        headers["X-Quotation-Pdf-Url"] = f"/quotations/{quotation_id}/pdf?token={token}"
+    return headers
+
+def quote_filename(client_name: str, machine_code: str) -> str:
+    return f"cotizacion-{client_name.replace(' ', '-').replace('/', '-')}-{machine_code}.pdf"
+
+def calculate_final_price(price: float, discount_percent: float) -> float:
+    # Calcular precio final con descuento variable
+    if discount_percent > 0:
+        return price * (1 - discount_percent / 100)
+    return price
+
+def build_quotation(quotation: QuotationCreate, final_price: float) -> Quotation:
+    discount_percent = quotation.discountPercent or 0.0
+    return Quotation(
+        machine_code=quotation.machineCode,
+        client_cuit=quotation.clientCuit,
+        client_name=quotation.clientName,
+        client_phone=quotation.clientPhone,
+        client_email=quotation.clientEmail,
+        client_company=quotation.clientCompany,
+        notes=quotation.notes,
+        discount_applied=discount_percent > 0,
+        discount_percent=discount_percent,
+        final_price=final_price
+    )
+
+class _ZipStreamBuffer(io.RawIOBase):
+    # Destino no seekable para ZipFile: acumula lo escrito hasta que se envía
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
 # Initialize components
 pdf_generator = PDFGenerator()
 telegram_bot = TelegramBot()
+bot_lock = leader_lock(BOT_LOCK_NAME)
+bot_task = None
+bot_stop = None
 
 
-MACHINERY_CATALOG = None
-
 @app.on_event("startup")
 async def startup_event():
-    # Initialize machinery catalog in database
-    db = SessionLocal()
-    if db.query(Machine).count() == 0:
-        # Leer el catálogo desde el backup JSON
-        backup_path = os.path.join(os.path.dirname(__file__), "data_machinery_backup.json")
-        with open(backup_path, "r", encoding="utf-8") as f:
-            MACHINERY_CATALOG = json.load(f)
-        id_counter = 1
-        for category in MACHINERY_CATALOG:
-            for producto in category["productos"]:
-                code = f"{category['categoria'][:3].upper()}{str(id_counter).zfill(3)}"
-                machine = Machine(
-                    code=code,
-                    name=producto,
-                    price=float(10000 + (id_counter * 1000)),  # Sample pricing
-                    category=category["categoria"],
-                    description=f"Descripción de {producto}",
-                    active=True
-                )
-                db.add(machine)
-                id_counter += 1
-        db.commit()
-    db.close()
+    # Esquema y seed los hace migrate.py en el build; acá solo se lee el
+    # snapshot del catálogo que dejó, para no ir a la base antes de atender
+    catalog_cache.preload()
+    
+    quote_jobs.start()
     
     # Start Telegram bot
-    asyncio.create_task(telegram_bot.start())
+    global bot_task, bot_stop
+    if telegram_bot.token and os.getenv("TELEGRAM_BOT_IN_API", "true").lower() in ("1", "true", "yes"):
+        bot_stop = asyncio.Event()
+        bot_task = asyncio.create_task(run_bot_in_api(bot_stop))
+
+async def run_bot_in_api(stop_event):
+    # En webhook cada worker atiende los updates que le llegan. En polling solo
+    # uno puede pedirlos: el que obtiene el lock, igual que bot_runner (si lo
+    # pierde deja de hacer polling y vuelve a esperar); el resto espera el relevo
+    if telegram_bot.mode == "polling":
+        await run_bot(telegram_bot, bot_lock, stop_event)
+    else:
+        await telegram_bot.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if bot_stop is not None:
+        bot_stop.set()
+    if bot_task and not bot_task.done():
+        # run_bot detiene el bot y suelta el lock al ver el stop_event
+        try:
+            await asyncio.wait_for(bot_task, timeout=10)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            pass
+    await telegram_bot.stop()
+    bot_lock.release()
+    await quote_jobs.stop()
+    render_pool.shutdown()
+
+@app.post(WEBHOOK_PATH, include_in_schema=False)
+async def telegram_webhook(request: Request):
+    if not telegram_bot.accepts_webhooks:
+        raise HTTPException(status_code=503, detail="Bot not running in webhook mode")
+    secret = telegram_bot.webhook_secret
+    received = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not secret or not secrets.compare_digest(received.encode(), secret.encode()):
+        raise HTTPException(status_code=403, detail="Invalid secret token")
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid update")
+    await telegram_bot.process_webhook(data)
+    return {"ok": True}
 
 @app.get("/")
 def read_root():
     return {"message": "Agromaq Enhanced Quotation System API", "version": "2.0.0"}
 
+def cache_requests():
+    pdf = pdf_cache.stats()
+    return {
+        ("pdf", "hit"): pdf["hits"],
+        ("pdf", "disk_hit"): pdf["disk_hits"],
+        ("pdf", "miss"): pdf["misses"],
+        ("catalog", "hit"): catalog_cache.hits,
+        ("catalog", "miss"): catalog_cache.misses,
+        ("telegram_file", "hit"): telegram_bot.file_cache.hits,
+        ("telegram_file", "miss"): telegram_bot.file_cache.misses,
+    }
+
+def cache_hit_ratio():
+    pdf = pdf_cache.stats()
+    catalog_lookups = catalog_cache.hits + catalog_cache.misses
+    return {
+        ("pdf",): pdf["hit_ratio"],
+        ("catalog",): catalog_cache.hits / catalog_lookups if catalog_lookups else 0.0,
+    }
+
+REGISTRY.callback("cache_requests_total", "Cache lookups by cache and result", cache_requests, ("cache", "result"), type="counter")
+REGISTRY.callback("cache_hit_ratio", "Cache hit ratio since start", cache_hit_ratio, ("cache",))
+REGISTRY.callback("pdf_cache_bytes", "Bytes held by the in-memory PDF cache", lambda: pdf_cache.stats()["size_bytes"])
+REGISTRY.callback("render_pool_in_flight", "PDF renders running or queued", lambda: render_pool.in_flight)
+REGISTRY.callback("render_pool_queued", "PDF renders waiting for a worker", lambda: render_pool.queued)
+REGISTRY.callback("render_pool_capacity", "Max PDF renders admitted before 503", lambda: render_pool.capacity)
+REGISTRY.callback(
+    "rate_limited_total", "Quote requests rejected per client limit",
+    lambda: {
+        **{(reason,): count for reason, count in rate_limiter.rejected.items()},
+        ("batch_rows",): batch_rate_limiter.rejected["rate"],
+    },
+    ("reason",), type="counter",
+)
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
 @app.get("/health")
 def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow()}
 
 @app.get("/machines")
-def get_machines(db: Session = Depends(get_db)):
-    return db.query(Machine).filter(Machine.active == True).all()
+async def get_machines(request: Request, db: AsyncSession = Depends(get_async_db)):
+    snapshot = await catalog_cache.snapshot_async(db)
+    return conditional_json_response(request, snapshot.body, {"X-Catalog-Version": snapshot.version})
 
 @app.get("/admin/machines")
-def get_machines_admin(admin: str = Depends(get_current_admin), db: Session = Depends(get_db)):
-    return db.query(Machine).filter(Machine.active == True).all()
+async def get_machines_admin(response: Response, admin: str = Depends(get_current_admin), db: AsyncSession = Depends(get_async_db)):
+    snapshot = await catalog_cache.snapshot_async(db)
+    response.headers["X-Catalog-Version"] = snapshot.version
+    return snapshot.machines
 
 @app.get("/machines/catalog")
-def get_machinery_catalog():
-    return MACHINERY_CATALOG
+async def get_machinery_catalog(request: Request, db: AsyncSession = Depends(get_async_db)):
+    # Árbol por categoría armado desde la misma foto que /machines (misma versión)
+    snapshot = await catalog_cache.snapshot_async(db)
+    return conditional_json_response(request, snapshot.category_body, {"X-Catalog-Version": snapshot.version})
+
+@app.get("/machines/search")
+async def search_machines(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(10, ge=1, le=100),
+    category: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    snapshot = await catalog_cache.snapshot_async(db)
+    response.headers["X-Catalog-Version"] = snapshot.version
+    return (await snapshot.search_index_async()).search(q, limit=limit, category=category)
 
 @app.get("/machines/{machine_code}")
-def get_machine_by_code(machine_code: str, db: Session = Depends(get_db)):
-    machine = db.query(Machine).filter(Machine.code == machine_code, Machine.active == True).first()
+async def get_machine_by_code(machine_code: str, response: Response, db: AsyncSession = Depends(get_async_db)):
+    snapshot = await catalog_cache.snapshot_async(db)
+    machine = snapshot.by_code.get(machine_code)
     if not machine:
         raise HTTPException(status_code=404, detail="Machine not found")
+    response.headers["X-Catalog-Version"] = snapshot.version
     return machine
 
 @app.put("/machines/{machine_code}")
-def update_machine_price(machine_code: str, machine_update: MachineUpdate, db: Session = Depends(get_db)):
-    machine = db.query(Machine).filter(Machine.code == machine_code).first()
+async def update_machine_price(machine_code: str, machine_update: MachineUpdate, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(Machine).where(Machine.code == machine_code))
+    machine = result.scalars().first()
     if not machine:
         raise HTTPException(status_code=404, detail="Machine not found")
     
     machine.price = machine_update.price
-    db.commit()
-    db.refresh(machine)
+    await db.commit()
+    await db.refresh(machine)
+    await catalog_cache.refresh_async(db)
     return machine
 
-@app.post("/generate-quote")
-async def generate_quote(quotation: QuotationCreate, db: Session = Depends(get_db)):
+@app.post("/admin/catalog/import")
+async def import_machine_catalog(
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    dry_run: bool = False,
+    deactivate_missing: bool = False,
+    admin: str = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # El archivo se lee en streaming dentro de run_sync: una sola transacción para todo el lote
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    fmt = format or detect_format(file.filename)
+    try:
+        report = await db.run_sync(
+            lambda session: import_catalog(
+                session,
+                iter_records(stream, fmt),
+                dry_run=dry_run,
+                deactivate_missing=deactivate_missing,
+            )
+        )
+    except CatalogImportError as e:
+        raise HTTPException(status_code=422, detail=e.errors)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Archivo inválido: {e}")
+    if not dry_run:
+        await catalog_cache.refresh_async(db)
+    return report
+
+@app.post("/admin/machines/prices")
+async def bulk_update_prices(update: BulkPriceUpdate, admin: str = Depends(get_current_admin), db: AsyncSession = Depends(get_async_db)):
+    if not update.prices and not update.rules:
+        raise HTTPException(status_code=400, detail="Indicar prices o rules")
+    rules = [rule.model_dump() for rule in update.rules]
+    try:
+        report = await db.run_sync(
+            lambda session: reprice_catalog(
+                session, update.prices, rules, round_to=update.round_to, dry_run=update.dry_run
+            )
+        )
+    except RepricingError as e:
+        raise HTTPException(status_code=422, detail=e.errors)
+    # Una sola recarga del cache para todo el lote
+    if report["updated"] and not update.dry_run:
+        await catalog_cache.refresh_async(db)
+    return report
+
+async def render_quote_job(db: AsyncSession, payload: dict):
+    # Handler de la cola: mismos pasos que /generate-quote, sin responder al cliente
+    quotation = QuotationCreate(**payload)
+    result = await db.execute(
+        select(Machine).where(Machine.code == quotation.machineCode, Machine.active == True)
+    )
+    machine = result.scalars().first()
+    if not machine:
+        raise JobFailed("Machine not found")
+    final_price = calculate_final_price(machine.price, quotation.discountPercent or 0.0)
+    db_quotation = build_quotation(quotation, final_price)
+    # En segundo plano conviene esperar lugar en el pool antes que fallar
+    pdf_bytes = await pdf_generator.generate_quotation_pdf(machine, quotation, final_price, block=True)
+    db.add(db_quotation)
+    await db.flush()
+    await pdf_store.save_quotation_pdf(db_quotation.id, pdf_bytes)
+    return db_quotation, machine.category, quote_filename(quotation.clientName, quotation.machineCode)
+
+quote_jobs = QuoteJobQueue(render_quote_job)
+
+@app.post("/generate-quote", dependencies=[Depends(quote_admission)])
+async def generate_quote(
+    quotation: QuotationCreate,
+    request: Request,
+    async_mode: bool = Query(False, alias="async"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    db: AsyncSession = Depends(get_async_db),
+):
     # Get machine details
-    machine = db.query(Machine).filter(Machine.code == quotation.machineCode, Machine.active == True).first()
+    result = await db.execute(
+        select(Machine).where(Machine.code == quotation.machineCode, Machine.active == True)
+    )
+    machine = result.scalars().first()
     if not machine:
         raise HTTPException(status_code=404, detail="Machine not found")
     
-    # Calcular precio final con descuento variable
-    final_price = machine.price
-    discount_percent = getattr(quotation, 'discountPercent', 0.0) or 0.0
-    if discount_percent > 0:
-        final_price = machine.price * (1 - discount_percent / 100)
+    # Pedidos idénticos en curso (doble click, reintentos) comparten una sola cotización
+    fingerprint = quote_fingerprint(quotation.model_dump())
+    if idempotency_key:
+        key, ttl = f"{client_ip(request)}:{idempotency_key}", quote_coalescer.key_ttl
+    else:
+        key, ttl = fingerprint, None
     
-    # Save quotation to database
-    db_quotation = Quotation(
-        machine_code=quotation.machineCode,
-        client_cuit=quotation.clientCuit,
-        client_name=quotation.clientName,
-        client_phone=quotation.clientPhone,
-        client_email=quotation.clientEmail,
-        client_company=quotation.clientCompany,
-        notes=quotation.notes,
-        discount_applied=discount_percent > 0,
-        final_price=final_price
+    if async_mode:
+        # Se encola y se responde enseguida; el PDF se consulta en /quotes/{job_id}
+        async def enqueue():
+            return (await quote_jobs.enqueue(db, quotation.model_dump())).id
+        
+        job_id, shared = await coalesce_quote(f"job:{key}", fingerprint, enqueue, ttl)
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"job_id": job_id, "status_url": f"/quotes/{job_id}"},
+            headers={"Location": f"/quotes/{job_id}", **replay_headers(shared)},
+        )
+    
+    async def create():
+        final_price = calculate_final_price(machine.price, quotation.discountPercent or 0.0)
+        
+        # Save quotation to database
+        db_quotation = build_quotation(quotation, final_price)
+        db.add(db_quotation)
+        
+        # Generate PDF (si el pool está saturado no se guarda la cotización)
+        pdf_bytes = await pdf_generator.generate_quotation_pdf(machine, quotation, final_price)
+        await db.flush()
+        # Se guarda antes del commit: una cotización guardada siempre tiene su PDF
+        # (salvo las de /generate-quote/batch, ver generate_quote_batch)
+        await pdf_store.save_quotation_pdf(db_quotation.id, pdf_bytes)
+        try:
+            await db.commit()
+        except Exception:
+            await pdf_store.delete_quotation_pdf(db_quotation.id)
+            raise
+        quotation_stats.record(db_quotation, machine.category)
+        return db_quotation.id, pdf_bytes
+    
+    (quotation_id, pdf_bytes), shared = await coalesce_quote(f"quote:{key}", fingerprint, create, ttl)
+    return pdf_response(
+        pdf_bytes,
+        quote_filename(quotation.clientName, quotation.machineCode),
+        headers={**quotation_pdf_headers(quotation_id), **replay_headers(shared)},
     )
-    db.add(db_quotation)
-    db.commit()
+
+async def coalesce_quote(key, fingerprint, factory, ttl):
+    try:
+        return await quote_coalescer.run(key, fingerprint, factory, ttl)
+    except IdempotencyConflict:
+        raise HTTPException(status_code=422, detail="Idempotency-Key already used with a different request")
+
+def replay_headers(shared: bool) -> dict:
+    # El resultado lo generó otro pedido con la misma clave
+    return {"Idempotent-Replayed": "true"} if shared else {}
+
+@app.get("/quotes/{job_id}")
+async def get_quote_job(job_id: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    job = await db.get(QuoteJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Quote job not found")
+    if job.status == JOB_DONE:
+        response = stored_pdf_response(request, job.quotation_id, job.filename)
+        response.headers.update(quotation_pdf_headers(job.quotation_id))
+        return response
+    content = {"job_id": job.id, "status": job.status, "attempts": job.attempts, "error": job.error}
+    if job.status == JOB_FAILED:
+        return JSONResponse(content=content)
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=content,
+        headers={"Retry-After": os.getenv("QUOTE_JOB_RETRY_AFTER", "1")},
+    )
+
+QUOTE_BATCH_MAX_ROWS = int(os.getenv("QUOTE_BATCH_MAX_ROWS", "500"))
+
+async def generate_quote_batch(quotations: List[QuotationCreate], db: AsyncSession, request: Request):
+    if not quotations:
+        raise HTTPException(status_code=422, detail="Batch is empty")
+    if len(quotations) > QUOTE_BATCH_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch exceeds {QUOTE_BATCH_MAX_ROWS} rows"
+        )
+    # quote_admission cobra una ficha por request; el lote paga además cada fila
+    await batch_rate_limiter.check(f"ip:{client_ip(request)}", cost=len(quotations))
     
-    # Generate PDF
-    pdf_path = await pdf_generator.generate_quotation_pdf(machine, quotation, final_price)
+    # Todas las máquinas en una sola consulta
+    codes = {q.machineCode for q in quotations}
+    result = await db.execute(select(Machine).where(Machine.code.in_(codes), Machine.active == True))
+    machines = {m.code: m for m in result.scalars()}
+    missing = sorted(codes - machines.keys())
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Machines not found: {', '.join(missing)}")
     
-    return FileResponse(
-        pdf_path,
-        media_type="application/pdf",
-        filename=f"cotizacion-{quotation.clientName.replace(' ', '-')}-{quotation.machineCode}.pdf"
+    # Todas las cotizaciones en una sola transacción, antes de renderizar: así los
+    # PDFs se pueden ir enviando a medida que terminan. A diferencia de
+    # /generate-quote, una cotización del lote cuyo render falla (o que no llega a
+    # renderizarse porque el cliente cortó la descarga) queda guardada sin PDF y
+    # /quotations/{id}/pdf devuelve 404; los fallos se listan en errores.txt.
+    prices = [calculate_final_price(machines[q.machineCode].price, q.discountPercent or 0.0) for q in quotations]
+    db_quotations = [build_quotation(q, price) for q, price in zip(quotations, prices)]
+    db.add_all(db_quotations)
+    await db.commit()
+    for db_quotation in db_quotations:
+        quotation_stats.record(db_quotation, machines[db_quotation.machine_code].category)
+    
+    semaphore = asyncio.Semaphore(max(render_pool.max_workers, 1))
+    
+    async def render(index, quotation, final_price):
+        async with semaphore:
+            # block=True: el lote ya limita su concurrencia, espera en lugar de fallar con 503
+            pdf_bytes = await pdf_generator.generate_quotation_pdf(
+                machines[quotation.machineCode], quotation, final_price, block=True
+            )
+        await pdf_store.save_quotation_pdf(db_quotations[index - 1].id, pdf_bytes)
+        return index, pdf_bytes
+    
+    async def stream_zip():
+        buffer = _ZipStreamBuffer()
+        tasks = [asyncio.ensure_future(render(i, q, p)) for i, (q, p) in enumerate(zip(quotations, prices), 1)]
+        errors = []
+        try:
+            with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_STORED) as archive:
+                # Cada PDF se envía apenas termina, sin esperar al resto del lote
+                for task in asyncio.as_completed(tasks):
+                    try:
+                        index, pdf_bytes = await task
+                    except Exception as e:
+                        logging.error(f"Error rendering batch quote: {e}")
+                        errors.append(str(e))
+                        continue
+                    quotation = quotations[index - 1]
+                    archive.writestr(f"{index:03d}-{quote_filename(quotation.clientName, quotation.machineCode)}", pdf_bytes)
+                    yield buffer.drain()
+                if errors:
+                    archive.writestr("errores.txt", "\n".join(errors))
+            yield buffer.drain()
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(
+        stream_zip(),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="cotizaciones-{datetime.now():%Y%m%d-%H%M%S}.zip"'},
     )
 
-@app.get("/quotations")
-def get_quotations(admin: str = Depends(get_current_admin), db: Session = Depends(get_db)):
-    return db.query(Quotation).order_by(Quotation.created_at.desc()).all()
+@app.post("/generate-quote/batch", dependencies=[Depends(quote_admission)])
+async def generate_quote_batch_json(quotations: List[QuotationCreate], request: Request, db: AsyncSession = Depends(get_async_db)):
+    return await generate_quote_batch(quotations, db, request)
 
-@app.get("/quotations/stats")
-def get_quotation_stats(admin: str = Depends(get_current_admin), db: Session = Depends(get_db)):
-    total_quotations = db.query(Quotation).count()
-    total_with_discount = db.query(Quotation).filter(Quotation.discount_applied == True).count()
+@app.post("/generate-quote/batch/csv", dependencies=[Depends(quote_admission)])
+async def generate_quote_batch_csv(request: Request, file: UploadFile = File(...), db: AsyncSession = Depends(get_async_db)):
+    # Columnas del CSV con los mismos nombres que el JSON de /generate-quote
+    try:
+        content = (await file.read()).decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=422, detail="CSV must be UTF-8 encoded")
+    quotations = []
+    for line, row in enumerate(csv.DictReader(io.StringIO(content)), 2):
+        row = {key.strip(): value.strip() for key, value in row.items() if key and value and value.strip()}
+        try:
+            quotations.append(QuotationCreate(**row))
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=f"Invalid row {line}: {e.errors()[0]['msg']}")
+    return await generate_quote_batch(quotations, db, request)
+
+def encode_cursor(quotation: Quotation) -> str:
+    raw = f"{quotation.created_at.isoformat()}|{quotation.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, quotation_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(quotation_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@app.get("/quotations")
+async def get_quotations(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    machine_code: Optional[str] = None,
+    client_cuit: Optional[str] = None,
+    discount: Optional[bool] = None,
+    admin: str = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Paginación keyset sobre (created_at, id): cada página cuesta lo mismo sin importar el historial
+    query = select(Quotation)
+    if machine_code:
+        query = query.where(Quotation.machine_code == machine_code)
+    if client_cuit:
+        query = query.where(Quotation.client_cuit == client_cuit)
+    if discount is not None:
+        query = query.where(Quotation.discount_applied == discount)
+    if date_from:
+        query = query.where(Quotation.created_at >= date_from)
+    if date_to:
+        query = query.where(Quotation.created_at < date_to)
+    if cursor:
+        query = query.where(tuple_(Quotation.created_at, Quotation.id) < tuple_(*decode_cursor(cursor)))
     
+    query = query.order_by(Quotation.created_at.desc(), Quotation.id.desc()).limit(limit + 1)
+    rows = (await db.execute(query)).scalars().all()
+    items = rows[:limit]
     return {
-        "total_quotations": total_quotations,
-        "quotations_with_discount": total_with_discount,
-        "discount_percentage": (total_with_discount / total_quotations * 100) if total_quotations > 0 else 0
+        "items": items,
+        "next_cursor": encode_cursor(items[-1]) if len(rows) > limit else None
     }
 
+@app.get("/quotations/{quotation_id}/pdf")
+async def get_quotation_pdf(
+    quotation_id: int,
+    request: Request,
+    token: Optional[str] = None,
+    credentials: Optional[HTTPBasicCredentials] = Depends(HTTPBasic(auto_error=False)),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Admin, o el link firmado que devolvió /generate-quote (X-Quotation-Pdf-Url)
+    expected = download_token(quotation_id)
+    if not (token and expected and secrets.compare_digest(token, expected)):
+        if credentials is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Not authenticated",
+                headers={"WWW-Authenticate": "Basic"},
+            )
+        get_current_admin(credentials)
+    quotation = await db.get(Quotation, quotation_id)
+    if not quotation:
+        raise HTTPException(status_code=404, detail="Quotation not found")
+    return stored_pdf_response(request, quotation.id, quote_filename(quotation.client_name, quotation.machine_code))
+
+@app.get("/quotations/stats")
+async def get_quotation_stats(
+    days: int = Query(30, ge=0, le=366),
+    admin: str = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await quotation_stats.snapshot_async(db, days=days)
+
+@app.get("/pdf-cache/stats")
+def get_pdf_cache_stats(admin: str = Depends(get_current_admin)):
+    return pdf_cache.stats()
+
 if __name__ == "__main__":
+    # La base se prepara aparte, una vez: python migrate.py
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,208 @@
+"""Métricas en formato de texto de Prometheus, sin dependencias externas.
+
+Los histogramas guardan solo conteos por bucket y una suma, bajo un lock: medir
+un request o una consulta cuesta un par de microsegundos. Las métricas
+que ya existen en otros objetos (cache de PDFs, pool de render) se leen recién
+al momento del scrape mediante callbacks.
+"""
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from sqlalchemy import event
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [conteo por bucket..., +Inf, suma]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labelvalues):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labelvalues)
+
+    def count(self, *labelvalues):
+        series = self._series.get(labelvalues)
+        return sum(series[:-1]) if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(values, list(series)) for values, series in self._series.items()]
+        samples = []
+        for values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = (("le", _number(bound)),)
+                samples.append((f"{self.name}_bucket", _labels(self.labelnames, values, le), cumulative))
+            samples.append((f"{self.name}_count", _labels(self.labelnames, values), cumulative))
+            samples.append((f"{self.name}_sum", _labels(self.labelnames, values), series[-1]))
+        return samples
+
+
+class CallbackMetric:
+    """Gauge o contador cuyo valor se calcula en el scrape: `callback()` devuelve
+    un número o un dict {valores de labels (tupla): número}."""
+
+    def __init__(self, name, documentation, callback, labelnames=(), type="gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+        self.type = type
+
+    def samples(self):
+        result = self.callback()
+        if not isinstance(result, dict):
+            result = {(): result}
+        return [(self.name, _labels(self.labelnames, values), value) for values, value in result.items()]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Duplicated metric: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def callback(self, *args, **kwargs):
+        return self.register(CallbackMetric(*args, **kwargs))
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            try:
+                samples = metric.samples()
+            except Exception:
+                # Una métrica rota no debe tirar el scrape completo
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(f"{name}{labels} {_number(value)}" for name, labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Métricas del camino caliente; los módulos las importan y las alimentan
+REQUEST_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+PDF_BUILD_SECONDS = REGISTRY.histogram(
+    "pdf_build_seconds", "PDF render time by phase (story construction vs doc.build)", ("phase",)
+)
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "db_query_seconds", "Database statement execution time", ("statement",)
+)
+DB_SESSION_SECONDS = REGISTRY.histogram(
+    "db_session_seconds", "Request-scoped database session lifetime", ("kind",)
+)
+TELEGRAM_HANDLER_SECONDS = REGISTRY.histogram(
+    "telegram_handler_seconds", "Telegram command handler latency", ("command",)
+)
+
+
+def statement_kind(statement):
+    kind = statement.lstrip()[:6].lower()
+    return kind if kind in ("select", "insert", "update", "delete") else "other"
+
+
+def instrument_engine(engine):
+    """Mide cada sentencia SQL con los eventos del engine (para AsyncEngine, usar .sync_engine)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        DB_QUERY_SECONDS.observe(time.perf_counter() - conn.info["query_start"].pop(), statement_kind(statement))
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        starts = exception_context.connection.info.get("query_start") if exception_context.connection else None
+        if starts:
+            starts.pop()
+
+
+class RequestMetricsMiddleware:
+    """Middleware ASGI: latencia por plantilla de ruta ("/machines/{machine_code}"),
+    no por URL, para que la cardinalidad quede acotada."""
+
+    def __init__(self, app, router):
+        self.app = app
+        self.router = router
+        self._paths = None
+
+    def _route_path(self, scope):
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._paths is None:
+            self._paths = {getattr(route, "endpoint", None): route.path for route in self.router.routes}
+        return self._paths.get(endpoint, "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status_code = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - start, scope["method"], self._route_path(scope), str(status_code[0])
+            )
@@ -0,0 +1,46 @@
+"""Prepara la base antes de levantar la API: esquema, catálogo inicial y snapshot.
+
+La API ya no crea tablas ni carga el catálogo al arrancar; esto corre una vez
+por despliegue, en el build (ver render.yaml y el Dockerfile), nunca en el
+comando de arranque:
+
+    python migrate.py [--skip-seed] [--skip-snapshot]
+"""
+import sys
+import json
+import argparse
+from db import SessionLocal, Machine, init_db
+from catalog_import import import_catalog, load_backup, summarize
+from catalog_cache import catalog_cache
+
+
+def migrate(seed=True, snapshot=True):
+    init_db()
+    report = {"seeded": None, "snapshot": None}
+    db = SessionLocal()
+    try:
+        # Seed solo si la tabla está vacía; las cargas reales van por catalog_import.py
+        if seed and db.query(Machine.id).first() is None:
+            report["seeded"] = summarize(import_catalog(db, load_backup()))
+        if snapshot:
+            current = catalog_cache.refresh(db)
+            catalog_cache.save(current)
+            report["snapshot"] = {"path": catalog_cache.snapshot_path, "machines": len(current.machines),
+                                  "version": current.version}
+    finally:
+        db.close()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Crea el esquema, carga el catálogo inicial y guarda el snapshot")
+    parser.add_argument("--skip-seed", action="store_true", help="no cargar el backup aunque la tabla esté vacía")
+    parser.add_argument("--skip-snapshot", action="store_true", help="no escribir el snapshot del catálogo")
+    args = parser.parse_args(argv)
+    report = migrate(seed=not args.skip_seed, snapshot=not args.skip_snapshot)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+
+class PDFCache:
+    """Cache LRU de PDFs renderizados, direccionado por contenido.
+
+    La clave es un hash de los datos normalizados de la cotización más la
+    versión del template, así que dos pedidos que producirían el mismo PDF
+    comparten entrada. PDF_CACHE_MAX_BYTES acota la memoria (0 = desactivado);
+    con PDF_CACHE_DIR las entradas desalojadas se guardan en disco hasta
+    PDF_CACHE_DISK_MAX_BYTES.
+    """
+
+    def __init__(self, max_bytes=None, spill_dir=None, disk_max_bytes=None):
+        if max_bytes is None:
+            max_bytes = int(os.getenv("PDF_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+        if spill_dir is None:
+            spill_dir = os.getenv("PDF_CACHE_DIR") or None
+        if disk_max_bytes is None:
+            disk_max_bytes = int(os.getenv("PDF_CACHE_DISK_MAX_BYTES", 512 * 1024 * 1024))
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @staticmethod
+    def make_key(machine_code, fields, price_line, discount_percent, day, template_version):
+        # Solo entra lo que cambia el PDF: los campos impresos tal cual, la línea
+        # de precio ya formateada y el día de la fecha del encabezado
+        normalized = {
+            "machine_code": (machine_code or "").strip().upper(),
+            "fields": {name: str(value) for name, value in sorted(fields.items())},
+            "price": price_line,
+            "discount": round(float(discount_percent or 0.0), 4),
+            "day": day.isoformat(),
+            "template": template_version,
+        }
+        payload = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, f"{key}.pdf")
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            pdf_bytes = self._entries.get(key)
+            if pdf_bytes is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return pdf_bytes
+        pdf_bytes = self._read_spilled(key)
+        with self._lock:
+            if pdf_bytes is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self.put(key, pdf_bytes)
+        return pdf_bytes
+
+    def put(self, key, pdf_bytes):
+        if not self.enabled or len(pdf_bytes) > self.max_bytes:
+            return
+        evicted = []
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = pdf_bytes
+            self._size += len(pdf_bytes)
+            while self._size > self.max_bytes:
+                old_key, old_bytes = self._entries.popitem(last=False)
+                self._size -= len(old_bytes)
+                self.evictions += 1
+                evicted.append((old_key, old_bytes))
+        for old_key, old_bytes in evicted:
+            self._spill(old_key, old_bytes)
+
+    def _read_spilled(self, key):
+        if not self.spill_dir:
+            return None
+        try:
+            with open(self._spill_path(key), "rb") as pdf_file:
+                return pdf_file.read()
+        except FileNotFoundError:
+            return None
+
+    def _spill(self, key, pdf_bytes):
+        if not self.spill_dir:
+            return
+        try:
+            tmp_path = self._spill_path(key) + ".tmp"
+            with open(tmp_path, "wb") as pdf_file:
+                pdf_file.write(pdf_bytes)
+            os.replace(tmp_path, self._spill_path(key))
+            self._trim_disk()
+        except OSError as e:
+            logging.warning(f"Could not spill cached PDF to disk: {e}")
+
+    def _trim_disk(self):
+        files = []
+        for entry in os.scandir(self.spill_dir):
+            if entry.name.endswith(".pdf"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            os.unlink(path)
+            total -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "spill_dir": self.spill_dir,
+            }
+
+
+pdf_cache = PDFCache()
@@ -0,0 +1,71 @@
+"""Textos fijos de la cotización y versión del template.
+
+Sin ReportLab: la API calcula la clave del cache de PDFs con `template_version`
+sin cargar el layout, que solo necesitan los procesos del pool de render.
+"""
+import os
+import hashlib
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOGO_PATH = os.path.join(BASE_DIR, 'assets', 'pdflogo.png')
+
+# Subir cuando cambie el layout en código, para invalidar PDFs cacheados
+TEMPLATE_REVISION = 1
+
+MESES = [
+    'enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio',
+    'julio', 'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre'
+]
+
+PRODUCT_TITLE = '<u>ACOPLADO VOLCADOR TRIVUELCO DE USO RURAL</u>'
+PRODUCT_MODEL = '<b>MODELO A. V. A. 4000:</b>'
+
+SPECS = [
+    '<b>TRIVUELCO:</b> cambiando 1 perno de lugar elige si quiere descargar hacia la derecha, izquierda o atrás.',
+    '<b>Capacidad de carga 8000 Kg.</b>',
+    'Chasis construido con chapa plegada y estampada',
+    'Dirección de giro con avantrén a bolillas',
+    'Largo útil 4 Mts. - Ancho útil 2,10 Mts.',
+    'Barandas cerradas de 70 Cts., de alto - Puertas desacoplables en su parte superior o inferior, esto permite poder volcar, sacar o descargar desde abajo.',
+    '<b>Cilindro hidráulico, telescópico y oscilante de 3 tramos.</b>',
+    '<b>2 Ejes macizos de 3"</b>',
+    '<b>4 Elásticos reforzados 63 x 10 x 12 hojas</b>',
+    'Piso de chapa',
+    '<b>8 Llantas duales p/calzar neumáticos 750 x 16.</b> (no incluye neumáticos).',
+]
+
+CONDITIONS = [
+    '<b>LOS PRECIOS COTIZADOS SON NETOS A CONCESIONARIOS</b>',
+    'NO INCLUYEN EL 10,5% DE I.V.A.',
+    'Los precios cotizados son puestos en fábrica sobre camión.',
+    'Esta cotización se mantendrá por 1 día; luego caducará sin previo aviso.',
+]
+
+FOOTER = [
+    'Ruta Nacional 178 N° 545 – CP (2505) – La Parejas, Santa Fe, Argentina',
+    'Tel/Fax: 03471 – 471388',
+    'E-mail: ventas@agromaqslaparejas.com.ar – Web: www.agromaqargentina.com.ar',
+]
+
+
+_version = (None, None)
+
+
+def template_version(logo_path=LOGO_PATH):
+    """Hash de TEMPLATE_REVISION, los textos fijos y el logo; cambia si cambia cualquiera."""
+    global _version
+    logo_mtime = os.stat(logo_path).st_mtime_ns if os.path.exists(logo_path) else None
+    key = (logo_path, logo_mtime)
+    cached_key, version = _version
+    if cached_key == key:
+        return version
+    digest = hashlib.sha256()
+    digest.update(str(TEMPLATE_REVISION).encode())
+    for text in [PRODUCT_TITLE, PRODUCT_MODEL] + SPECS + CONDITIONS + FOOTER:
+        digest.update(text.encode('utf-8'))
+    if logo_mtime is not None:
+        with open(logo_path, 'rb') as logo_file:
+            digest.update(logo_file.read())
+    version = digest.hexdigest()[:16]
+    _version = (key, version)
+    return version
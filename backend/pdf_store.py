@@ -0,0 +1,100 @@
+import os
+import hmac
+import asyncio
+import hashlib
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def quotation_key(quotation_id):
+    return f"quotations/{quotation_id}.pdf"
+
+
+class StoredObject:
+    def __init__(self, path, size, mtime_ns):
+        self.path = path
+        self.size = size
+        # Un PDF guardado no cambia; tamaño + mtime alcanzan como validador (estilo nginx)
+        self.etag = f'"{size:x}-{mtime_ns:x}"'
+
+
+class LocalPDFStore:
+    """Almacenamiento de PDFs en disco con claves tipo object store
+    ("quotations/123.pdf"), para poder cambiarlo por un bucket sin tocar a los
+    llamadores. Las escrituras son atómicas: archivo temporal + rename.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or os.getenv("PDF_STORE_DIR", os.path.join(BASE_DIR, "storage"))
+
+    def _path(self, key):
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Invalid key: {key}")
+        return path
+
+    def put(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return self.head(key)
+
+    def head(self, key):
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return StoredObject(path, stat.st_size, stat.st_mtime_ns)
+
+    def get(self, key):
+        obj = self.head(key)
+        if obj is None:
+            return None
+        with open(obj.path, "rb") as f:
+            return f.read()
+
+    def iter_range(self, obj, start=0, end=None, chunk_size=64 * 1024):
+        # Lee [start, end] (inclusive) de a bloques, sin cargar el PDF completo
+        end = obj.size - 1 if end is None else end
+        with open(obj.path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    async def save_quotation_pdf(self, quotation_id, pdf_bytes):
+        return await asyncio.to_thread(self.put, quotation_key(quotation_id), pdf_bytes)
+
+    async def delete_quotation_pdf(self, quotation_id):
+        await asyncio.to_thread(self.delete, quotation_key(quotation_id))
+
+
+def download_token(quotation_id, secret=None):
+    # Link firmado para re-descargar sin credenciales de admin (los ids son secuenciales)
+    secret = secret or os.getenv("PDF_LINK_SECRET")
+    if not secret:
+        return None
+    return hmac.new(secret.encode(), str(quotation_id).encode(), hashlib.sha256).hexdigest()[:32]
+
+
+pdf_store = LocalPDFStore()
@@ -0,0 +1,153 @@
+"""Layout de la cotización en ReportLab.
+
+Es el único módulo que importa ReportLab (~150 ms): pdf_generator lo carga en
+el primer render, así la API arranca sin pagar ese costo.
+"""
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.lib.colors import Color
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+from reportlab import rl_config
+from datetime import datetime
+import threading
+import time
+import io
+import copy
+import os
+from pdf_generator import format_price_line
+from pdf_content import LOGO_PATH, MESES, PRODUCT_TITLE, PRODUCT_MODEL, SPECS, CONDITIONS, FOOTER, template_version
+
+# Streams binarios: sin rl_accel, codificar el logo en ASCII85 era ~75% del tiempo de cada build
+rl_config.useA85 = 0
+
+
+class QuotationTemplate:
+    """Partes fijas de la cotización, construidas una sola vez.
+
+    Estilos, logo decodificado y párrafos estáticos se preparan al crear el
+    template; `bind` solo arma los párrafos propios de cada cotización (fecha,
+    destinatario y precio) y devuelve copias de los estáticos, porque ReportLab
+    guarda el estado del layout en cada flowable.
+    """
+
+    def __init__(self, logo_path=LOGO_PATH):
+        self.logo_path = logo_path
+        self.logo_mtime = os.stat(logo_path).st_mtime_ns if os.path.exists(logo_path) else None
+        self.agromaq_green = Color(0.176, 0.314, 0.086)  # #2D5016
+        self._build_styles()
+        self._build_static_flowables()
+        self.version = template_version(logo_path)
+
+    def _build_styles(self):
+        styles = getSampleStyleSheet()
+        self.normal_style = ParagraphStyle(
+            'Normal', parent=styles['Normal'], fontSize=11, alignment=TA_LEFT, fontName='Helvetica', spaceAfter=4)
+        self.bullet_style = ParagraphStyle(
+            'Bullet', parent=styles['Normal'], fontSize=11, leftIndent=15, bulletIndent=5, fontName='Helvetica', spaceAfter=2)
+        self.footer_style = ParagraphStyle(
+            'Footer', parent=styles['Normal'], fontSize=9, alignment=TA_CENTER, textColor=self.agromaq_green)
+        self.fecha_style = ParagraphStyle(
+            'Fecha', parent=self.normal_style, alignment=TA_RIGHT, fontSize=11, spaceAfter=6)
+        self.cotizacion_style = ParagraphStyle(
+            'Cotizacion', parent=styles['Heading2'], fontSize=13, alignment=TA_CENTER, textColor=Color(0,0,0), fontName='Helvetica', spaceAfter=4)
+        self.producto_style = ParagraphStyle(
+            'Producto', parent=styles['Heading2'], fontSize=15, alignment=TA_CENTER, textColor=Color(0,0,0), fontName='Helvetica-Bold', spaceAfter=8)
+        self.price_style = ParagraphStyle(
+            'Precio', parent=styles['Normal'], alignment=TA_RIGHT, fontSize=13, fontName='Helvetica')
+        self.condiciones_style = ParagraphStyle(
+            'Condiciones', parent=styles['Normal'], alignment=TA_CENTER, fontSize=11)
+
+    def _build_static_flowables(self):
+        # 1. Encabezado solo con logo centrado
+        self.header = []
+        if self.logo_mtime is not None:
+            logo_img = Image(self.logo_path, width=300, height=None)  # Solo ancho, alto proporcional
+            logo_img.hAlign = 'CENTER'
+            logo_img._img  # decodifica el PNG una sola vez
+            self.header.append(logo_img)
+        else:
+            self.header.append(Spacer(1, 80))
+        self.header.append(Spacer(1, 20))  # Más espacio debajo del logo
+
+        # 3. Título central, 4. producto y modelo, 5. especificaciones técnicas
+        self.body = [
+            Paragraph('<u>COTIZACION</u>', self.cotizacion_style),
+            Spacer(1, 1),
+            Paragraph(PRODUCT_TITLE, self.producto_style),
+            Spacer(1, 5),
+            Paragraph(PRODUCT_MODEL, self.normal_style),
+            Spacer(1, 8),
+        ]
+        for spec in SPECS:
+            self.body.append(Paragraph(f'• {spec}', self.bullet_style))
+            self.body.append(Spacer(1, 7))  # Más espacio entre ítems
+        self.body.append(Spacer(1, 10))
+
+        # 7. Notas y condiciones centradas, 8. pie de página
+        self.tail = [Spacer(1, 10)]
+        self.tail.extend(Paragraph(text, self.condiciones_style) for text in CONDITIONS)
+        self.tail.append(Spacer(1, 15))
+        self.tail.append(Spacer(1, 30))
+        self.tail.extend(Paragraph(text, self.footer_style) for text in FOOTER)
+
+    def is_stale(self):
+        current = os.stat(self.logo_path).st_mtime_ns if os.path.exists(self.logo_path) else None
+        return current != self.logo_mtime
+
+    def bind(self, fields, final_price, today=None):
+        story = [copy.copy(f) for f in self.header]
+
+        # Fecha arriba a la derecha
+        hoy = today or datetime.now()
+        fecha_str = f"Las Parejas; {hoy.day} de {MESES[hoy.month-1]} del {hoy.year}"
+        story.append(Paragraph(fecha_str, self.fecha_style))
+
+        # 2. Datos del destinatario alineados a la izquierda
+        story.append(Paragraph('Sr.:', self.normal_style))
+        for field in ('clientName', 'clientCuit', 'clientAddress', 'clientPhone'):
+            value = fields.get(field, '')
+            if value:
+                story.append(Paragraph(f'<b>{value}</b>', self.normal_style))
+        story.append(Spacer(1, 10))
+
+        story.extend(copy.copy(f) for f in self.body)
+
+        # 6. Precio
+        story.append(Paragraph(format_price_line(final_price), self.price_style))
+
+        story.extend(copy.copy(f) for f in self.tail)
+        return story
+
+
+_template = None
+_template_lock = threading.Lock()
+
+
+def get_template():
+    # Template compartido por el proceso; se reconstruye si cambia el logo
+    global _template
+    with _template_lock:
+        if _template is None or _template.is_stale():
+            _template = QuotationTemplate()
+        return _template
+
+
+def build_quotation_pdf_timed(fields, final_price, template=None, today=None):
+    # (bytes, segundos armando la story, segundos en doc.build)
+    start = time.perf_counter()
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=10*mm,
+        leftMargin=10*mm,
+        topMargin=8*mm,
+        bottomMargin=20*mm
+    )
+    template = template or get_template()
+    story = template.bind(fields, final_price, today=today)
+    built = time.perf_counter()
+    doc.build(story)
+    return buffer.getvalue(), built - start, time.perf_counter() - built
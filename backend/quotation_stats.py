@@ -0,0 +1,136 @@
+import os
+import time
+import threading
+from datetime import datetime
+from sqlalchemy import select, func, case
+from db import Machine, Quotation
+
+
+def _empty_bucket():
+    return {"count": 0, "with_discount": 0, "revenue": 0.0, "discount_sum": 0.0}
+
+
+def _add(bucket, count, with_discount, revenue, discount_sum):
+    bucket["count"] += count
+    bucket["with_discount"] += with_discount
+    bucket["revenue"] += revenue
+    bucket["discount_sum"] += discount_sum
+
+
+def _summary(bucket):
+    count = bucket["count"]
+    return {
+        "total_quotations": count,
+        "quotations_with_discount": bucket["with_discount"],
+        "total_revenue": round(bucket["revenue"], 2),
+        "average_discount_percent": round(bucket["discount_sum"] / count, 4) if count else 0,
+    }
+
+
+class QuotationStats:
+    """Agregados de cotizaciones mantenidos en memoria.
+
+    Se cargan con una única consulta agrupada por (máquina, categoría, día) y
+    después cada cotización nueva los actualiza con `record`, así el dashboard
+    no recorre la tabla. Como otros procesos también insertan filas,
+    QUOTATION_STATS_TTL (segundos, 0 = nunca) fuerza una recarga periódica.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = float(os.getenv("QUOTATION_STATS_TTL", "300")) if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._last_id = 0
+        self._totals = _empty_bucket()
+        self._by_machine = {}
+        self._by_category = {}
+        self._by_day = {}
+
+    def _expired(self):
+        return self._loaded_at is None or (self.ttl > 0 and time.monotonic() - self._loaded_at > self.ttl)
+
+    @staticmethod
+    def _aggregate_query():
+        day = func.date(Quotation.created_at)
+        return (
+            select(
+                Quotation.machine_code,
+                Machine.category,
+                day,
+                func.count(Quotation.id),
+                func.sum(case((Quotation.discount_applied == True, 1), else_=0)),
+                func.sum(Quotation.final_price),
+                func.sum(Quotation.discount_percent),
+                func.max(Quotation.id),
+            )
+            .outerjoin(Machine, Machine.code == Quotation.machine_code)
+            .group_by(Quotation.machine_code, Machine.category, day)
+        )
+
+    def _apply(self, rows):
+        totals, by_machine, by_category, by_day = _empty_bucket(), {}, {}, {}
+        last_id = 0
+        for machine_code, category, row_day, count, with_discount, revenue, discount_sum, max_id in rows:
+            values = (count, with_discount or 0, revenue or 0.0, discount_sum or 0.0)
+            _add(totals, *values)
+            _add(by_machine.setdefault(machine_code, _empty_bucket()), *values)
+            _add(by_category.setdefault(category, _empty_bucket()), *values)
+            _add(by_day.setdefault(str(row_day)[:10], _empty_bucket()), *values)
+            last_id = max(last_id, max_id or 0)
+        self._totals, self._by_machine, self._by_category, self._by_day = totals, by_machine, by_category, by_day
+        self._last_id = last_id
+        self._loaded_at = time.monotonic()
+
+    def _load(self, db):
+        self._apply(db.execute(self._aggregate_query()).all())
+
+    def record(self, quotation, category):
+        # Llamar después del commit. Si todavía no se cargó nada, la próxima carga ya la incluye
+        with self._lock:
+            if self._loaded_at is None or (quotation.id is not None and quotation.id <= self._last_id):
+                return
+            created_at = quotation.created_at or datetime.utcnow()
+            values = (
+                1,
+                1 if quotation.discount_applied else 0,
+                quotation.final_price or 0.0,
+                quotation.discount_percent or 0.0,
+            )
+            _add(self._totals, *values)
+            _add(self._by_machine.setdefault(quotation.machine_code, _empty_bucket()), *values)
+            _add(self._by_category.setdefault(category, _empty_bucket()), *values)
+            _add(self._by_day.setdefault(created_at.date().isoformat(), _empty_bucket()), *values)
+
+    def _summarize(self, days):
+        result = _summary(self._totals)
+        result["discount_percentage"] = (
+            result["quotations_with_discount"] / result["total_quotations"] * 100
+            if result["total_quotations"] > 0 else 0
+        )
+        result["by_machine"] = {code: _summary(b) for code, b in self._by_machine.items()}
+        result["by_category"] = {category: _summary(b) for category, b in self._by_category.items()}
+        recent_days = sorted(self._by_day)[-days:] if days > 0 else []
+        result["by_day"] = {d: _summary(self._by_day[d]) for d in recent_days}
+        return result
+
+    def snapshot(self, db, days=30):
+        with self._lock:
+            if self._expired():
+                self._load(db)
+            return self._summarize(days)
+
+    async def snapshot_async(self, db, days=30):
+        # La consulta se espera fuera del lock: retenerlo durante un await bloquearía el event loop
+        if self._expired():
+            rows = (await db.execute(self._aggregate_query())).all()
+            with self._lock:
+                self._apply(rows)
+        with self._lock:
+            return self._summarize(days)
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+
+quotation_stats = QuotationStats()
@@ -0,0 +1,195 @@
+import os
+import json
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete, or_, and_
+from db import AsyncSessionLocal, QuoteJob
+from quotation_stats import quotation_stats
+from pdf_store import pdf_store
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class JobFailed(Exception):
+    """Error definitivo del handler (ej: máquina inexistente): no se reintenta."""
+
+
+class QuoteJobQueue:
+    """Cola de cotizaciones respaldada en la tabla quote_jobs.
+
+    `enqueue` solo inserta la fila; los workers (QUOTE_JOB_WORKERS corrutinas
+    por proceso) toman trabajos con un UPDATE condicional, así varios procesos
+    pueden compartir la cola sin pisarse. Cada toma deja un lease
+    (QUOTE_JOB_LEASE_SECONDS): si el proceso muere a mitad de camino, el trabajo
+    vuelve a estar disponible cuando vence. La cotización se guarda en la misma
+    transacción que marca el trabajo como terminado; el handler guarda antes el
+    PDF en pdf_store y devuelve (cotización, categoría, nombre de archivo); si
+    la transacción no se confirma, el PDF se borra.
+    """
+
+    def __init__(self, handler, session_factory=AsyncSessionLocal, workers=None, poll_interval=None,
+                 lease_seconds=None, max_attempts=None, retention_hours=None, store=pdf_store):
+        self.handler = handler
+        self.session_factory = session_factory
+        self.store = store
+        self.workers = int(os.getenv("QUOTE_JOB_WORKERS", "2")) if workers is None else workers
+        self.poll_interval = float(os.getenv("QUOTE_JOB_POLL_INTERVAL", "1")) if poll_interval is None else poll_interval
+        self.lease_seconds = int(os.getenv("QUOTE_JOB_LEASE_SECONDS", "300")) if lease_seconds is None else lease_seconds
+        self.max_attempts = int(os.getenv("QUOTE_JOB_MAX_ATTEMPTS", "3")) if max_attempts is None else max_attempts
+        self.retention_hours = (
+            float(os.getenv("QUOTE_JOB_RETENTION_HOURS", "168")) if retention_hours is None else retention_hours
+        )
+        self._tasks = []
+        self._wakeup = None
+        self._loop = None
+        self._last_purge = None
+
+    @staticmethod
+    def _available(now):
+        # Pendientes, o tomados por un worker cuyo lease ya venció
+        return or_(
+            QuoteJob.status == JOB_PENDING,
+            and_(QuoteJob.status == JOB_RUNNING, QuoteJob.lease_expires_at < now),
+        )
+
+    async def enqueue(self, db, payload):
+        job = QuoteJob(id=uuid.uuid4().hex, status=JOB_PENDING, payload=json.dumps(payload, ensure_ascii=False))
+        db.add(job)
+        await db.commit()
+        self._notify()
+        return job
+
+    def _notify(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._wakeup is not None and loop is self._loop:
+            self._wakeup.set()
+
+    async def claim(self, db):
+        now = datetime.utcnow()
+        candidates = (await db.execute(
+            select(QuoteJob.id).where(self._available(now)).order_by(QuoteJob.created_at).limit(5)
+        )).scalars().all()
+        for job_id in candidates:
+            result = await db.execute(
+                update(QuoteJob)
+                .where(QuoteJob.id == job_id, self._available(now))
+                .values(
+                    status=JOB_RUNNING,
+                    lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                    attempts=QuoteJob.attempts + 1,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            # Otro worker pudo ganarlo entre el SELECT y el UPDATE
+            if result.rowcount == 1:
+                return job_id
+        return None
+
+    async def _finish(self, db, job_id, attempt, **values):
+        # Solo el dueño del lease vigente puede cerrar el trabajo
+        result = await db.execute(
+            update(QuoteJob)
+            .where(QuoteJob.id == job_id, QuoteJob.status == JOB_RUNNING, QuoteJob.attempts == attempt)
+            .values(lease_expires_at=None, **values)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
+
+    async def process(self, job_id):
+        async with self.session_factory() as db:
+            payload, attempt = (await db.execute(
+                select(QuoteJob.payload, QuoteJob.attempts).where(QuoteJob.id == job_id)
+            )).one()
+            quotation = None
+            try:
+                quotation, category, filename = await self.handler(db, json.loads(payload))
+                await db.flush()
+                finished = await self._finish(
+                    db, job_id, attempt, status=JOB_DONE, filename=filename,
+                    quotation_id=quotation.id, error=None, finished_at=datetime.utcnow(),
+                )
+                if not finished:
+                    # El lease venció y otro worker lo retomó: se descarta este resultado.
+                    # El PDF se borra antes del rollback, mientras el id sigue siendo nuestro
+                    await self.store.delete_quotation_pdf(quotation.id)
+                    await db.rollback()
+                    return
+                await db.commit()
+            except Exception as e:
+                if quotation is not None:
+                    # Sin la fila el PDF guardado queda huérfano (y su id se puede reutilizar)
+                    await self.store.delete_quotation_pdf(quotation.id)
+                await db.rollback()
+                retry = not isinstance(e, JobFailed) and attempt < self.max_attempts
+                if not isinstance(e, JobFailed):
+                    logging.error(f"Error processing quote job {job_id}: {e}")
+                await self._finish(
+                    db, job_id, attempt, error=str(e),
+                    status=JOB_PENDING if retry else JOB_FAILED,
+                    finished_at=None if retry else datetime.utcnow(),
+                )
+                await db.commit()
+                return
+            quotation_stats.record(quotation, category)
+
+    async def run_once(self):
+        async with self.session_factory() as db:
+            job_id = await self.claim(db)
+        if job_id is None:
+            return False
+        await self.process(job_id)
+        return True
+
+    async def purge(self):
+        if self.retention_hours <= 0:
+            return 0
+        cutoff = datetime.utcnow() - timedelta(hours=self.retention_hours)
+        async with self.session_factory() as db:
+            result = await db.execute(
+                delete(QuoteJob).where(QuoteJob.status.in_((JOB_DONE, JOB_FAILED)), QuoteJob.finished_at < cutoff)
+            )
+            await db.commit()
+        self._last_purge = datetime.utcnow()
+        return result.rowcount
+
+    async def _worker(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                if self._last_purge is None or datetime.utcnow() - self._last_purge > timedelta(hours=1):
+                    await self.purge()
+                if await self.run_once():
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Quote job worker error: {e}")
+            # Sin trabajo: esperar un aviso de enqueue (mismo proceso) o el próximo sondeo (otros procesos)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._tasks or self.workers <= 0:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._wakeup = None
+        self._loop = None
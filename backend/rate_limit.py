@@ -0,0 +1,217 @@
+"""Límite de cotizaciones por cliente (IP o usuario de Telegram).
+
+Dos controles, ambos por clave de cliente:
+
+- Token bucket: RATE_LIMIT_PER_MINUTE cotizaciones sostenidas con ráfagas de
+  hasta RATE_LIMIT_BURST. El estado vive en memoria (un proceso) o, con
+  RATE_LIMIT_BACKEND=sqlite, en un archivo SQLite compartido por los workers
+  de la misma máquina (RATE_LIMIT_SQLITE_PATH).
+- Concurrencia: a lo sumo RATE_LIMIT_MAX_CONCURRENT cotizaciones en curso por
+  cliente y por proceso, así un solo cliente no ocupa toda la capacidad del
+  pool de render (que sigue siendo el tope global, ver RenderPool).
+
+Los lotes (/generate-quote/batch) además pagan una ficha por fila en un bucket
+propio (`batch_rate_limiter`): RATE_LIMIT_BATCH_ROWS_PER_MINUTE filas sostenidas
+con ráfagas de RATE_LIMIT_BATCH_ROWS_BURST (por defecto un lote máximo).
+
+RATE_LIMIT_BACKEND=off desactiva todo.
+"""
+import os
+import math
+import time
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after, reason="rate"):
+        super().__init__(f"Rate limited ({reason}), retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+        self.reason = reason
+
+    @property
+    def retry_after_header(self):
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+def refill(tokens, updated, now, rate, burst):
+    # Tokens disponibles tras `now - updated` segundos recargando `rate` por segundo
+    return min(burst, tokens + max(0.0, now - updated) * rate)
+
+
+def take_token(tokens, rate, burst, cost=1):
+    """(permitido, tokens restantes, segundos hasta tener `cost` tokens)."""
+    if tokens >= cost:
+        return True, tokens - cost, 0.0
+    return False, tokens, (cost - tokens) / rate if rate > 0 else float("inf")
+
+
+class MemoryBucketStore:
+    """Buckets en un dict LRU acotado; los clientes inactivos se descartan primero."""
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost=1, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            allowed, tokens, retry_after = take_token(refill(tokens, updated, now, rate, burst), rate, burst, cost)
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteBucketStore:
+    """Buckets en una tabla SQLite propia (no la base de la app): lectura y
+    escritura en una transacción IMMEDIATE, así dos workers no se pisan."""
+
+    PURGE_EVERY = 1000
+    PURGE_AFTER_SECONDS = 3600
+
+    def __init__(self, path=None, busy_timeout=5.0):
+        self.path = path or os.getenv("RATE_LIMIT_SQLITE_PATH", os.path.join(BASE_DIR, "storage", "rate_limit.db"))
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._takes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _connection(self):
+        # Una conexión por thread (asyncio.to_thread usa varios)
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def take(self, key, rate, burst, cost=1, now=None):
+        # Reloj de pared: los procesos no comparten time.monotonic()
+        now = time.time() if now is None else now
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            allowed, tokens, retry_after = take_token(refill(tokens, updated, now, rate, burst), rate, burst, cost)
+            connection.execute(
+                "INSERT INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens, now),
+            )
+            self._takes += 1
+            if self._takes % self.PURGE_EVERY == 0:
+                # Un bucket sin uso hace rato ya se recargó entero: borrarlo no cambia nada
+                connection.execute("DELETE FROM rate_buckets WHERE updated < ?", (now - self.PURGE_AFTER_SECONDS,))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return allowed, retry_after
+
+    def clear(self):
+        self._connection().execute("DELETE FROM rate_buckets")
+
+
+def create_store(backend=None):
+    backend = (backend or os.getenv("RATE_LIMIT_BACKEND", "memory")).lower()
+    if backend in ("off", "none", "disabled"):
+        return None
+    if backend == "sqlite":
+        return SQLiteBucketStore()
+    if backend == "memory":
+        return MemoryBucketStore()
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend}")
+
+
+class RateLimiter:
+    def __init__(self, store=False, per_minute=None, burst=None, max_concurrent=None):
+        # store=False: elegir según RATE_LIMIT_BACKEND; store=None: sin límite
+        self.store = create_store() if store is False else store
+        per_minute = float(os.getenv("RATE_LIMIT_PER_MINUTE", "30")) if per_minute is None else per_minute
+        self.rate = per_minute / 60.0
+        self.burst = float(os.getenv("RATE_LIMIT_BURST", "10")) if burst is None else burst
+        self.max_concurrent = (
+            int(os.getenv("RATE_LIMIT_MAX_CONCURRENT", "2")) if max_concurrent is None else max_concurrent
+        )
+        self._in_flight = {}
+        self.rejected = {"rate": 0, "concurrency": 0}
+
+    @property
+    def enabled(self):
+        return self.store is not None
+
+    async def check(self, key, cost=1):
+        if not self.enabled:
+            return
+        if isinstance(self.store, SQLiteBucketStore):
+            allowed, retry_after = await asyncio.to_thread(self.store.take, key, self.rate, self.burst, cost)
+        else:
+            allowed, retry_after = self.store.take(key, self.rate, self.burst, cost)
+        if not allowed:
+            self.rejected["rate"] += 1
+            raise RateLimited(retry_after, "rate")
+
+    @asynccontextmanager
+    async def admit(self, key, cost=1):
+        """Cuenta contra el bucket del cliente y ocupa uno de sus lugares de concurrencia
+        mientras dura el bloque. Lanza RateLimited si no corresponde atenderlo."""
+        if not self.enabled:
+            yield
+            return
+        # El lugar se reserva antes del bucket: un pedido rechazado por concurrencia no gasta tokens
+        if self.max_concurrent > 0 and self._in_flight.get(key, 0) >= self.max_concurrent:
+            self.rejected["concurrency"] += 1
+            raise RateLimited(1.0, "concurrency")
+        self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        try:
+            await self.check(key, cost)
+            yield
+        finally:
+            remaining = self._in_flight[key] - 1
+            if remaining:
+                self._in_flight[key] = remaining
+            else:
+                del self._in_flight[key]
+
+    @property
+    def in_flight(self):
+        return sum(self._in_flight.values())
+
+
+def client_ip(request):
+    # Detrás de un proxy (Render) la IP real es la última que agregó el proxy en
+    # X-Forwarded-For; las anteriores las puede inventar el cliente
+    if os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() in ("1", "true", "yes"):
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[-1].strip()
+    return request.client.host if request.client else "unknown"
+
+
+rate_limiter = RateLimiter()
+batch_rate_limiter = RateLimiter(
+    per_minute=float(os.getenv("RATE_LIMIT_BATCH_ROWS_PER_MINUTE", "100")),
+    burst=float(os.getenv("RATE_LIMIT_BATCH_ROWS_BURST", os.getenv("QUOTE_BATCH_MAX_ROWS", "500"))),
+    # La concurrencia ya la controla rate_limiter
+    max_concurrent=0,
+)
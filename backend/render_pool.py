@@ -0,0 +1,175 @@
+import os
+import asyncio
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class RenderPoolSaturated(Exception):
+    """Se lanza cuando el pool ya tiene el máximo de renders en curso y en cola."""
+
+
+def _set_if_pending(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class RenderPool:
+    """Ejecuta builds de ReportLab fuera del event loop en un pool de procesos acotado.
+
+    PDF_RENDER_WORKERS fija la cantidad de procesos (0 = renderizar en un thread,
+    útil donde no se pueden crear procesos) y PDF_RENDER_QUEUE_DEPTH cuántos
+    trabajos pueden esperar un worker libre antes de rechazar con RenderPoolSaturated.
+    Con block=True no se rechaza: se espera afuera hasta que se libere un lugar,
+    así el pool nunca tiene más de `capacity` trabajos.
+    """
+
+    def __init__(self, max_workers=None, queue_depth=None, start_method=None):
+        if max_workers is None:
+            max_workers = int(os.getenv("PDF_RENDER_WORKERS", os.cpu_count() or 1))
+        if queue_depth is None:
+            queue_depth = int(os.getenv("PDF_RENDER_QUEUE_DEPTH", max(max_workers, 1) * 4))
+        self.max_workers = max(0, max_workers)
+        self.queue_depth = max(0, queue_depth)
+        self.start_method = start_method or os.getenv("PDF_RENDER_START_METHOD", "spawn")
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        # (loop, future) de los submit(block=True) esperando lugar; se despiertan
+        # de a uno con call_soon_threadsafe porque los lugares se liberan desde
+        # threads del executor
+        self._waiters = deque()
+
+    @property
+    def capacity(self):
+        return max(self.max_workers, 1) + self.queue_depth
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    @property
+    def queued(self):
+        return max(0, self._in_flight - max(self.max_workers, 1))
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.max_workers == 0:
+                    # Un solo thread, igual que la capacidad calculada para un worker
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-render")
+                else:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context(self.start_method),
+                    )
+            return self._executor
+
+    def _discard_executor(self, executor):
+        # Si un worker muere (OOM, crash de ReportLab) el ProcessPoolExecutor queda roto
+        # para siempre: se descarta y el próximo render arma uno nuevo
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        logging.error("PDF render pool broken (a worker died), restarting it")
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _try_acquire(self):
+        # Debe llamarse con self._lock tomado
+        if self._in_flight >= self.capacity:
+            return False
+        self._in_flight += 1
+        return True
+
+    def _acquire(self):
+        with self._lock:
+            if not self._try_acquire():
+                raise RenderPoolSaturated(
+                    f"{self._in_flight} renders en curso (capacidad {self.capacity})"
+                )
+
+    async def _acquire_waiting(self):
+        loop = asyncio.get_running_loop()
+        first = True
+        while True:
+            with self._lock:
+                if self._try_acquire():
+                    return
+                waiter = loop.create_future()
+                # Quien ya esperó vuelve al frente de la fila si otro le ganó el lugar
+                (self._waiters.append if first else self._waiters.appendleft)((loop, waiter))
+            first = False
+            try:
+                await waiter
+            except BaseException:
+                with self._lock:
+                    try:
+                        self._waiters.remove((loop, waiter))
+                        woken = False
+                    except ValueError:
+                        woken = True
+                if woken:
+                    # Ya lo habían despertado: el aviso pasa al siguiente
+                    self._wake_next()
+                raise
+
+    def _wake_next(self):
+        while True:
+            with self._lock:
+                if not self._waiters or self._in_flight >= self.capacity:
+                    return
+                loop, waiter = self._waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(_set_if_pending, waiter)
+                return
+            except RuntimeError:
+                # Event loop cerrado: se prueba con el siguiente
+                continue
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._wake_next()
+
+    async def submit(self, fn, *args, block=False):
+        # block=True espera a que haya lugar en lugar de fallar con RenderPoolSaturated:
+        # lo usan los lotes y la cola de trabajos, que prefieren esperar a devolver 503
+        if block:
+            await self._acquire_waiting()
+        else:
+            self._acquire()
+        try:
+            executor = self._get_executor()
+            try:
+                future = executor.submit(fn, *args)
+            except BrokenProcessPool:
+                self._discard_executor(executor)
+                executor = self._get_executor()
+                future = executor.submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # El lugar se libera cuando el trabajo termina, no cuando se cancela quien lo
+        # espera (cliente desconectado, timeout): el worker sigue ocupado renderizando.
+        # Un trabajo que todavía estaba en cola sí se cancela y libera su lugar enseguida.
+        future.add_done_callback(lambda _: self._release())
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            # Este render se pierde; los siguientes van a un pool nuevo
+            self._discard_executor(executor)
+            raise
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            logging.info("Shutting down PDF render pool")
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+render_pool = RenderPool()
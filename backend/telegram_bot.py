@@ -1,58 +1,149 @@
+from __future__ import annotations
 import os
 import logging
-from telegram import Update
-from telegram.ext import Application, CommandHandler, ContextTypes
-from sqlalchemy.orm import sessionmaker
-from db import engine, Machine, Quotation, MACHINERY_CATALOG
+from typing import TYPE_CHECKING
+from sqlalchemy import select
+from db import AsyncSessionLocal, Machine, Quotation
 from pdf_generator import PDFGenerator
+from render_pool import RenderPoolSaturated
+from catalog_cache import catalog_cache
+from quotation_stats import quotation_stats
+from catalog_pricing import reprice_catalog, RepricingError
+from pdf_store import pdf_store
+from rate_limit import rate_limiter, RateLimited
+from idempotency import quote_coalescer, quote_fingerprint
+from telegram_files import TelegramFileCache
+from metrics import TELEGRAM_HANDLER_SECONDS
 import json
 
+if TYPE_CHECKING:
+    # python-telegram-bot (~250 ms con httpx) se importa recién al armar la Application
+    from telegram import Update
+    from telegram.ext import ContextTypes
+
 # Configure logging
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     level=logging.INFO
 )
 
+WEBHOOK_PATH = "/telegram/webhook"
+
+def timed_handler(command, handler):
+    # Latencia de cada comando para /metrics
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        with TELEGRAM_HANDLER_SECONDS.time(command):
+            return await handler(update, context)
+    return wrapper
+
 class TelegramBot:
     def __init__(self):
         self.token = os.getenv("BOT_TOKEN")
         self.admin_ids = [int(id.strip()) for id in os.getenv("TELEGRAM_ADMIN_IDS", "").split(",") if id.strip()]
-        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        # Sesiones asyncio compartidas con la API: las consultas no bloquean el loop del bot
+        self.AsyncSessionLocal = AsyncSessionLocal
         self.pdf_generator = PDFGenerator()
+        self.rate_limiter = rate_limiter
+        self.quote_coalescer = quote_coalescer
+        self.file_cache = TelegramFileCache()
+        # "webhook": Telegram envía los updates a la API (WEBHOOK_PATH); "polling": el bot los pide
+        self.webhook_url = os.getenv("TELEGRAM_WEBHOOK_URL")
+        self.webhook_secret = os.getenv("TELEGRAM_WEBHOOK_SECRET")
+        self.mode = os.getenv("TELEGRAM_MODE", "webhook" if self.webhook_url else "polling")
+        # Cuántos updates se procesan a la vez: un /cotizar lento no frena al resto
+        self.concurrent_updates = max(1, int(os.getenv("TELEGRAM_CONCURRENT_UPDATES", "16")))
+        # Permite apuntar a una API de Telegram local (tests, bot-api server propio)
+        self.api_base_url = os.getenv("TELEGRAM_API_BASE_URL")
+        self.application = None
         
     def is_admin(self, user_id: int) -> bool:
         return user_id in self.admin_ids
     
+    @property
+    def accepts_webhooks(self) -> bool:
+        return self.mode == "webhook" and self.application is not None and self.application.running
+    
+    def build_application(self):
+        from telegram.ext import Application, CommandHandler
+        builder = Application.builder().token(self.token).concurrent_updates(self.concurrent_updates)
+        if self.api_base_url:
+            builder = builder.base_url(self.api_base_url)
+        if self.mode == "webhook":
+            builder = builder.updater(None)
+        application = builder.build()
+        
+        # Add handlers
+        commands = {
+            "start": self.start_command,
+            "ayuda": self.help_command,
+            "listar_maquinas": self.list_machines,
+            "buscar": self.search_machines,
+            "cotizar": self.generate_quote,
+            "set_price": self.set_price,
+            "ajustar_precios": self.bulk_set_prices,
+        }
+        for command, handler in commands.items():
+            application.add_handler(CommandHandler(command, timed_handler(command, handler)))
+        return application
+    
     async def start(self):
         if not self.token:
             logging.warning("BOT_TOKEN not set, skipping bot initialization")
             return
+        if self.mode == "webhook" and not self.webhook_url:
+            logging.error("TELEGRAM_MODE=webhook requires TELEGRAM_WEBHOOK_URL, skipping bot initialization")
+            return
+        if self.mode == "webhook" and not self.webhook_secret:
+            # Sin secreto cualquiera podría postear updates falsos (p. ej. /set_price con el id de un admin)
+            logging.error("TELEGRAM_MODE=webhook requires TELEGRAM_WEBHOOK_SECRET, skipping bot initialization")
+            return
             
-        application = Application.builder().token(self.token).build()
-        
-        # Add handlers
-        application.add_handler(CommandHandler("start", self.start_command))
-        application.add_handler(CommandHandler("ayuda", self.help_command))
-        application.add_handler(CommandHandler("listar_maquinas", self.list_machines))
-        application.add_handler(CommandHandler("cotizar", self.generate_quote))
-        application.add_handler(CommandHandler("set_price", self.set_price))
+        self.application = self.build_application()
         
         # Start the bot
-        await application.initialize()
-        await application.start()
-        await application.updater.start_polling()
+        await self.application.initialize()
+        await self.application.start()
+        if self.mode == "webhook":
+            from telegram import Update
+            await self.application.bot.set_webhook(
+                url=self.webhook_url.rstrip("/") + WEBHOOK_PATH,
+                secret_token=self.webhook_secret,
+                allowed_updates=Update.ALL_TYPES,
+            )
+        else:
+            await self.application.updater.start_polling()
+    
+    async def process_webhook(self, data: dict):
+        # Se encola y se responde enseguida; la Application procesa con concurrent_updates
+        from telegram import Update
+        update = Update.de_json(data, self.application.bot)
+        await self.application.update_queue.put(update)
+    
+    async def stop(self):
+        if self.application is None:
+            return
+        if self.application.updater and self.application.updater.running:
+            await self.application.updater.stop()
+        if self.application.running:
+            await self.application.stop()
+        await self.application.shutdown()
+        self.application = None
         
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         welcome_message = (
             "🚜 *¡Bienvenido al Bot de Cotizaciones Agromaq!*\n\n"
             "Comandos disponibles:\n"
             "📋 `/listar_maquinas` - Ver catálogo completo de máquinas\n"
+            "🔍 `/buscar <texto>` - Buscar máquinas por nombre o categoría\n"
             "💰 `/cotizar <código> <cuit> <nombre> <teléfono> [--descuento]` - Generar cotización\n"
             "ℹ️ `/ayuda` - Ayuda detallada\n"
         )
         
         if self.is_admin(update.effective_user.id):
-            welcome_message += "\n*Comandos de administrador:*\n💲 `/set_price <código> <precio>` - Actualizar precio"
+            welcome_message += (
+                "\n*Comandos de administrador:*\n💲 `/set_price <código> <precio>` - Actualizar precio\n"
+                "📈 `/ajustar_precios <porcentaje>% [categoría]` - Ajuste masivo de precios"
+            )
             
         await update.message.reply_text(welcome_message, parse_mode='Markdown')
     
@@ -65,6 +156,10 @@ class TelegramBot:
 📋 `/listar_maquinas` 
 Ver todas las categorías y productos disponibles con códigos y precios actuales.
 
+🔍 `/buscar <texto>`
+Buscar máquinas por nombre, categoría o descripción, sin importar acentos.
+*Ejemplo:* `/buscar acoplado tolva`
+
 💰 `/cotizar <código> <cuit> <nombre> <teléfono> [--descuento]`
 Generar cotización en PDF. Parámetros:
 • `código`: Código del producto (ej: ACO001)
@@ -86,33 +181,32 @@ Generar cotización en PDF. Parámetros:
 💲 `/set_price <código> <nuevo_precio>`
 Actualizar el precio de una máquina.
 *Ejemplo:* `/set_price ACO001 25000`
+
+📈 `/ajustar_precios <porcentaje>% [categoría] [--simular]`
+`/ajustar_precios <código>=<precio> ... [--simular]`
+Ajustar muchos precios en una sola operación.
+*Ejemplos:* `/ajustar_precios 8% Sembradoras` · `/ajustar_precios ACO001=25000 ACO002=31000`
             """
         
         await update.message.reply_text(help_text, parse_mode='Markdown')
     
     async def list_machines(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        db = self.SessionLocal()
+        db = self.AsyncSessionLocal()
         try:
-            # Group machines by category
-            machines = db.query(Machine).filter(Machine.active == True).all()
-            if not machines:
+            # Mismo árbol por categoría que sirve /machines/catalog, ya armado en el cache
+            categories = (await catalog_cache.snapshot_async(db)).category_tree
+            if not categories:
                 await update.message.reply_text("No hay máquinas disponibles.")
                 return
             
-            # Group by category
-            categories = {}
-            for machine in machines:
-                if machine.category not in categories:
-                    categories[machine.category] = []
-                categories[machine.category].append(machine)
-            
             message = "🚜 *Catálogo de Máquinas Agromaq*\n\n"
             
-            for category, category_machines in categories.items():
+            for group in categories:
+                category, category_machines = group["categoria"], group["productos"]
                 message += f"*📂 {category}*\n"
                 for machine in category_machines[:5]:  # Limit to avoid message length issues
-                    message += f"• `{machine.code}` - {machine.name}\n"
-                    message += f"  💰 ${machine.price:,.2f}\n"
+                    message += f"• `{machine['code']}` - {machine['name']}\n"
+                    message += f"  💰 ${machine['price']:,.2f}\n"
                 
                 if len(category_machines) > 5:
                     message += f"  ... y {len(category_machines) - 5} productos más\n"
@@ -129,7 +223,33 @@ Actualizar el precio de una máquina.
                 await update.message.reply_text(message, parse_mode='Markdown')
                 
         finally:
-            db.close()
+            await db.close()
+    
+    async def search_machines(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = " ".join(context.args).strip()
+        if not query:
+            await update.message.reply_text(
+                "❌ *Uso incorrecto*\n\n*Formato:* `/buscar <texto>`\n*Ejemplo:* `/buscar acoplado tolva`",
+                parse_mode='Markdown'
+            )
+            return
+        
+        db = self.AsyncSessionLocal()
+        try:
+            snapshot = await catalog_cache.snapshot_async(db)
+            results = (await snapshot.search_index_async()).search(query, limit=10)
+            if not results:
+                await update.message.reply_text(f"🔍 No se encontraron máquinas para \"{query}\".")
+                return
+            
+            message = f"🔍 *Resultados para \"{query}\"*\n\n"
+            for machine in results:
+                message += f"• `{machine['code']}` - {machine['name']}\n"
+                message += f"  📂 {machine['category']} · 💰 ${machine['price']:,.2f}\n"
+            message += "\n💡 *Tip:* Usa `/cotizar <código> <cuit> <nombre> <teléfono>` para generar una cotización"
+            await update.message.reply_text(message, parse_mode='Markdown')
+        finally:
+            await db.close()
     
     async def generate_quote(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         if len(context.args) < 4:
@@ -176,9 +296,22 @@ Actualizar el precio de una máquina.
                 except Exception:
                     discount_percent = 0.0
         
-        db = self.SessionLocal()
         try:
-            machine = db.query(Machine).filter(Machine.code == machine_code, Machine.active == True).first()
+            # Por usuario: un solo cliente no puede acaparar el pool de render
+            async with self.rate_limiter.admit(f"tg:{update.effective_user.id}"):
+                await self._send_quote(update, machine_code, client_cuit, client_name, client_phone, discount_percent)
+        except RateLimited as e:
+            await update.message.reply_text(
+                f"⏳ Demasiadas cotizaciones seguidas. Intenta nuevamente en {e.retry_after_header} segundos."
+            )
+    
+    async def _send_quote(self, update: Update, machine_code, client_cuit, client_name, client_phone, discount_percent):
+        db = self.AsyncSessionLocal()
+        try:
+            result = await db.execute(
+                select(Machine).where(Machine.code == machine_code, Machine.active == True)
+            )
+            machine = result.scalars().first()
             if not machine:
                 await update.message.reply_text(f"❌ Máquina con código '{machine_code}' no encontrada.")
                 return
@@ -202,49 +335,83 @@ Actualizar el precio de una máquina.
             
             quotation_data = QuotationData()
             
-            # Save to database
-            db_quotation = Quotation(
-                machine_code=machine_code,
-                client_cuit=client_cuit,
-                client_name=client_name,
-                client_phone=client_phone,
-                notes=quotation_data.notes,
-                discount_applied=discount_percent > 0,
-                discount_percent=discount_percent,
-                final_price=final_price
-            )
-            db.add(db_quotation)
-            db.commit()
-            
-            # Generate PDF
-            pdf_path = await self.pdf_generator.generate_quotation_pdf(machine, quotation_data, final_price)
-            
-            # Send PDF
-            with open(pdf_path, 'rb') as pdf_file:
-                caption = (
-                    f"✅ *Cotización generada*\n\n"
-                    f"👤 Cliente: {client_name}\n"
-                    f"🆔 CUIT: {client_cuit}\n"
-                    f"🚜 Producto: {machine.name}\n"
-                    f"🏷️ Código: {machine_code}\n"
-                    f"💰 Precio: ${final_price:,.2f}"
+            async def create():
+                # Save to database
+                db_quotation = Quotation(
+                    machine_code=machine_code,
+                    client_cuit=client_cuit,
+                    client_name=client_name,
+                    client_phone=client_phone,
+                    notes=quotation_data.notes,
+                    discount_applied=discount_percent > 0,
+                    discount_percent=discount_percent,
+                    final_price=final_price
                 )
+                db.add(db_quotation)
                 
-                await update.message.reply_document(
-                    document=pdf_file,
-                    filename=f"cotizacion-{client_name.replace(' ', '-')}-{machine_code}.pdf",
-                    caption=caption,
-                    parse_mode='Markdown'
-                )
+                # Generate PDF (si el pool está saturado no se guarda la cotización)
+                pdf_bytes = await self.pdf_generator.generate_quotation_pdf(machine, quotation_data, final_price)
+                await db.flush()
+                await pdf_store.save_quotation_pdf(db_quotation.id, pdf_bytes)
+                try:
+                    await db.commit()
+                except Exception:
+                    # Sin la fila el PDF guardado queda huérfano (y su id se puede reutilizar)
+                    await pdf_store.delete_quotation_pdf(db_quotation.id)
+                    raise
+                quotation_stats.record(db_quotation, machine.category)
+                return pdf_bytes
+            
+            # Un /cotizar repetido (doble toque, reintento) comparte una sola cotización
+            fingerprint = quote_fingerprint(vars(quotation_data), scope=f"tg:{update.effective_user.id}")
+            pdf_bytes, _ = await self.quote_coalescer.run(f"tg:{fingerprint}", fingerprint, create)
+            
+            # Send PDF (directamente desde memoria)
+            caption = (
+                f"✅ *Cotización generada*\n\n"
+                f"👤 Cliente: {client_name}\n"
+                f"🆔 CUIT: {client_cuit}\n"
+                f"🚜 Producto: {machine.name}\n"
+                f"🏷️ Código: {machine_code}\n"
+                f"💰 Precio: ${final_price:,.2f}"
+            )
             
-            # Clean up temporary file
-            os.unlink(pdf_path)
+            await self._reply_pdf(
+                update,
+                pdf_bytes,
+                filename=f"cotizacion-{client_name.replace(' ', '-')}-{machine_code}.pdf",
+                caption=caption,
+            )
             
+        except RenderPoolSaturated:
+            await update.message.reply_text("⏳ Hay muchas cotizaciones en proceso. Intenta nuevamente en unos segundos.")
         except Exception as e:
             logging.error(f"Error generating quote: {e}")
             await update.message.reply_text("❌ Error al generar la cotización. Intenta nuevamente.")
         finally:
-            db.close()
+            await db.close()
+    
+    async def _reply_pdf(self, update: Update, pdf_bytes, filename, caption):
+        # Un PDF idéntico ya subido se reenvía por file_id, sin volver a subir los bytes
+        from telegram.error import BadRequest
+        key = self.file_cache.make_key(pdf_bytes)
+        file_id = self.file_cache.get(key)
+        if file_id:
+            try:
+                return await update.message.reply_document(document=file_id, caption=caption, parse_mode='Markdown')
+            except BadRequest:
+                # Telegram ya no reconoce el file_id: se sube de nuevo
+                self.file_cache.discard(key)
+        message = await update.message.reply_document(
+            document=pdf_bytes,
+            filename=filename,
+            caption=caption,
+            parse_mode='Markdown'
+        )
+        document = getattr(message, "document", None)
+        if document is not None:
+            self.file_cache.put(key, document.file_id)
+        return message
     
     async def set_price(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not self.is_admin(update.effective_user.id):
@@ -269,16 +436,18 @@ Actualizar el precio de una máquina.
             await update.message.reply_text("❌ El precio debe ser un número válido.")
             return
         
-        db = self.SessionLocal()
+        db = self.AsyncSessionLocal()
         try:
-            machine = db.query(Machine).filter(Machine.code == machine_code).first()
+            result = await db.execute(select(Machine).where(Machine.code == machine_code))
+            machine = result.scalars().first()
             if not machine:
                 await update.message.reply_text(f"❌ Máquina con código '{machine_code}' no encontrada.")
                 return
             
             old_price = machine.price
             machine.price = new_price
-            db.commit()
+            await db.commit()
+            await catalog_cache.refresh_async(db)
             
             await update.message.reply_text(
                 f"✅ *Precio actualizado*\n\n"
@@ -293,4 +462,62 @@ Actualizar el precio de una máquina.
             logging.error(f"Error updating price: {e}")
             await update.message.reply_text("❌ Error al actualizar el precio.")
         finally:
-            db.close()
+            await db.close()
+
+    async def bulk_set_prices(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if not self.is_admin(update.effective_user.id):
+            await update.message.reply_text("❌ No tienes permisos para ejecutar este comando.")
+            return
+        
+        dry_run = "--simular" in context.args
+        args = [arg for arg in context.args if arg != "--simular"]
+        prices, rules = {}, []
+        try:
+            if args and args[0].endswith("%"):
+                category = " ".join(args[1:]).strip('"') or None
+                rules.append({"category": category, "percent": float(args[0][:-1].replace(",", "."))})
+            else:
+                for arg in args:
+                    code, price = arg.split("=", 1)
+                    prices[code] = float(price.replace(",", "."))
+        except ValueError:
+            prices, rules = {}, []
+        
+        if not prices and not rules:
+            await update.message.reply_text(
+                "❌ *Uso incorrecto*\n\n"
+                "*Formato:*\n"
+                "`/ajustar_precios <porcentaje>% [categoría] [--simular]`\n"
+                "`/ajustar_precios <código>=<precio> ... [--simular]`\n\n"
+                "*Ejemplo:*\n"
+                "`/ajustar_precios 8% Sembradoras`",
+                parse_mode='Markdown'
+            )
+            return
+        
+        db = self.AsyncSessionLocal()
+        try:
+            report = await db.run_sync(
+                lambda session: reprice_catalog(session, prices, rules, dry_run=dry_run)
+            )
+            if report["updated"] and not dry_run:
+                await catalog_cache.refresh_async(db)
+            
+            title = "🔎 *Simulación de ajuste*" if dry_run else "✅ *Precios actualizados*"
+            message = f"{title}\n\n📊 Modificados: {report['updated']} · Sin cambios: {report['unchanged']}\n"
+            if report["not_found"]:
+                message += f"❓ No encontrados: {', '.join(report['not_found'])}\n"
+            changed = [row for row in report["results"] if row["status"] == "updated"]
+            for row in changed[:20]:
+                message += f"• `{row['code']}` ${row['old_price']:,.2f} → ${row['new_price']:,.2f}\n"
+            if len(changed) > 20:
+                message += f"  ... y {len(changed) - 20} más\n"
+            await update.message.reply_text(message, parse_mode='Markdown')
+            
+        except RepricingError as e:
+            await update.message.reply_text("❌ No se aplicó ningún cambio:\n" + "\n".join(e.errors[:10]))
+        except Exception as e:
+            logging.error(f"Error updating prices: {e}")
+            await update.message.reply_text("❌ Error al actualizar los precios.")
+        finally:
+            await db.close()
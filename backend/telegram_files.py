@@ -0,0 +1,48 @@
+import os
+import hashlib
+from collections import OrderedDict
+
+
+class TelegramFileCache:
+    """file_id de los documentos ya subidos a Telegram, por hash del contenido.
+
+    Telegram guarda todo documento enviado y lo devuelve con un file_id: volver
+    a mandar el mismo PDF por file_id evita subir los bytes otra vez. Un
+    file_id sirve para el bot que lo subió en cualquier chat. LRU acotado a
+    TELEGRAM_FILE_CACHE_SIZE entradas (0 = desactivado).
+    """
+
+    def __init__(self, max_entries=None):
+        if max_entries is None:
+            max_entries = int(os.getenv("TELEGRAM_FILE_CACHE_SIZE", "1024"))
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(content):
+        return hashlib.sha256(content).hexdigest()
+
+    def get(self, key):
+        file_id = self._entries.get(key)
+        if file_id is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return file_id
+
+    def put(self, key, file_id):
+        if self.max_entries <= 0 or not file_id:
+            return
+        self._entries[key] = file_id
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, key):
+        self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
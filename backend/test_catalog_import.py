@@ -0,0 +1,66 @@
+import io
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from db import Base, Machine
+from catalog_import import import_catalog, iter_records, load_backup, CatalogImportError
+
+CSV = """code,name,price,category,description,active
+SEM001,Sembradora 1,1000,Sembradoras,,true
+SEM002,Sembradora 2,"2000,5",Sembradoras,Doble,1
+"""
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'catalog.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine, expire_on_commit=False)()
+    yield session
+    session.close()
+    engine.dispose()
+
+def csv_records(text):
+    return iter_records(io.StringIO(text), "csv")
+
+def test_csv_import_creates_then_is_idempotent(db):
+    report = import_catalog(db, csv_records(CSV))
+    assert report["created"] == ["SEM001", "SEM002"]
+    assert db.query(Machine).filter_by(code="SEM002").one().price == 2000.5
+
+    again = import_catalog(db, csv_records(CSV))
+    assert again["created"] == [] and again["updated"] == []
+    assert again["unchanged"] == 2
+
+def test_reimport_reports_price_diff_and_dry_run_keeps_db(db):
+    import_catalog(db, csv_records(CSV))
+    changed = CSV.replace("SEM001,Sembradora 1,1000", "SEM001,Sembradora 1,1500")
+
+    preview = import_catalog(db, csv_records(changed), dry_run=True)
+    assert preview["updated"] == [{"code": "SEM001", "changes": {"price": [1000.0, 1500.0]}}]
+    assert db.query(Machine).filter_by(code="SEM001").one().price == 1000.0
+
+    import_catalog(db, csv_records(changed))
+    db.expire_all()
+    assert db.query(Machine).filter_by(code="SEM001").one().price == 1500.0
+
+def test_invalid_row_rolls_back_whole_import(db):
+    bad = CSV + "SEM003,Sembradora 3,abc,Sembradoras,,true\n"
+    with pytest.raises(CatalogImportError) as excinfo:
+        import_catalog(db, csv_records(bad), chunk_size=1)
+    assert "SEM003" in excinfo.value.errors[0]
+    assert db.query(Machine).count() == 0
+
+def test_deactivate_missing(db):
+    import_catalog(db, csv_records(CSV))
+    only_first = "\n".join(CSV.splitlines()[:2])
+    report = import_catalog(db, csv_records(only_first), deactivate_missing=True)
+    assert report["deactivated"] == ["SEM002"]
+    db.expire_all()
+    assert db.query(Machine).filter_by(code="SEM002").one().active is False
+
+def test_backup_matches_original_seed_codes(db):
+    records = load_backup()
+    assert records[0]["code"].endswith("001")
+    assert records[0]["price"] == 11000.0
+    report = import_catalog(db, records)
+    assert len(report["created"]) == len(records) == db.query(Machine).count()
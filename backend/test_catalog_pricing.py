@@ -0,0 +1,60 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from db import Base, Machine
+from catalog_pricing import plan_repricing, reprice_catalog, RepricingError
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pricing.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine, expire_on_commit=False)()
+    session.add_all([
+        Machine(code="ACO001", name="Acoplado", price=1000.0, category="Acoplados", description="", active=True),
+        Machine(code="ACO002", name="Acoplado 2", price=2000.0, category="Acoplados", description="", active=True),
+        Machine(code="SEM001", name="Sembradora", price=3000.0, category="Sembradoras", description="", active=True),
+    ])
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+def prices(db):
+    db.expire_all()
+    return {m.code: m.price for m in db.query(Machine)}
+
+def test_plan_precedence_and_rounding():
+    machines = [("A", "X", 1000.0), ("B", "Y", 1000.0), ("C", "Y", 1000.0)]
+    rules = [{"category": None, "percent": 10}, {"category": "Y", "percent": 5.5}]
+    results, errors = plan_repricing(machines, {"C": 999}, rules, round_to=100)
+    assert errors == []
+    assert [r["new_price"] for r in results] == [1100.0, 1100.0, 1000.0]
+    assert [r["status"] for r in results] == ["updated", "updated", "unchanged"]
+
+def test_reprice_category_rule_and_explicit_prices(db):
+    report = reprice_catalog(db, {"SEM001": 3500, "NOPE": 1}, [{"category": "Acoplados", "percent": 10}])
+    assert report["updated"] == 3
+    assert report["not_found"] == ["NOPE"]
+    assert prices(db) == {"ACO001": 1100.0, "ACO002": 2200.0, "SEM001": 3500.0}
+
+def test_reprice_dry_run_and_negative_price_leave_db_untouched(db):
+    report = reprice_catalog(db, rules=[{"percent": 50}], dry_run=True)
+    assert report["updated"] == 3
+    with pytest.raises(RepricingError):
+        reprice_catalog(db, {"ACO001": 500}, [{"category": "Sembradoras", "percent": -150}])
+    assert prices(db) == {"ACO001": 1000.0, "ACO002": 2000.0, "SEM001": 3000.0}
+
+def test_reprice_locks_rows_it_reads(db):
+    from sqlalchemy.dialects import postgresql
+    statements = []
+    execute = db.execute
+    def spy(statement, *args, **kwargs):
+        statements.append(str(statement.compile(dialect=postgresql.dialect())))
+        return execute(statement, *args, **kwargs)
+    db.execute = spy
+    reprice_catalog(db, rules=[{"percent": 10}], dry_run=True)
+    reprice_catalog(db, rules=[{"percent": 10}])
+    selects = [sql for sql in statements if sql.startswith("SELECT")]
+    # La simulación solo lee; la actualización real bloquea lo que usa para calcular
+    assert "FOR UPDATE" not in selects[0]
+    assert selects[1].endswith("FOR UPDATE")
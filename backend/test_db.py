@@ -0,0 +1,25 @@
+from sqlalchemy import text
+from db import create_configured_engine, engine_options, normalize_database_url
+
+def test_normalize_database_url():
+    assert normalize_database_url("postgres://u:p@host/db") == "postgresql://u:p@host/db"
+    assert normalize_database_url("sqlite:///./x.db") == "sqlite:///./x.db"
+
+def test_sqlite_engine_applies_pragmas(tmp_path, monkeypatch):
+    monkeypatch.setenv("SQLITE_BUSY_TIMEOUT_MS", "1234")
+    engine = create_configured_engine(f"sqlite:///{tmp_path / 'pragmas.db'}")
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert connection.execute(text("PRAGMA busy_timeout")).scalar() == 1234
+    engine.dispose()
+
+def test_postgres_pool_options_from_env(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "20")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "5")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "false")
+    options = engine_options("postgresql://u:p@host/db")
+    assert options["pool_size"] == 20
+    assert options["max_overflow"] == 5
+    assert options["pool_pre_ping"] is False
+    assert options["pool_recycle"] == 1800
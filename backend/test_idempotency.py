@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+from idempotency import QuoteCoalescer, IdempotencyConflict, quote_fingerprint
+
+QUOTE = {"machineCode": "test001", "clientCuit": "20-12345678-9", "clientName": "Juan  Pérez", "clientPhone": "11 1234-5678"}
+
+def test_fingerprint_ignores_formatting_only():
+    same = {"machineCode": "TEST001", "clientCuit": "20123456789", "clientName": "juan pérez", "clientPhone": "1112345678"}
+    assert quote_fingerprint(QUOTE) == quote_fingerprint(same)
+    assert quote_fingerprint(QUOTE) != quote_fingerprint(dict(QUOTE, discountPercent=5))
+    assert quote_fingerprint(QUOTE) != quote_fingerprint(QUOTE, scope="tg:1")
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_requests_run_once():
+    coalescer = QuoteCoalescer(dedup_window=0)
+    calls = []
+
+    async def create():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 7, b"%PDF"
+
+    results = await asyncio.gather(*(coalescer.run("k", "fp", create) for _ in range(5)))
+    assert len(calls) == 1
+    assert [result for result, _ in results] == [(7, b"%PDF")] * 5
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    # Sin ventana, el siguiente pedido vuelve a generar
+    await coalescer.run("k", "fp", create)
+    assert len(calls) == 2
+
+@pytest.mark.asyncio
+async def test_errors_reach_waiters_and_are_not_cached():
+    coalescer = QuoteCoalescer(dedup_window=10)
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("pool saturado")
+
+    results = await asyncio.gather(*(coalescer.run("k", "fp", fail) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+
+    async def create():
+        return 1
+
+    assert await coalescer.run("k", "fp", create) == (1, False)
+    assert await coalescer.run("k", "fp", create) == (1, True)
+    with pytest.raises(IdempotencyConflict):
+        await coalescer.run("k", "other", create)
+
+@pytest.mark.asyncio
+async def test_waiters_retry_when_leader_is_cancelled():
+    coalescer = QuoteCoalescer(dedup_window=0)
+
+    async def slow():
+        await asyncio.sleep(10)
+
+    async def create():
+        return "ok"
+
+    leader = asyncio.create_task(coalescer.run("k", "fp", slow))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(coalescer.run("k", "fp", create))
+    await asyncio.sleep(0)
+    leader.cancel()
+    assert await waiter == ("ok", False)
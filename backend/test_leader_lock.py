@@ -0,0 +1,100 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from leader_lock import FileLeaderLock, PostgresLeaderLock, wait_for_lock
+from bot_runner import run_bot
+
+def test_file_lock_is_exclusive(tmp_path):
+    leader = FileLeaderLock("bot", directory=tmp_path)
+    standby = FileLeaderLock("bot", directory=tmp_path)
+    assert leader.try_acquire()
+    assert not standby.try_acquire()
+    leader.release()
+    assert standby.try_acquire()
+    standby.release()
+
+@pytest.mark.asyncio
+async def test_standby_takes_over_when_leader_releases(tmp_path):
+    leader = FileLeaderLock("bot", directory=tmp_path)
+    standby = FileLeaderLock("bot", directory=tmp_path)
+    assert leader.try_acquire()
+    waiter = asyncio.create_task(wait_for_lock(standby, poll_interval=0.01))
+    await asyncio.sleep(0.05)
+    assert not waiter.done()
+    leader.release()
+    assert await asyncio.wait_for(waiter, 1) is standby
+    standby.release()
+
+@pytest.mark.asyncio
+async def test_only_one_runner_starts_the_bot(tmp_path):
+    def fake_bot():
+        bot = MagicMock(token="123:ABC", mode="polling")
+        bot.start, bot.stop = AsyncMock(), AsyncMock()
+        return bot
+    first, second = fake_bot(), fake_bot()
+    stop = asyncio.Event()
+    runners = [
+        asyncio.create_task(run_bot(bot, FileLeaderLock("bot", directory=tmp_path), stop))
+        for bot in (first, second)
+    ]
+    await asyncio.sleep(0.1)
+    assert first.start.await_count + second.start.await_count == 1
+    stop.set()
+    assert await asyncio.gather(*runners) == [0, 0]
+    assert first.stop.await_count + second.stop.await_count == 1
+
+class FlakyLock:
+    # Se pierde en la primera verificación y se puede volver a tomar
+    def __init__(self):
+        self.checks = 0
+    def try_acquire(self):
+        return True
+    def check(self):
+        self.checks += 1
+        return self.checks > 1
+    def release(self):
+        pass
+
+@pytest.mark.asyncio
+async def test_runner_stops_bot_when_lock_is_lost():
+    bot = MagicMock(token="123:ABC", mode="polling")
+    bot.start, bot.stop = AsyncMock(), AsyncMock()
+    stop = asyncio.Event()
+    runner = asyncio.create_task(run_bot(bot, FlakyLock(), stop, check_interval=0.01))
+    await asyncio.sleep(0.1)
+    # Al perder el lock el bot se detuvo y volvió a arrancar al recuperarlo
+    assert bot.start.await_count == 2
+    assert bot.stop.await_count == 1
+    stop.set()
+    assert await runner == 0
+    assert bot.stop.await_count == 2
+
+def test_postgres_lock_lost_when_connection_fails():
+    lock = PostgresLeaderLock("bot", bind=MagicMock())
+    connection = lock.bind.connect.return_value
+    connection.execute.return_value.scalar.return_value = True
+    assert lock.try_acquire() and lock.check()
+    high, low = (v for v in connection.execute.call_args[0][1].values())
+    assert (high << 32 | low) == lock.key & 0xFFFFFFFFFFFFFFFF
+    connection.execute.side_effect = Exception("server closed the connection unexpectedly")
+    assert not lock.check()
+    assert not lock.held
+    connection.invalidate.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_api_hosted_bot_stops_when_lock_is_lost(monkeypatch):
+    import main
+    bot = MagicMock(token="123:ABC", mode="polling")
+    bot.start, bot.stop = AsyncMock(), AsyncMock()
+    monkeypatch.setattr(main, "telegram_bot", bot)
+    monkeypatch.setattr(main, "bot_lock", FlakyLock())
+    monkeypatch.setenv("LEADER_LOCK_CHECK_INTERVAL", "0.01")
+    stop = asyncio.Event()
+    task = asyncio.create_task(main.run_bot_in_api(stop))
+    await asyncio.sleep(0.1)
+    # El bot de la API también deja de hacer polling al perder el lock y lo retoma después
+    assert bot.start.await_count == 2
+    assert bot.stop.await_count == 1
+    stop.set()
+    await asyncio.wait_for(task, 1)
+    assert bot.stop.await_count == 2
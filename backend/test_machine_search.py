@@ -0,0 +1,27 @@
+from machine_search import SearchIndex, normalize
+
+MACHINES = [
+    {"code": "ACO001", "name": "Acoplado tolva cerealero 4 TT.", "category": "Acoplados", "description": "Tolva de descarga lateral"},
+    {"code": "ACO002", "name": "Acoplado tanque 3000 Lts.", "category": "Acoplados", "description": "Para agua o combustible"},
+    {"code": "SEM001", "name": "Sembradora neumática", "category": "Sembradoras", "description": "Siembra directa"},
+]
+
+def test_normalize_strips_accents_and_punctuation():
+    assert normalize("Sembradora Neumática  4-TT.") == "sembradora neumatica 4 tt"
+
+def test_search_ranks_prefix_accent_and_typo_matches():
+    index = SearchIndex(MACHINES)
+    assert index.search("acoplado tolva")[0]["code"] == "ACO001"
+    assert index.search("neumatica")[0]["code"] == "SEM001"
+    assert index.search("tolba")[0]["code"] == "ACO001"
+    assert index.search("tanq")[0]["code"] == "ACO002"
+    assert index.search("aco002")[0]["code"] == "ACO002"
+    assert index.search("xyz") == []
+
+def test_search_category_filter_limit_and_cached_copies():
+    index = SearchIndex(MACHINES)
+    assert [m["code"] for m in index.search("acoplado", category="acoplados", limit=1)] == ["ACO001"]
+    assert index.search("acoplado", category="Sembradoras") == []
+    first = index.search("acoplado")
+    first[0]["name"] = "modificado"
+    assert index.search("acoplado")[0]["name"] == "Acoplado tolva cerealero 4 TT."
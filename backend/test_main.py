@@ -1,29 +1,52 @@
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, select
 from sqlalchemy.orm import sessionmaker
-from main import app, get_db, Base, Machine, Quotation
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from main import app, get_async_db, Base, Machine, Quotation, pdf_generator, quote_jobs, quote_coalescer
+from pdf_store import pdf_store
+from metrics import instrument_engine
+from render_pool import RenderPool
+from pdf_cache import pdf_cache
+from catalog_cache import catalog_cache
+from quotation_stats import quotation_stats
+from rate_limit import rate_limiter, batch_rate_limiter, RateLimiter, MemoryBucketStore
+from idempotency import QuoteCoalescer
 import tempfile
+from datetime import datetime, timedelta
+import zipfile
+import io
 import os
+import asyncio
 
 # Create test database
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test_enhanced.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_async_engine("sqlite+aiosqlite:///./test_enhanced.db")
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 Base.metadata.create_all(bind=engine)
+# Los engines de prueba se miden igual que los de db.py
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
 
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
 
 client = TestClient(app)
 
+# Los PDFs guardados van a un directorio temporal, no al storage real
+pdf_store.root = tempfile.mkdtemp()
+# Todos los tests cotizan desde la misma IP; el límite se prueba con su propio RateLimiter
+rate_limiter.store = None
+batch_rate_limiter.store = None
+# Los tests repiten cotizaciones idénticas a propósito; la deduplicación se prueba aparte
+quote_coalescer.dedup_window = 0
+
 @pytest.fixture
 def setup_test_data():
     db = TestingSessionLocal()
@@ -42,6 +65,8 @@ def setup_test_data():
     )
     db.add(test_machine)
     db.commit()
+    # Los datos se escribieron directo en la base, sin pasar por la API
+    catalog_cache.invalidate()
     
     yield test_machine
     
@@ -50,6 +75,7 @@ def setup_test_data():
     db.query(Quotation).delete()
     db.commit()
     db.close()
+    catalog_cache.invalidate()
 
 def test_health_check():
     response = client.get("/health")
@@ -64,7 +90,7 @@ def test_get_machines(setup_test_data):
     assert len(data) >= 1
     assert any(machine["code"] == "TEST001" for machine in data)
 
-def test_get_machinery_catalog():
+def test_get_machinery_catalog(setup_test_data):
     response = client.get("/machines/catalog")
     assert response.status_code == 200
     data = response.json()
@@ -72,6 +98,18 @@ def test_get_machinery_catalog():
     assert len(data) > 0
     assert "categoria" in data[0]
     assert "productos" in data[0]
+    # Armado desde la tabla machines: códigos y precios, versionado como /machines
+    assert data[0]["categoria"] == "Test Category"
+    assert data[0]["productos"] == [{"code": "TEST001", "name": "Test Machine Enhanced", "price": 15000.0}]
+    assert response.headers["X-Catalog-Version"] == client.get("/machines").headers["X-Catalog-Version"]
+
+def test_machinery_catalog_follows_price_updates(setup_test_data):
+    first = client.get("/machines/catalog")
+    assert client.get("/machines/catalog", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+    client.put(f"/machines/{setup_test_data.code}", json={"price": 17500.0})
+    second = client.get("/machines/catalog", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert second.json()[0]["productos"][0]["price"] == 17500.0
 
 def test_get_machine_by_code(setup_test_data):
     machine = setup_test_data
@@ -88,6 +126,110 @@ def test_update_machine_price(setup_test_data):
     data = response.json()
     assert data["price"] == 18000.0
 
+def test_catalog_version_changes_on_price_update(setup_test_data):
+    machine = setup_test_data
+    first = client.get("/machines")
+    version = first.headers["X-Catalog-Version"]
+    assert client.get(f"/machines/{machine.code}").headers["X-Catalog-Version"] == version
+    
+    client.put(f"/machines/{machine.code}", json={"price": 21000.0})
+    second = client.get("/machines")
+    assert second.headers["X-Catalog-Version"] != version
+    assert next(m for m in second.json() if m["code"] == machine.code)["price"] == 21000.0
+    assert client.get(f"/machines/{machine.code}").json()["price"] == 21000.0
+
+def test_catalog_snapshot_file_preload(setup_test_data, tmp_path):
+    from catalog_cache import CatalogCache
+    db = TestingSessionLocal()
+    try:
+        saved = CatalogCache(ttl=0, snapshot_path=str(tmp_path / "catalog.json"))
+        saved.save(saved.refresh(db))
+    finally:
+        db.close()
+    # Un proceso nuevo arranca con la misma foto (y versión) sin consultar la base
+    fresh = CatalogCache(ttl=0, snapshot_path=str(tmp_path / "catalog.json"))
+    assert fresh.preload().version == saved.version
+    assert fresh.snapshot(db=None).by_code[setup_test_data.code]["price"] == setup_test_data.price
+    assert CatalogCache(snapshot_path=str(tmp_path / "missing.json")).preload() is None
+    # La foto de otra base (la SQLite del build) no se usa
+    other = CatalogCache(snapshot_path=str(tmp_path / "catalog.json"), database_url="postgresql://u:p@db/agromaq")
+    assert other.preload() is None
+
+def test_catalog_snapshot_file_age_counts_against_ttl(setup_test_data, tmp_path, monkeypatch):
+    import time
+    from catalog_cache import CatalogCache
+    path = str(tmp_path / "catalog.json")
+    db = TestingSessionLocal()
+    try:
+        saved = CatalogCache(snapshot_path=path)
+        saved.save(saved.refresh(db))
+    finally:
+        db.close()
+    fresh = CatalogCache(ttl=60, snapshot_path=path)
+    assert not fresh._expired(fresh.preload())
+    # Un reinicio dos minutos después no sirve los precios del build por otro TTL entero
+    real_time = time.time
+    monkeypatch.setattr(time, "time", lambda: real_time() + 120)
+    old = CatalogCache(ttl=60, snapshot_path=path)
+    assert old._expired(old.preload())
+
+def test_catalog_expiry_keeps_unchanged_snapshot(setup_test_data):
+    from catalog_cache import CatalogCache
+    cache = CatalogCache(ttl=0.01)
+
+    async def reload():
+        async with TestingAsyncSessionLocal() as db:
+            first = await cache.snapshot_async(db)
+            index = await first.search_index_async()
+            await asyncio.sleep(0.02)
+            # Vencida pero sin cambios: misma foto, mismo índice, vencimiento renovado
+            second = await cache.snapshot_async(db)
+            assert second is first and await second.search_index_async() is index
+            assert not cache._expired(second)
+            machine = (await db.execute(select(Machine))).scalars().first()
+            machine.price = 99.0
+            await db.commit()
+            await asyncio.sleep(0.02)
+            assert await cache.snapshot_async(db) is not first
+
+    asyncio.run(reload())
+
+def test_import_main_skips_heavy_modules():
+    import sys
+    import subprocess
+    probe = "import sys, main; print(','.join(m for m in ('reportlab', 'telegram') if m in sys.modules))"
+    output = subprocess.run(
+        [sys.executable, "-c", probe], cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True,
+    ).stdout.strip()
+    assert output == ""
+
+def test_machines_conditional_get_and_compression(setup_test_data):
+    first = client.get("/machines", headers={"Accept-Encoding": "gzip"})
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.headers["X-Catalog-Version"] in etag
+    assert "Accept-Encoding" in first.headers["Vary"]
+    
+    not_modified = client.get("/machines", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    
+    client.put(f"/machines/{setup_test_data.code}", json={"price": 19000.0})
+    changed = client.get("/machines", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+def test_prepared_body_variants_and_catalog_etag():
+    from http_cache import PreparedBody
+    body = PreparedBody([{"code": f"M{i:03d}", "name": "Acoplado tolva"} for i in range(50)])
+    response = client.get("/machines/catalog", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert client.get("/machines/catalog", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+    assert len(body.encoded("gzip")) < len(body.identity)
+    assert body.encoded("gzip") is body.encoded("gzip")
+    assert body.matches(f'W/{body.etag("gzip")}')
+
 def test_generate_quote_with_discount(setup_test_data):
     machine = setup_test_data
     quote_data = {
@@ -118,6 +260,9 @@ def test_generate_quote_without_discount(setup_test_data):
     response = client.post("/generate-quote", json=quote_data)
     assert response.status_code == 200
     assert response.headers["content-type"] == "application/pdf"
+    assert response.content.startswith(b"%PDF-")
+    assert response.headers["content-length"] == str(len(response.content))
+    assert 'filename="cotizacion-Test-Client-No-Discount-TEST001.pdf"' in response.headers["content-disposition"]
 
 def test_machine_not_found():
     response = client.get("/machines/NONEXISTENT")
@@ -135,7 +280,386 @@ def test_quote_machine_not_found():
     response = client.post("/generate-quote", json=quote_data)
     assert response.status_code == 404
 
+def test_generate_quote_render_pool_saturated(setup_test_data, monkeypatch):
+    machine = setup_test_data
+    saturated_pool = RenderPool(max_workers=0, queue_depth=0)
+    saturated_pool._in_flight = saturated_pool.capacity
+    monkeypatch.setattr(pdf_generator, "pool", saturated_pool)
+    quote_data = {
+        "machineCode": machine.code,
+        "clientCuit": "20-12345678-9",
+        "clientName": "Test Client Busy",
+        "clientPhone": "1234567890"
+    }
+    
+    response = client.post("/generate-quote", json=quote_data)
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+    
+    db = TestingSessionLocal()
+    assert db.query(Quotation).filter(Quotation.client_name == "Test Client Busy").count() == 0
+    db.close()
+
+def test_generate_quote_rate_limited_per_client(setup_test_data, monkeypatch):
+    import main
+    monkeypatch.setattr(main, "rate_limiter", RateLimiter(store=MemoryBucketStore(), per_minute=1, burst=2))
+    quote_data = {
+        "machineCode": setup_test_data.code,
+        "clientCuit": "20-12345678-9",
+        "clientName": "Test Client Limited",
+        "clientPhone": "1234567890"
+    }
+    assert [client.post("/generate-quote", json=quote_data).status_code for _ in range(2)] == [200, 200]
+    limited = client.post("/generate-quote", json=quote_data)
+    assert limited.status_code == 429
+    assert int(limited.headers["Retry-After"]) > 0
+    # Otra IP (detrás del proxy) tiene su propio bucket
+    monkeypatch.setenv("RATE_LIMIT_TRUST_FORWARDED", "true")
+    other = client.post("/generate-quote", json=quote_data, headers={"X-Forwarded-For": "1.2.3.4, 10.0.0.1"})
+    assert other.status_code == 200
+    assert "rate_limited_total" in client.get("/metrics").text
+
+def test_generate_quote_batch_pays_per_row(setup_test_data, monkeypatch):
+    import main
+    monkeypatch.setattr(main, "batch_rate_limiter", RateLimiter(store=MemoryBucketStore(), per_minute=1, burst=5, max_concurrent=0))
+    row = {"machineCode": setup_test_data.code, "clientCuit": "20-12345678-9", "clientName": "Lote", "clientPhone": "1"}
+    assert client.post("/generate-quote/batch", json=[row] * 3).status_code == 200
+    # Quedan 2 fichas: un lote de 3 filas no entra aunque sea un solo request
+    limited = client.post("/generate-quote/batch", json=[row] * 3)
+    assert limited.status_code == 429
+    assert int(limited.headers["Retry-After"]) > 0
+    assert client.post("/generate-quote/batch", json=[row] * 2).status_code == 200
+    assert 'rate_limited_total{reason="batch_rows"} 1' in client.get("/metrics").text
+
+def test_generate_quote_duplicates_share_one_quotation(setup_test_data, monkeypatch):
+    import main
+    monkeypatch.setattr(main, "quote_coalescer", QuoteCoalescer(dedup_window=10, key_ttl=60))
+    quote_data = {
+        "machineCode": setup_test_data.code,
+        "clientCuit": "20-12345678-9",
+        "clientName": "Test Client Double Click",
+        "clientPhone": "1234567890",
+    }
+    first = client.post("/generate-quote", json=quote_data)
+    # Mismos datos con otro formato: sigue siendo el mismo pedido
+    second = client.post("/generate-quote", json=dict(quote_data, clientName=" test client  double click", clientCuit="20123456789"))
+    assert second.status_code == 200
+    assert second.headers["x-quotation-id"] == first.headers["x-quotation-id"]
+    assert second.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    assert second.content == first.content
+
+    keyed = client.post("/generate-quote", json=quote_data, headers={"Idempotency-Key": "abc"})
+    assert keyed.headers["x-quotation-id"] != first.headers["x-quotation-id"]
+    again = client.post("/generate-quote", json=quote_data, headers={"Idempotency-Key": "abc"})
+    assert again.headers["x-quotation-id"] == keyed.headers["x-quotation-id"]
+    conflict = client.post("/generate-quote", json=dict(quote_data, clientPhone="999"), headers={"Idempotency-Key": "abc"})
+    assert conflict.status_code == 422
+
+    db = TestingSessionLocal()
+    assert db.query(Quotation).filter(Quotation.client_name == "Test Client Double Click").count() == 2
+    db.close()
+
+def test_generate_quote_repeat_served_from_pdf_cache(setup_test_data, monkeypatch):
+    machine = setup_test_data
+    monkeypatch.setenv("ADMIN_USER", "admin")
+    monkeypatch.setenv("ADMIN_PASS", "secret")
+    quote_data = {
+        "machineCode": machine.code,
+        "clientCuit": "20-12345678-9",
+        "clientName": "Test Client Cached",
+        "clientPhone": "1234567890",
+        "discountPercent": 5
+    }
+    
+    first = client.post("/generate-quote", json=quote_data)
+    hits_before = pdf_cache.stats()["hits"]
+    second = client.post("/generate-quote", json=quote_data)
+    assert second.status_code == 200
+    assert second.content == first.content
+    
+    stats = client.get("/pdf-cache/stats", auth=("admin", "secret")).json()
+    assert stats["hits"] == hits_before + 1
+    assert 0 < stats["hit_ratio"] <= 1
+    
+    # Cada pedido sigue registrando su cotización
+    db = TestingSessionLocal()
+    assert db.query(Quotation).filter(Quotation.client_name == "Test Client Cached").count() == 2
+    db.close()
+
+def test_generate_quote_batch_json(setup_test_data):
+    machine = setup_test_data
+    batch = [
+        {"machineCode": machine.code, "clientCuit": f"20-0000000{i}-9", "clientName": f"Batch Client {i}",
+         "clientPhone": "1234567890", "discountPercent": 10 if i % 2 else 0}
+        for i in range(5)
+    ]
+    
+    response = client.post("/generate-quote/batch", json=batch)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    names = sorted(archive.namelist())
+    assert names[0] == "001-cotizacion-Batch-Client-0-TEST001.pdf"
+    assert len(names) == 5
+    assert all(archive.read(name).startswith(b"%PDF-") for name in names)
+    
+    db = TestingSessionLocal()
+    rows = db.query(Quotation).filter(Quotation.client_name.like("Batch Client %")).all()
+    assert len(rows) == 5
+    assert sorted(r.discount_percent for r in rows) == [0, 0, 0, 10, 10]
+    db.close()
+
+def test_generate_quote_batch_csv(setup_test_data):
+    csv_content = (
+        "machineCode,clientCuit,clientName,clientPhone,discountPercent\n"
+        "TEST001,20-12345678-9,CSV Client Uno,111,\n"
+        "TEST001,20-12345678-9,CSV Client Dos,222,15\n"
+    )
+    response = client.post(
+        "/generate-quote/batch/csv",
+        files={"file": ("cotizaciones.csv", csv_content, "text/csv")}
+    )
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert len(archive.namelist()) == 2
+
+def test_generate_quote_batch_unknown_machine_is_atomic(setup_test_data):
+    batch = [
+        {"machineCode": "TEST001", "clientCuit": "1", "clientName": "Atomic Client", "clientPhone": "1"},
+        {"machineCode": "NONEXISTENT", "clientCuit": "1", "clientName": "Atomic Client", "clientPhone": "1"},
+    ]
+    response = client.post("/generate-quote/batch", json=batch)
+    assert response.status_code == 404
+    assert "NONEXISTENT" in response.json()["detail"]
+    
+    db = TestingSessionLocal()
+    assert db.query(Quotation).filter(Quotation.client_name == "Atomic Client").count() == 0
+    db.close()
+
+def test_quotations_keyset_pagination_and_filters(setup_test_data, monkeypatch):
+    monkeypatch.setenv("ADMIN_USER", "admin")
+    monkeypatch.setenv("ADMIN_PASS", "secret")
+    db = TestingSessionLocal()
+    db.query(Quotation).delete()
+    base = datetime(2024, 1, 1)
+    for i in range(7):
+        db.add(Quotation(
+            machine_code="TEST001" if i % 2 else "OTHER01",
+            client_cuit="20-1" if i < 4 else "20-2",
+            client_name=f"Page Client {i}",
+            client_phone="1",
+            discount_applied=i % 3 == 0,
+            final_price=1000.0,
+            # Dos filas con el mismo created_at para ejercitar el desempate por id
+            created_at=base + timedelta(days=min(i, 5))
+        ))
+    db.commit()
+    db.close()
+    auth = ("admin", "secret")
+    
+    names, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/quotations", params=params, auth=auth).json()
+        names += [q["client_name"] for q in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert names == [f"Page Client {i}" for i in (6, 5, 4, 3, 2, 1, 0)]
+    
+    filtered = client.get("/quotations", params={"machine_code": "TEST001", "client_cuit": "20-1"}, auth=auth).json()
+    assert [q["client_name"] for q in filtered["items"]] == ["Page Client 3", "Page Client 1"]
+    
+    ranged = client.get("/quotations", params={
+        "date_from": "2024-01-02T00:00:00", "date_to": "2024-01-04T00:00:00", "discount": False
+    }, auth=auth).json()
+    assert [q["client_name"] for q in ranged["items"]] == ["Page Client 2", "Page Client 1"]
+    
+    assert client.get("/quotations", params={"cursor": "not-a-cursor"}, auth=auth).status_code == 400
+
+def test_quotation_stats_breakdowns_and_incremental_updates(setup_test_data, monkeypatch):
+    monkeypatch.setenv("ADMIN_USER", "admin")
+    monkeypatch.setenv("ADMIN_PASS", "secret")
+    db = TestingSessionLocal()
+    db.query(Quotation).delete()
+    db.add(Quotation(machine_code="TEST001", client_cuit="1", client_name="Stats A", client_phone="1",
+                     discount_applied=True, discount_percent=10.0, final_price=13500.0,
+                     created_at=datetime(2024, 5, 1, 10)))
+    db.add(Quotation(machine_code="TEST001", client_cuit="1", client_name="Stats B", client_phone="1",
+                     discount_applied=False, discount_percent=0.0, final_price=15000.0,
+                     created_at=datetime(2024, 5, 2, 10)))
+    db.commit()
+    db.close()
+    quotation_stats.invalidate()
+    auth = ("admin", "secret")
+    
+    stats = client.get("/quotations/stats", auth=auth).json()
+    assert stats["total_quotations"] == 2
+    assert stats["quotations_with_discount"] == 1
+    assert stats["discount_percentage"] == 50
+    assert stats["total_revenue"] == 28500.0
+    assert stats["average_discount_percent"] == 5.0
+    assert stats["by_machine"]["TEST001"]["total_quotations"] == 2
+    assert stats["by_category"]["Test Category"]["total_revenue"] == 28500.0
+    assert list(stats["by_day"]) == ["2024-05-01", "2024-05-02"]
+    
+    # La nueva cotización se suma sin recargar desde la base
+    monkeypatch.setattr(quotation_stats, "_load", lambda db: pytest.fail("stats reloaded"))
+    client.post("/generate-quote", json={
+        "machineCode": "TEST001", "clientCuit": "1", "clientName": "Stats C",
+        "clientPhone": "1", "discountPercent": 20
+    })
+    stats = client.get("/quotations/stats", auth=auth).json()
+    assert stats["total_quotations"] == 3
+    assert stats["quotations_with_discount"] == 2
+    assert stats["total_revenue"] == 28500.0 + 12000.0
+    assert stats["by_category"]["Test Category"]["total_quotations"] == 3
+
 # Cleanup test database after all tests
 def teardown_module():
     if os.path.exists("test_enhanced.db"):
         os.unlink("test_enhanced.db")
+
+def test_admin_catalog_import_refreshes_cache(setup_test_data, monkeypatch):
+    monkeypatch.setenv("ADMIN_USER", "admin")
+    monkeypatch.setenv("ADMIN_PASS", "secret")
+    auth = ("admin", "secret")
+    client.get("/machines")
+    csv_body = "code,name,price,category\nTEST001,Test Machine Enhanced,17000,Test Category\nNEW001,Nueva,9000,Nuevas\n"
+    files = {"file": ("precios.csv", csv_body, "text/csv")}
+
+    preview = client.post("/admin/catalog/import", params={"dry_run": True}, files=files, auth=auth).json()
+    assert preview["created"] == ["NEW001"]
+    assert client.get("/machines/NEW001").status_code == 404
+
+    report = client.post("/admin/catalog/import", files=files, auth=auth).json()
+    assert report["updated"][0]["code"] == "TEST001"
+    assert client.get("/machines/TEST001").json()["price"] == 17000.0
+    assert client.get("/machines/NEW001").status_code == 200
+
+    bad = {"file": ("precios.csv", "code,name,price\nX1,Mala,nope\n", "text/csv")}
+    response = client.post("/admin/catalog/import", files=bad, auth=auth)
+    assert response.status_code == 422
+    assert client.post("/admin/catalog/import", files=files).status_code == 401
+
+def test_admin_bulk_price_update(setup_test_data, monkeypatch):
+    monkeypatch.setenv("ADMIN_USER", "admin")
+    monkeypatch.setenv("ADMIN_PASS", "secret")
+    auth = ("admin", "secret")
+    version = client.get("/machines").headers["X-Catalog-Version"]
+
+    body = {"rules": [{"category": "Test Category", "percent": 10}], "dry_run": True}
+    preview = client.post("/admin/machines/prices", json=body, auth=auth).json()
+    assert preview["results"][0]["new_price"] == 16500.0
+    assert client.get("/machines/TEST001").json()["price"] == 15000.0
+
+    report = client.post("/admin/machines/prices", json={"prices": {"TEST001": 18000, "MISSING": 1}}, auth=auth).json()
+    assert report["updated"] == 1 and report["not_found"] == ["MISSING"]
+    assert client.get("/machines/TEST001").json()["price"] == 18000.0
+    assert client.get("/machines").headers["X-Catalog-Version"] != version
+
+    negative = {"rules": [{"percent": -200}]}
+    assert client.post("/admin/machines/prices", json=negative, auth=auth).status_code == 422
+    assert client.post("/admin/machines/prices", json={}, auth=auth).status_code == 400
+
+def test_search_machines(setup_test_data):
+    response = client.get("/machines/search", params={"q": "máquina enhanced"})
+    assert response.status_code == 200
+    assert response.json()[0]["code"] == "TEST001"
+    assert "X-Catalog-Version" in response.headers
+    assert client.get("/machines/search", params={"q": "zzzz"}).json() == []
+    assert client.get("/machines/search").status_code == 422
+
+def test_generate_quote_async_job(setup_test_data, monkeypatch):
+    monkeypatch.setattr(quote_jobs, "session_factory", TestingAsyncSessionLocal)
+    quote_data = {
+        "machineCode": "TEST001",
+        "clientCuit": "20-12345678-9",
+        "clientName": "Cliente Async",
+        "clientPhone": "+541112345678",
+        "discountPercent": 10.0,
+    }
+    response = client.post("/generate-quote?async=1", json=quote_data)
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    assert response.headers["location"] == f"/quotes/{job_id}"
+
+    pending = client.get(f"/quotes/{job_id}")
+    assert pending.status_code == 202
+    assert pending.json()["status"] == "pending"
+    assert client.get("/quotes/no-such-job").status_code == 404
+
+    assert asyncio.run(quote_jobs.run_once()) is True
+    done = client.get(f"/quotes/{job_id}")
+    assert done.status_code == 200
+    assert done.content.startswith(b"%PDF")
+    assert "cotizacion-Cliente-Async-TEST001.pdf" in done.headers["content-disposition"]
+
+    db = TestingSessionLocal()
+    quotation = db.query(Quotation).one()
+    db.close()
+    assert quotation.final_price == 13500.0
+    assert client.post("/generate-quote?async=1", json=dict(quote_data, machineCode="NOPE")).status_code == 404
+
+def test_quotation_pdf_persisted_and_redownloaded(setup_test_data, monkeypatch):
+    monkeypatch.setenv("ADMIN_USER", "admin")
+    monkeypatch.setenv("ADMIN_PASS", "secret")
+    monkeypatch.setenv("PDF_LINK_SECRET", "link-secret")
+    quote_data = {
+        "machineCode": "TEST001",
+        "clientCuit": "20-12345678-9",
+        "clientName": "Cliente PDF",
+        "clientPhone": "+541112345678",
+    }
+    created = client.post("/generate-quote", json=quote_data)
+    quotation_id = created.headers["x-quotation-id"]
+    link = created.headers["x-quotation-pdf-url"]
+
+    # Re-descarga sin volver a renderizar ni insertar otra fila
+    monkeypatch.setattr(pdf_generator, "generate_quotation_pdf", lambda *a, **k: pytest.fail("re-rendered"))
+    full = client.get(link)
+    assert full.status_code == 200
+    assert full.content == created.content
+    assert full.headers["accept-ranges"] == "bytes"
+    assert "immutable" in full.headers["cache-control"]
+    assert client.get(f"/quotations/{quotation_id}/pdf", auth=("admin", "secret")).content == created.content
+
+    etag = full.headers["etag"]
+    assert client.get(link, headers={"If-None-Match": etag}).status_code == 304
+    part = client.get(link, headers={"Range": "bytes=0-9"})
+    assert part.status_code == 206
+    assert part.content == created.content[:10]
+    assert part.headers["content-range"] == f"bytes 0-9/{len(created.content)}"
+    tail = client.get(link, headers={"Range": "bytes=-5", "If-Range": etag})
+    assert tail.content == created.content[-5:]
+    assert client.get(link, headers={"Range": "bytes=0-9", "If-Range": '"old"'}).status_code == 200
+    assert client.get(link, headers={"Range": f"bytes={len(created.content)}-"}).status_code == 416
+
+    assert client.get(f"/quotations/{quotation_id}/pdf").status_code == 401
+    assert client.get(f"/quotations/{quotation_id}/pdf?token=bad").status_code == 401
+    assert client.get("/quotations/999999/pdf", auth=("admin", "secret")).status_code == 404
+    db = TestingSessionLocal()
+    assert db.query(Quotation).count() == 1
+    db.close()
+
+def test_metrics_endpoint_reports_hot_paths(setup_test_data):
+    client.get("/machines")
+    client.get("/machines/TEST001")
+    client.post("/generate-quote", json={
+        "machineCode": "TEST001",
+        "clientCuit": "20-12345678-9",
+        "clientName": "Cliente Metricas",
+        "clientPhone": "+541112345678",
+    })
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/machines/{machine_code}",status="200"}' in text
+    assert 'pdf_build_seconds_count{phase="story"}' in text
+    assert 'pdf_build_seconds_count{phase="build"}' in text
+    assert 'db_query_seconds_count{statement="select"}' in text
+    assert '# TYPE db_session_seconds histogram' in text
+    assert 'cache_requests_total{cache="catalog",result="hit"}' in text
+    assert "render_pool_capacity" in text
@@ -0,0 +1,32 @@
+from metrics import Registry, Histogram
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.histogram("work_seconds", "Work time", ("kind",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "a")
+    histogram.observe(0.5, "a")
+    histogram.observe(5, "a")
+    registry.callback("queue_depth", "Queue depth", lambda: 3)
+    text = registry.render()
+    assert '# TYPE work_seconds histogram' in text
+    assert 'work_seconds_bucket{kind="a",le="0.1"} 1' in text
+    assert 'work_seconds_bucket{kind="a",le="1.0"} 2' in text
+    assert 'work_seconds_bucket{kind="a",le="+Inf"} 3' in text
+    assert 'work_seconds_count{kind="a"} 3' in text
+    assert 'work_seconds_sum{kind="a"} 5.55' in text
+    assert 'queue_depth 3' in text
+
+def test_broken_callback_does_not_break_scrape():
+    registry = Registry()
+    registry.callback("broken", "Broken", lambda: 1 / 0)
+    registry.callback("ok", "Ok", lambda: {("x",): 1}, ("label",))
+    assert registry.render() == '# HELP ok Ok\n# TYPE ok gauge\nok{label="x"} 1\n'
+
+def test_time_context_manager_counts_even_on_error():
+    histogram = Histogram("h", "h")
+    try:
+        with histogram.time():
+            raise RuntimeError()
+    except RuntimeError:
+        pass
+    assert histogram.count() == 1
@@ -0,0 +1,42 @@
+from datetime import date
+from pdf_cache import PDFCache
+
+FIELDS = {"clientName": "Juan", "clientCuit": "20-1", "clientAddress": "", "clientPhone": "123"}
+
+def make_key(**overrides):
+    args = dict(machine_code="ACO001", fields=FIELDS, price_line="....$15.000.=",
+                discount_percent=0, day=date(2024, 3, 5), template_version="v1")
+    args.update(overrides)
+    return PDFCache.make_key(**args)
+
+def test_key_depends_on_pdf_inputs():
+    assert make_key() == make_key(machine_code=" aco001 ")
+    assert make_key() != make_key(day=date(2024, 3, 6))
+    assert make_key() != make_key(template_version="v2")
+    assert make_key() != make_key(fields={**FIELDS, "clientName": "Pedro"})
+
+def test_lru_eviction_by_size():
+    cache = PDFCache(max_bytes=10, spill_dir="")
+    cache.put("a", b"12345")
+    cache.put("b", b"12345")
+    assert cache.get("a") == b"12345"  # "a" pasa a ser la más reciente
+    cache.put("c", b"12345")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"12345"
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["size_bytes"] == 10
+    assert stats["hits"] == 2 and stats["misses"] == 1
+
+def test_evicted_entries_spill_to_disk(tmp_path):
+    cache = PDFCache(max_bytes=5, spill_dir=str(tmp_path), disk_max_bytes=1024)
+    cache.put("a", b"12345")
+    cache.put("b", b"67890")
+    assert (tmp_path / "a.pdf").read_bytes() == b"12345"
+    assert cache.get("a") == b"12345"
+    assert cache.stats()["disk_hits"] == 1
+
+def test_disabled_cache_stores_nothing():
+    cache = PDFCache(max_bytes=0, spill_dir="")
+    cache.put("a", b"12345")
+    assert cache.get("a") is None
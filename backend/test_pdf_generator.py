@@ -0,0 +1,47 @@
+from datetime import datetime
+from reportlab.platypus import Paragraph
+from pdf_generator import PDFGenerator, format_price_line
+from pdf_template import QuotationTemplate, get_template
+
+FIELDS = {
+    "clientName": "Juan Pérez",
+    "clientCuit": "20-12345678-9",
+    "clientAddress": "",
+    "clientPhone": "1234567890",
+}
+
+def test_template_is_shared_and_versioned():
+    template = get_template()
+    assert get_template() is template
+    assert template.version == QuotationTemplate().version
+
+def test_cache_key_does_not_load_reportlab():
+    import sys
+    import subprocess
+    # El proceso de la API calcula la versión del template sin importar ReportLab
+    probe = (
+        "import sys, asyncio, pdf_generator, pdf_content\n"
+        "from unittest.mock import AsyncMock, MagicMock\n"
+        "pool = MagicMock(submit=AsyncMock(return_value=(b'%PDF', 0.0, 0.0)))\n"
+        "generator = pdf_generator.PDFGenerator(pool=pool)\n"
+        "quote = MagicMock(machineCode='TEST001', clientName='Juan', clientCuit='1', clientAddress='', clientPhone='1', discountPercent=0)\n"
+        "asyncio.run(generator.generate_quotation_pdf(MagicMock(), quote, 1000.0))\n"
+        "print('reportlab' in sys.modules, pdf_content.template_version())"
+    )
+    output = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True).stdout.split()
+    assert output == ["False", get_template().version]
+
+def test_bind_only_builds_per_quote_paragraphs():
+    template = get_template()
+    story = template.bind(FIELDS, 15000.0, today=datetime(2024, 3, 5))
+    texts = [f.text for f in story if isinstance(f, Paragraph)]
+    assert "Las Parejas; 5 de marzo del 2024" in texts
+    assert "<b>Juan Pérez</b>" in texts
+    assert format_price_line(15000.0) in texts
+    # Los flowables estáticos se copian, no se comparten entre builds
+    assert all(f not in template.body for f in story)
+
+def test_build_quotation_pdf_reuses_template():
+    generator = PDFGenerator()
+    for _ in range(2):
+        assert generator.build_quotation_pdf(FIELDS, 15000.0).startswith(b"%PDF-")
@@ -0,0 +1,26 @@
+import pytest
+from pdf_store import LocalPDFStore, quotation_key, download_token
+from http_cache import parse_byte_range
+
+def test_put_head_range_and_delete(tmp_path):
+    store = LocalPDFStore(str(tmp_path))
+    obj = store.put(quotation_key(7), b"%PDF-0123456789")
+    assert obj.size == 15 and store.get("quotations/7.pdf") == b"%PDF-0123456789"
+    assert b"".join(store.iter_range(obj, 5, 8, chunk_size=2)) == b"0123"
+    store.delete(quotation_key(7))
+    assert store.head(quotation_key(7)) is None
+    with pytest.raises(ValueError):
+        store.put("../outside.pdf", b"x")
+
+def test_parse_byte_range():
+    assert parse_byte_range("bytes=0-9", 100) == (0, 9)
+    assert parse_byte_range("bytes=90-", 100) == (90, 99)
+    assert parse_byte_range("bytes=-10", 100) == (90, 99)
+    assert parse_byte_range("bytes=50-500", 100) == (50, 99)
+    assert parse_byte_range("bytes=100-", 100) is False
+    assert parse_byte_range("bytes=0-1,5-6", 100) is None
+    assert parse_byte_range(None, 100) is None
+
+def test_download_token_requires_secret():
+    assert download_token(1, secret="") is None
+    assert download_token(1, secret="s") == download_token(1, secret="s") != download_token(2, secret="s")
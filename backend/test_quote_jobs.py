@@ -0,0 +1,107 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+import pytest_asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from db import Base, Quotation, QuoteJob
+from quote_jobs import QuoteJobQueue, JobFailed, JOB_DONE, JOB_FAILED, JOB_PENDING, JOB_RUNNING
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'jobs.db'}")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+def make_queue(session_factory, handler, **kwargs):
+    kwargs.setdefault("store", MagicMock(delete_quotation_pdf=AsyncMock()))
+    return QuoteJobQueue(handler, session_factory=session_factory, workers=0, **kwargs)
+
+async def ok_handler(db, payload):
+    quotation = Quotation(machine_code=payload["code"], final_price=100.0)
+    db.add(quotation)
+    return quotation, "Cat", "cotizacion.pdf"
+
+async def job(session_factory, job_id):
+    async with session_factory() as db:
+        return await db.get(QuoteJob, job_id)
+
+@pytest.mark.asyncio
+async def test_job_survives_crash_via_expired_lease(session_factory):
+    queue = make_queue(session_factory, ok_handler)
+    async with session_factory() as db:
+        job_id = (await queue.enqueue(db, {"code": "A1"})).id
+        # Un worker lo toma y "muere" sin terminarlo
+        assert await queue.claim(db) == job_id
+        assert await queue.claim(db) is None
+        await db.execute(update(QuoteJob).values(lease_expires_at=datetime.utcnow() - timedelta(seconds=1)))
+        await db.commit()
+
+    # Otro proceso (nueva cola, mismo almacenamiento) lo retoma
+    assert await make_queue(session_factory, ok_handler).run_once() is True
+    finished = await job(session_factory, job_id)
+    assert finished.status == JOB_DONE and finished.attempts == 2
+    assert finished.quotation_id is not None
+
+@pytest.mark.asyncio
+async def test_lost_lease_discards_result_and_stored_pdf(session_factory):
+    async def slow_handler(db, payload):
+        quotation, category, filename = await ok_handler(db, payload)
+        # Mientras tanto el lease vence y otro worker retoma el trabajo
+        async with session_factory() as other:
+            await other.execute(update(QuoteJob).values(attempts=QuoteJob.attempts + 1))
+            await other.commit()
+        return quotation, category, filename
+
+    queue = make_queue(session_factory, slow_handler)
+    async with session_factory() as db:
+        job_id = (await queue.enqueue(db, {"code": "A1"})).id
+    assert await queue.run_once() is True
+
+    queue.store.delete_quotation_pdf.assert_awaited_once()
+    async with session_factory() as db:
+        assert await db.get(Quotation, queue.store.delete_quotation_pdf.call_args[0][0]) is None
+    retaken = await job(session_factory, job_id)
+    assert retaken.status == JOB_RUNNING and retaken.quotation_id is None
+
+@pytest.mark.asyncio
+async def test_job_retries_then_fails(session_factory):
+    calls = []
+    async def flaky(db, payload):
+        calls.append(payload)
+        raise RuntimeError("render crashed")
+    queue = make_queue(session_factory, flaky, max_attempts=2)
+    async with session_factory() as db:
+        job_id = (await queue.enqueue(db, {"code": "A1"})).id
+    await queue.run_once()
+    assert (await job(session_factory, job_id)).status == JOB_PENDING
+    await queue.run_once()
+    failed = await job(session_factory, job_id)
+    assert failed.status == JOB_FAILED and failed.error == "render crashed"
+    assert len(calls) == 2 and await queue.run_once() is False
+
+@pytest.mark.asyncio
+async def test_permanent_failure_and_background_workers(session_factory):
+    async def handler(db, payload):
+        if payload["code"] == "NOPE":
+            raise JobFailed("Machine not found")
+        return await ok_handler(db, payload)
+    queue = QuoteJobQueue(handler, session_factory=session_factory, workers=2, poll_interval=5)
+    queue.start()
+    try:
+        async with session_factory() as db:
+            bad = (await queue.enqueue(db, {"code": "NOPE"})).id
+            good = (await queue.enqueue(db, {"code": "A1"})).id
+        for _ in range(100):
+            statuses = {(await job(session_factory, j)).status for j in (bad, good)}
+            if statuses == {JOB_FAILED, JOB_DONE}:
+                break
+            await asyncio.sleep(0.02)
+        assert (await job(session_factory, bad)).status == JOB_FAILED
+        assert (await job(session_factory, bad)).attempts == 1
+        assert (await job(session_factory, good)).status == JOB_DONE
+    finally:
+        await queue.stop()
@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+from rate_limit import RateLimiter, RateLimited, MemoryBucketStore, SQLiteBucketStore, refill
+
+def test_token_bucket_refills_at_rate():
+    store = MemoryBucketStore()
+    # 1 token por segundo, ráfaga de 2
+    assert store.take("ip:a", 1.0, 2, now=0)[0]
+    assert store.take("ip:a", 1.0, 2, now=0)[0]
+    allowed, retry_after = store.take("ip:a", 1.0, 2, now=0.25)
+    assert not allowed and retry_after == pytest.approx(0.75)
+    assert store.take("ip:a", 1.0, 2, now=1.0)[0]
+    # Cada cliente tiene su propio bucket
+    assert store.take("ip:b", 1.0, 2, now=1.0)[0]
+    assert refill(0, 0, 100, 1.0, 2) == 2
+
+def test_memory_store_evicts_idle_clients():
+    store = MemoryBucketStore(max_keys=2)
+    for key in ("a", "b", "c"):
+        store.take(key, 1.0, 1, now=0)
+    assert list(store._buckets) == ["b", "c"]
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    # Dos instancias sobre el mismo archivo, como dos workers
+    path = str(tmp_path / "buckets.db")
+    first, second = SQLiteBucketStore(path), SQLiteBucketStore(path)
+    assert first.take("tg:1", 1.0, 2, now=10)[0]
+    assert second.take("tg:1", 1.0, 2, now=10)[0]
+    allowed, retry_after = first.take("tg:1", 1.0, 2, now=10.5)
+    assert not allowed and retry_after == pytest.approx(0.5)
+    assert second.take("tg:1", 1.0, 2, now=11)[0]
+
+@pytest.mark.asyncio
+async def test_admit_caps_concurrency_per_client():
+    limiter = RateLimiter(store=MemoryBucketStore(), per_minute=600, burst=10, max_concurrent=1)
+    async with limiter.admit("ip:a"):
+        with pytest.raises(RateLimited) as busy:
+            async with limiter.admit("ip:a"):
+                pass
+        assert busy.value.reason == "concurrency"
+        # Otro cliente no espera al primero
+        async with limiter.admit("ip:b"):
+            assert limiter.in_flight == 2
+    assert limiter.in_flight == 0
+    assert limiter.rejected == {"rate": 0, "concurrency": 1}
+
+@pytest.mark.asyncio
+async def test_admit_releases_slot_when_rate_limited(tmp_path):
+    limiter = RateLimiter(store=SQLiteBucketStore(str(tmp_path / "b.db")), per_minute=1, burst=1, max_concurrent=1)
+    async with limiter.admit("tg:7"):
+        pass
+    with pytest.raises(RateLimited) as limited:
+        async with limiter.admit("tg:7"):
+            pass
+    assert limited.value.reason == "rate"
+    assert limited.value.retry_after_header == "60"
+    assert limiter.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_disabled_limiter_admits_everything():
+    limiter = RateLimiter(store=None)
+    await asyncio.gather(*(limiter.check("ip:a") for _ in range(100)))
+    async with limiter.admit("ip:a"):
+        async with limiter.admit("ip:a"):
+            pass
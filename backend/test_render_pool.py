@@ -0,0 +1,105 @@
+import os
+import time
+import asyncio
+import threading
+import pytest
+from render_pool import RenderPool, RenderPoolSaturated
+
+@pytest.mark.asyncio
+async def test_cancelled_request_keeps_slot_until_render_finishes():
+    pool = RenderPool(max_workers=0, queue_depth=0)
+    started, release = threading.Event(), threading.Event()
+
+    def render():
+        started.set()
+        release.wait(5)
+        return b"%PDF"
+
+    request = asyncio.create_task(pool.submit(render))
+    await asyncio.to_thread(started.wait, 5)
+    # El cliente se fue, pero el render sigue ocupando el worker
+    request.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await request
+    assert pool.in_flight == 1
+    with pytest.raises(RenderPoolSaturated):
+        await pool.submit(render)
+
+    release.set()
+    for _ in range(100):
+        if pool.in_flight == 0:
+            break
+        await asyncio.sleep(0.01)
+    assert pool.in_flight == 0
+    assert await pool.submit(lambda: b"ok") == b"ok"
+    pool.shutdown()
+
+@pytest.mark.asyncio
+async def test_cancelled_queued_job_frees_its_slot():
+    pool = RenderPool(max_workers=0, queue_depth=1)
+    release = threading.Event()
+    running = asyncio.create_task(pool.submit(release.wait, 5))
+    await asyncio.sleep(0.05)
+    queued = asyncio.create_task(pool.submit(time.sleep, 0))
+    await asyncio.sleep(0.05)
+    assert pool.in_flight == 2
+    # El trabajo en cola no llegó a empezar: se descarta y libera su lugar
+    queued.cancel()
+    await asyncio.sleep(0.01)
+    assert pool.in_flight == 1
+    release.set()
+    assert await running is True
+    pool.shutdown()
+
+@pytest.mark.asyncio
+async def test_pool_recovers_after_worker_dies():
+    from concurrent.futures.process import BrokenProcessPool
+    pool = RenderPool(max_workers=1, queue_depth=1)
+    try:
+        assert await pool.submit(abs, -1) == 1
+        # Un worker que muere (OOM, segfault) rompe el ProcessPoolExecutor
+        with pytest.raises(BrokenProcessPool):
+            await pool.submit(os._exit, 1)
+        assert await pool.submit(abs, -2) == 2
+        # También si el worker muere sin render en curso
+        for process in list(pool._executor._processes.values()):
+            process.kill()
+            process.join()
+        await asyncio.sleep(0.2)
+        assert await pool.submit(abs, -3) == 3
+        assert pool.in_flight == 0
+    finally:
+        pool.shutdown()
+
+@pytest.mark.asyncio
+async def test_blocking_submits_wait_for_capacity():
+    pool = RenderPool(max_workers=0, queue_depth=0)
+    peak = []
+
+    def render(i):
+        peak.append(pool.in_flight)
+        time.sleep(0.005)
+        return i
+
+    # Los lotes y la cola de trabajos esperan lugar en vez de pasar por encima de la capacidad
+    results = await asyncio.gather(*(pool.submit(render, i, block=True) for i in range(10)))
+    assert results == list(range(10))
+    assert max(peak) == 1
+    assert pool.in_flight == 0
+
+    release = threading.Event()
+    running = asyncio.create_task(pool.submit(release.wait, 5, block=True))
+    await asyncio.sleep(0.05)
+    abandoned = asyncio.create_task(pool.submit(render, 1, block=True))
+    waiting = asyncio.create_task(pool.submit(render, 2, block=True))
+    await asyncio.sleep(0.05)
+    assert pool.in_flight == 1 and len(pool._waiters) == 2
+    with pytest.raises(RenderPoolSaturated):
+        await pool.submit(render, 3)
+    # Un pedido que se cancela mientras espera no se lleva el lugar
+    abandoned.cancel()
+    release.set()
+    assert await running is True
+    assert await asyncio.wait_for(waiting, 1) == 2
+    assert pool.in_flight == 0 and not pool._waiters
+    pool.shutdown()
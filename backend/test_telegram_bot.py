@@ -7,6 +7,19 @@ from telegram import Update, Message, User, Chat
 def bot():
     return TelegramBot()
 
+def mock_async_session(bot, machine=None):
+    # AsyncSessionLocal() usado como sesión directa: execute/commit/close se esperan
+    result = MagicMock()
+    result.scalars.return_value.first.return_value = machine
+    result.scalars.return_value.all.return_value = [machine] if machine else []
+    mock_db = MagicMock()
+    mock_db.execute = AsyncMock(return_value=result)
+    mock_db.commit = AsyncMock()
+    mock_db.flush = AsyncMock()
+    mock_db.close = AsyncMock()
+    bot.AsyncSessionLocal = MagicMock(return_value=mock_db)
+    return mock_db
+
 @pytest.fixture
 def mock_update():
     update = MagicMock(spec=Update)
@@ -37,19 +50,169 @@ async def test_help_command(bot, mock_update):
 async def test_list_machines_command(bot, mock_update):
     context = MagicMock()
     
-    # Mock database session
-    bot.SessionLocal = MagicMock()
-    mock_db = MagicMock()
-    bot.SessionLocal.return_value.__enter__.return_value = mock_db
-    bot.SessionLocal.return_value.__exit__.return_value = None
-    
     # Mock machine data
     mock_machine = MagicMock()
     mock_machine.code = "TEST001"
     mock_machine.name = "Test Machine"
     mock_machine.price = 10000.0
     mock_machine.description = "Test description"
-    mock_db.query.return_value.all.return_value = [mock_machine]
+    
+    # Mock database session
+    mock_async_session(bot, mock_machine)
     
     await bot.list_machines(mock_update, context)
     mock_update.message.reply_text.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_generate_quote_sends_pdf_from_memory(bot, mock_update, monkeypatch):
+    import telegram_bot
+    store = MagicMock(save_quotation_pdf=AsyncMock())
+    monkeypatch.setattr(telegram_bot, "pdf_store", store)
+    context = MagicMock()
+    context.args = ["TEST001", "20-12345678-9", "Juan", "1234567890"]
+    mock_update.message.reply_document = AsyncMock()
+    
+    mock_machine = MagicMock()
+    mock_machine.name = "Test Machine"
+    mock_machine.price = 10000.0
+    mock_db = mock_async_session(bot, mock_machine)
+    bot.pdf_generator.generate_quotation_pdf = AsyncMock(return_value=b"%PDF-1.4 test")
+    
+    await bot.generate_quote(mock_update, context)
+    mock_update.message.reply_document.assert_called_once()
+    kwargs = mock_update.message.reply_document.call_args.kwargs
+    assert kwargs["document"] == b"%PDF-1.4 test"
+    assert kwargs["filename"] == "cotizacion-Juan-TEST001.pdf"
+    mock_db.commit.assert_called_once()
+    assert store.save_quotation_pdf.call_args[0][1] == b"%PDF-1.4 test"
+
+@pytest.mark.asyncio
+async def test_generate_quote_deletes_stored_pdf_when_commit_fails(bot, mock_update, monkeypatch):
+    import telegram_bot
+    store = MagicMock(save_quotation_pdf=AsyncMock(), delete_quotation_pdf=AsyncMock())
+    monkeypatch.setattr(telegram_bot, "pdf_store", store)
+    context = MagicMock()
+    context.args = ["TEST001", "20-12345678-9", "Juan Commit", "1234567890"]
+    mock_update.message.reply_document = AsyncMock()
+    mock_machine = MagicMock()
+    mock_machine.name = "Test Machine"
+    mock_machine.price = 10000.0
+    mock_db = mock_async_session(bot, mock_machine)
+    mock_db.commit = AsyncMock(side_effect=RuntimeError("database is locked"))
+    bot.pdf_generator.generate_quotation_pdf = AsyncMock(return_value=b"%PDF-1.4 test")
+
+    await bot.generate_quote(mock_update, context)
+    store.delete_quotation_pdf.assert_awaited_once()
+    mock_update.message.reply_document.assert_not_called()
+    assert "Error al generar" in mock_update.message.reply_text.call_args[0][0]
+
+@pytest.mark.asyncio
+async def test_generate_quote_rate_limited_per_user(bot, mock_update):
+    from rate_limit import RateLimiter, MemoryBucketStore
+    bot.rate_limiter = RateLimiter(store=MemoryBucketStore(), per_minute=1, burst=1)
+    context = MagicMock()
+    context.args = ["TEST001", "20-12345678-9", "Juan", "1234567890"]
+    mock_update.message.reply_document = AsyncMock()
+    mock_async_session(bot, None)
+    
+    await bot.generate_quote(mock_update, context)
+    await bot.generate_quote(mock_update, context)
+    # El segundo /cotizar no llega a la base ni al render
+    assert bot.AsyncSessionLocal.call_count == 1
+    assert "Demasiadas cotizaciones" in mock_update.message.reply_text.call_args[0][0]
+
+@pytest.mark.asyncio
+async def test_repeated_quote_shares_one_quotation(bot, mock_update, monkeypatch):
+    import asyncio
+    import telegram_bot
+    from idempotency import QuoteCoalescer
+    monkeypatch.setattr(telegram_bot, "pdf_store", MagicMock(save_quotation_pdf=AsyncMock()))
+    bot.quote_coalescer = QuoteCoalescer(dedup_window=10)
+    context = MagicMock()
+    context.args = ["TEST001", "20-12345678-9", "Juan", "1234567890"]
+    mock_update.message.reply_document = AsyncMock()
+    mock_machine = MagicMock()
+    mock_machine.name = "Test Machine"
+    mock_machine.price = 10000.0
+    mock_db = mock_async_session(bot, mock_machine)
+
+    async def render(*args):
+        await asyncio.sleep(0.01)
+        return b"%PDF-1.4 test"
+
+    bot.pdf_generator.generate_quotation_pdf = AsyncMock(side_effect=render)
+    # Doble toque: los dos /cotizar llegan juntos, y un tercero apenas después
+    await asyncio.gather(bot.generate_quote(mock_update, context), bot.generate_quote(mock_update, context))
+    await bot.generate_quote(mock_update, context)
+    bot.pdf_generator.generate_quotation_pdf.assert_awaited_once()
+    mock_db.commit.assert_awaited_once()
+    assert mock_update.message.reply_document.await_count == 3
+
+@pytest.mark.asyncio
+async def test_list_machines_uses_catalog_cache(bot, mock_update, monkeypatch):
+    from catalog_cache import CatalogCache, CatalogSnapshot
+    import telegram_bot
+    machine = MagicMock(id=1, code="ACO001", price=10000.0, category="Acoplados", description="", active=True)
+    machine.name = "Acoplado rural playo"
+    cache = CatalogCache(ttl=0)
+    cache._snapshot = CatalogSnapshot([machine])
+    monkeypatch.setattr(telegram_bot, "catalog_cache", cache)
+    mock_db = mock_async_session(bot)
+    
+    await bot.list_machines(mock_update, MagicMock())
+    mock_db.execute.assert_not_called()
+    message = mock_update.message.reply_text.call_args[0][0]
+    assert "`ACO001` - Acoplado rural playo" in message
+
+@pytest.mark.asyncio
+async def test_bulk_set_prices_applies_category_rule(bot, mock_update, monkeypatch, tmp_path):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from db import Base, Machine
+    import telegram_bot
+    engine = create_engine(f"sqlite:///{tmp_path / 'bot.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(Machine(code="SEM001", name="Sembradora", price=1000.0, category="Sembradoras", description="", active=True))
+    session.commit()
+
+    bot.admin_ids = [mock_update.effective_user.id]
+    mock_db = mock_async_session(bot)
+    mock_db.run_sync = AsyncMock(side_effect=lambda fn: fn(session))
+    refresh = AsyncMock()
+    monkeypatch.setattr(telegram_bot.catalog_cache, "refresh_async", refresh)
+    context = MagicMock()
+    context.args = ["10%", "Sembradoras"]
+
+    await bot.bulk_set_prices(mock_update, context)
+    message = mock_update.message.reply_text.call_args[0][0]
+    assert "Modificados: 1" in message
+    assert session.query(Machine).one().price == 1100.0
+    refresh.assert_called_once()
+    session.close()
+    engine.dispose()
+
+@pytest.mark.asyncio
+async def test_search_command_uses_index(bot, mock_update, monkeypatch):
+    from catalog_cache import CatalogCache, CatalogSnapshot
+    import telegram_bot
+    machine = MagicMock(id=1, code="ACO001", price=10000.0, category="Acoplados", description="", active=True)
+    machine.name = "Acoplado tolva cerealero"
+    cache = CatalogCache(ttl=0)
+    cache._snapshot = CatalogSnapshot([machine])
+    monkeypatch.setattr(telegram_bot, "catalog_cache", cache)
+    mock_async_session(bot)
+    context = MagicMock()
+    context.args = ["tolva"]
+    
+    await bot.search_machines(mock_update, context)
+    message = mock_update.message.reply_text.call_args[0][0]
+    assert "`ACO001` - Acoplado tolva cerealero" in message
+
+@pytest.mark.asyncio
+async def test_handlers_are_timed(bot, mock_update):
+    from metrics import TELEGRAM_HANDLER_SECONDS
+    from telegram_bot import timed_handler
+    before = TELEGRAM_HANDLER_SECONDS.count("ayuda")
+    await timed_handler("ayuda", bot.help_command)(mock_update, MagicMock())
+    assert TELEGRAM_HANDLER_SECONDS.count("ayuda") == before + 1
@@ -0,0 +1,135 @@
+import time
+import asyncio
+import pytest
+import httpx
+import main
+from fake_telegram_api import FakeTelegramServer, command_update
+from telegram_bot import TelegramBot, WEBHOOK_PATH
+
+TOKEN = "123456:TEST"
+
+@pytest.fixture
+def telegram_api():
+    server = FakeTelegramServer().start()
+    yield server.api, server.base_url
+    server.stop()
+
+@pytest.mark.asyncio
+async def test_webhook_mode_processes_updates_concurrently(telegram_api, monkeypatch):
+    api, base_url = telegram_api
+    monkeypatch.setenv("BOT_TOKEN", TOKEN)
+    monkeypatch.setenv("TELEGRAM_WEBHOOK_URL", "https://agromaq.test")
+    monkeypatch.setenv("TELEGRAM_WEBHOOK_SECRET", "s3cret")
+    monkeypatch.setenv("TELEGRAM_API_BASE_URL", base_url)
+    monkeypatch.setenv("TELEGRAM_CONCURRENT_UPDATES", "4")
+    bot = TelegramBot()
+    monkeypatch.setattr(main, "telegram_bot", bot)
+
+    # Un handler lento no debe demorar al siguiente update
+    release = asyncio.Event()
+    async def slow_help(update, context):
+        await release.wait()
+    monkeypatch.setattr(bot, "help_command", slow_help)
+
+    await bot.start()
+    try:
+        assert bot.mode == "webhook"
+        webhook = next(payload for method, payload in api.state.calls if method == "setWebhook")
+        assert webhook["url"] == "https://agromaq.test" + WEBHOOK_PATH
+        assert webhook["secret_token"] == "s3cret"
+        assert bot.application.update_processor.max_concurrent_updates == 4
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+            headers = {"X-Telegram-Bot-Api-Secret-Token": "s3cret"}
+            forbidden = await client.post(WEBHOOK_PATH, json=command_update(1, "/start"))
+            assert forbidden.status_code == 403
+
+            assert (await client.post(WEBHOOK_PATH, json=command_update(2, "/ayuda"), headers=headers)).status_code == 200
+            assert (await client.post(WEBHOOK_PATH, json=command_update(3, "/start"), headers=headers)).status_code == 200
+
+            for _ in range(200):
+                if any(method == "sendMessage" for method, _ in api.state.calls):
+                    break
+                await asyncio.sleep(0.01)
+            sent = [payload for method, payload in api.state.calls if method == "sendMessage"]
+            assert sent and "Bienvenido" in sent[0]["text"]
+            release.set()
+    finally:
+        await bot.stop()
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://api") as client:
+        assert (await client.post(WEBHOOK_PATH, json=command_update(4, "/start"))).status_code == 503
+
+@pytest.mark.asyncio
+async def test_webhook_mode_requires_secret(telegram_api, monkeypatch):
+    api, base_url = telegram_api
+    monkeypatch.setenv("BOT_TOKEN", TOKEN)
+    monkeypatch.setenv("TELEGRAM_WEBHOOK_URL", "https://agromaq.test")
+    monkeypatch.delenv("TELEGRAM_WEBHOOK_SECRET", raising=False)
+    monkeypatch.setenv("TELEGRAM_API_BASE_URL", base_url)
+    bot = TelegramBot()
+    monkeypatch.setattr(main, "telegram_bot", bot)
+    await bot.start()
+    assert bot.application is None
+    assert not any(method == "setWebhook" for method, _ in api.state.calls)
+
+    # Aunque la Application corra, un webhook sin secreto configurado no acepta updates
+    bot.webhook_secret = None
+    monkeypatch.setattr(TelegramBot, "accepts_webhooks", property(lambda self: True))
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://api") as client:
+        response = await client.post(WEBHOOK_PATH, json=command_update(1, "/set_price TEST001 1"))
+        assert response.status_code == 403
+
+@pytest.mark.asyncio
+async def test_repeated_quote_pdf_is_sent_by_file_id(telegram_api, monkeypatch):
+    from unittest.mock import AsyncMock, MagicMock
+    import telegram_bot
+    from idempotency import QuoteCoalescer
+    from test_telegram_bot import mock_async_session
+    api, base_url = telegram_api
+    monkeypatch.setenv("BOT_TOKEN", TOKEN)
+    monkeypatch.setenv("TELEGRAM_WEBHOOK_URL", "https://agromaq.test")
+    monkeypatch.setenv("TELEGRAM_WEBHOOK_SECRET", "s3cret")
+    monkeypatch.setenv("TELEGRAM_API_BASE_URL", base_url)
+    monkeypatch.setattr(telegram_bot, "pdf_store", MagicMock(save_quotation_pdf=AsyncMock()))
+    bot = TelegramBot()
+    # Cada /cotizar renderiza de nuevo: el PDF idéntico se detecta por contenido
+    bot.quote_coalescer = QuoteCoalescer(dedup_window=0)
+    machine = MagicMock()
+    machine.name = "Test Machine"
+    machine.price = 10000.0
+    mock_async_session(bot, machine)
+    bot.pdf_generator.generate_quotation_pdf = AsyncMock(return_value=b"%PDF-1.4 " + b"x" * 4096)
+
+    async def documents_sent(count):
+        for _ in range(300):
+            sent = [payload for method, payload in api.state.calls if method == "sendDocument"]
+            if len(sent) >= count:
+                return sent
+            await asyncio.sleep(0.01)
+        pytest.fail("sendDocument not called")
+
+    await bot.start()
+    try:
+        text = '/cotizar TEST001 20-12345678-9 "Juan" 1234567890'
+        await bot.process_webhook(command_update(1, text))
+        upload = (await documents_sent(1))[0]
+        # La primera vez se suben los bytes (multipart, registrado por tamaño)
+        assert upload["document"] == 4105
+
+        await bot.process_webhook(command_update(2, text))
+        reuse = (await documents_sent(2))[1]
+        file_id = next(iter(api.state.file_ids))
+        assert reuse["document"] == file_id
+        assert bot.file_cache.hits == 1
+
+        # Un file_id que Telegram ya no reconoce se descarta y se sube de nuevo
+        bot.file_cache.put(bot.file_cache.make_key(b"%PDF-1.4 " + b"x" * 4096), "file-gone")
+        await bot.process_webhook(command_update(3, text))
+        sent = await documents_sent(4)
+        assert sent[2]["document"] == "file-gone"
+        assert sent[3]["document"] == 4105
+        assert len(api.state.file_ids) == 2
+    finally:
+        await bot.stop()
@@ -47,7 +47,7 @@ function AdminPanel() {
 
     try {
       // Test authentication by trying to access a protected endpoint
-      const testResponse = await fetch(getApiUrl('/quotations'), {
+      const testResponse = await fetch(getApiUrl('/quotations?limit=1'), {
         headers: {
           'Authorization': getAuthHeader()
         }
@@ -89,6 +89,9 @@ function App() {
     setShowMachineSelector(false);
   };
 
+  // Una clave por versión del formulario: doble click o reintento reciben la misma cotización
+  const idempotencyKey = useMemo(() => crypto.randomUUID(), [form]);
+
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
     setIsGenerating(true);
@@ -113,7 +116,7 @@ function App() {
 
       const response = await fetch(getApiUrl(API_CONFIG.ENDPOINTS.GENERATE_QUOTE), {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'Idempotency-Key': idempotencyKey },
         body: JSON.stringify(quotationData)
       });
 
@@ -1,6 +1,7 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import { ChevronDown, ChevronRight, Search } from 'lucide-react';
 import { MachineInfo } from '../utils/machineUtils';
+import { getApiUrl, API_CONFIG } from '../config/api';
 
 interface MachinerySelectorProps {
   selectedMachine: string;
@@ -11,7 +12,7 @@ interface MachinerySelectorProps {
 
 interface MachineryCategory {
   categoria: string;
-  productos: string[];
+  productos: Pick<MachineInfo, 'code' | 'name' | 'price'>[];
 }
 
 const MachinerySelector: React.FC<MachinerySelectorProps> = ({
@@ -23,17 +24,75 @@ const MachinerySelector: React.FC<MachinerySelectorProps> = ({
   const [searchTerm, setSearchTerm] = useState('');
   const [expandedCategories, setExpandedCategories] = useState<Set<string>>(new Set());
 
-  // Filtrar máquinas por búsqueda
-  const filteredMachines = searchTerm
-    ? machines.filter(machine =>
-        machine.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-        machine.category.toLowerCase().includes(searchTerm.toLowerCase()) ||
-        machine.code.toLowerCase().includes(searchTerm.toLowerCase())
-      )
-    : machines;
+  const [searchResults, setSearchResults] = useState<string[] | null>(null);
+  const [catalogTree, setCatalogTree] = useState<MachineryCategory[] | null>(null);
 
-  // Agrupar por categoría
-  const categories = Array.from(new Set(filteredMachines.map(m => m.category)));
+  // Árbol de categorías ya agrupado y ordenado por el servidor
+  useEffect(() => {
+    const controller = new AbortController();
+    fetch(getApiUrl(API_CONFIG.ENDPOINTS.MACHINE_CATALOG), { signal: controller.signal })
+      .then(response => (response.ok ? response.json() : null))
+      .then((tree: MachineryCategory[] | null) => setCatalogTree(tree))
+      .catch(() => {
+        if (!controller.signal.aborted) setCatalogTree(null);
+      });
+    return () => controller.abort();
+  }, []);
+
+  // Búsqueda en el servidor (sin acentos, tolera errores de tipeo), con una pausa
+  // corta para no consultar en cada tecla
+  useEffect(() => {
+    const term = searchTerm.trim();
+    if (!term) {
+      setSearchResults(null);
+      return;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
+      try {
+        const params = new URLSearchParams({ q: term, limit: '100' });
+        const response = await fetch(`${getApiUrl(API_CONFIG.ENDPOINTS.MACHINE_SEARCH)}?${params}`, {
+          signal: controller.signal
+        });
+        if (response.ok) {
+          const results: { code: string }[] = await response.json();
+          setSearchResults(results.map(r => r.code));
+        } else {
+          setSearchResults(null);
+        }
+      } catch (error) {
+        if (!controller.signal.aborted) setSearchResults(null);
+      }
+    }, 150);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [searchTerm]);
+
+  // Filtrar máquinas por búsqueda: orden del servidor o, si no respondió, filtro local
+  const filteredMachines = !searchTerm
+    ? machines
+    : searchResults
+      ? searchResults
+          .map(code => machines.find(machine => machine.code === code))
+          .filter((machine): machine is MachineInfo => machine !== undefined)
+      : machines.filter(machine =>
+          machine.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
+          machine.category.toLowerCase().includes(searchTerm.toLowerCase()) ||
+          machine.code.toLowerCase().includes(searchTerm.toLowerCase())
+        );
+
+  // Sin búsqueda se usa el árbol del servidor; con búsqueda (o si no respondió) se agrupa acá
+  const groups: { category: string; machines: MachineInfo[] }[] = !searchTerm && catalogTree
+    ? catalogTree.map(group => ({
+        category: group.categoria,
+        machines: group.productos.map(product => ({ ...product, category: group.categoria }))
+      }))
+    : Array.from(new Set(filteredMachines.map(m => m.category))).map(category => ({
+        category,
+        machines: filteredMachines.filter(m => m.category === category)
+      }));
 
   const toggleCategory = (category: string) => {
     setExpandedCategories(prev => {
@@ -68,8 +127,7 @@ const MachinerySelector: React.FC<MachinerySelectorProps> = ({
         />
       </div>
       <div className="space-y-2 max-h-96 overflow-y-auto">
-        {categories.map(category => {
-          const categoryMachines = filteredMachines.filter(m => m.category === category);
+        {groups.map(({ category, machines: categoryMachines }) => {
           const isExpanded = expandedCategories.has(category);
           return (
             <div key={category} className="border border-gray-200 rounded-lg">
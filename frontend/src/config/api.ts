@@ -7,6 +7,8 @@ export const API_CONFIG = {
   BASE_URL: import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000',
   ENDPOINTS: {
     MACHINES: '/machines',
+    MACHINE_SEARCH: '/machines/search',
+    MACHINE_CATALOG: '/machines/catalog',
     ADMIN_MACHINES: '/admin/machines',
     GENERATE_QUOTE: '/generate-quote',
     QUOTATIONS: '/quotations',